@@ -0,0 +1,42 @@
+"""
+Compares rendering time of the code generation backends on the large modules of the standard library.
+Usage: python -m benchmarks.bench_codegen [--repeat N] [module ...]
+"""
+import ast
+import time
+import inspect
+import argparse
+import importlib
+
+from import_transformer.codegen import CODEGENS
+
+
+DEFAULT_MODULES = ('argparse', 'inspect', 'typing', 'tarfile', 'pydoc')
+
+
+def measure(codegen, trees, repeat):
+    """ Returns the best of the repeat times of rendering all the trees. """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for tree in trees:
+            codegen.to_source(tree)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    sources = [inspect.getsource(importlib.import_module(module)) for module in args.modules]
+    trees = [ast.parse(module_sources) for module_sources in sources]
+    print('{} modules, {} bytes of sources'.format(len(trees), sum(map(len, sources))))
+    for name, codegen in sorted(CODEGENS.items()):
+        print('{:<8} {:.4f}s'.format(name, measure(codegen(), trees, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
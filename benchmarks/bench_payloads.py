@@ -0,0 +1,75 @@
+"""
+Compares size and cold start time of the files transformed with the payloads: plain and compressed sources, and
+bytecode. Start of the compressed payloads includes their decompression.
+Usage: python -m benchmarks.bench_payloads [--modules N] [--functions N] [--repeat N]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from import_transformer import ImportsTransformer
+from import_transformer.payloads import PAYLOADS
+
+
+FUNCTION_TEMPLATE = '''
+
+def function_{index}(value):
+    """ Function {index}. """
+    result = [item * {index} for item in range(value) if item % 3]
+    return {{'index': {index}, 'sum': sum(result), 'items': tuple(result)}}
+'''
+
+
+def generate_package(root, modules, functions):
+    """ Generates package with the modules of the functions and the entry file importing all of them. """
+    os.makedirs(os.path.join(root, 'benchpkg'))
+    os.makedirs(os.path.join(root, 'tmp'))
+    open(os.path.join(root, 'benchpkg', '__init__.py'), 'w').close()
+    for module in range(modules):
+        with open(os.path.join(root, 'benchpkg', 'module_{}.py'.format(module)), 'w') as fh:
+            fh.write(''.join(FUNCTION_TEMPLATE.format(index=index) for index in range(functions)))
+    entry = os.path.join(root, 'entry.py')
+    with open(entry, 'w') as fh:
+        fh.writelines('import benchpkg.module_{}\n'.format(module) for module in range(modules))
+    return entry
+
+
+def measure_startup(fpath, repeat):
+    """ Returns the best of the repeat wall times of the file execution. """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, fpath], cwd=os.path.dirname(fpath), stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, default=50)
+    parser.add_argument('--functions', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp()
+    try:
+        entry = generate_package(root, args.modules, args.functions)
+        sys.path.insert(0, root)
+        for bundle in (False, True):
+            for payload in PAYLOADS:
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, payload=payload)
+                sources = transformer.transform_file_imports(entry)
+                startup = measure_startup(transformer.get_output_path(entry), args.repeat)
+                print('bundle={!s:<5} payload={:<8} size={:>10} bytes startup={:.4f}s'.format(
+                    bundle, payload, len(sources), startup))
+    finally:
+        sys.path.remove(root)
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
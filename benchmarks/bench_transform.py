@@ -0,0 +1,122 @@
+"""
+Measures transformation of the synthetic packages: wall time, peak memory, output size and cold start time of the
+transformed file, for every configuration of the transformer. Results are saved as JSON, and can be compared
+with the results of the previous version.
+Usage: python -m benchmarks.bench_transform [--modules N] [--depth N] [--fan-out N] [--output results.json]
+                                            [--compare baseline.json] [--config NAME ...]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+from import_transformer import ImportsTransformer, __version__
+
+from .bench_payloads import measure_startup
+from .synthetic import generate_package
+
+
+# Options of the transformer measured by the benchmark.
+CONFIGURATIONS = {
+    'nested': {},
+    'bundle': {'bundle': True},
+    'bundle-bytecode': {'bundle': True, 'payload': 'bytecode'},
+    'bundle-zlib': {'bundle': True, 'payload': 'zlib'},
+    'bundle-lzma': {'bundle': True, 'payload': 'lzma'},
+    'bundle-shaking': {'bundle': True, 'tree_shaking': True},
+    'bundle-stream': {'stream': True},
+    'archive': {'archive': True},
+    'lazy': {'lazy': True},
+    'registry': {'registry': True},
+    'registry-folding': {'registry': True, 'fold_constants': True},
+}
+# Metrics of the results, lower is better for all of them.
+METRICS = ('transform_time', 'peak_memory', 'output_size', 'startup_time')
+
+
+def transform(package, options):
+    """ Transforms the entry of the package with the fresh transformer and returns path of the output file. """
+    sys.path.insert(0, package.root)
+    try:
+        transformer = ImportsTransformer(package.root, static_resolution=True, **options)
+        transformer.transform_file_imports(package.entry)
+        return transformer.get_output_path(package.entry)
+    finally:
+        sys.path.remove(package.root)
+
+
+def measure(package, options, repeat):
+    """ Returns the metrics of the configuration. Peak memory is measured by the separate run, as tracing slows
+    the transformation down. """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output_path = transform(package, options)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        transform(package, options)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'transform_time': min(timings), 'peak_memory': peak_memory, 'output_size': os.path.getsize(output_path),
+            'startup_time': measure_startup(output_path, repeat)}
+
+
+def compare(results, baseline):
+    """ Prints ratios of the metrics to the baseline metrics of the same configurations. """
+    for name, metrics in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratios = ('{}={:.2f}x'.format(metric, metrics[metric] / base[metric]) for metric in METRICS
+                  if base.get(metric))
+        print('{:<16} vs {}: {}'.format(name, baseline['version'], ' '.join(ratios)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fan-out', type=int, default=2)
+    parser.add_argument('--entries', type=int, default=3)
+    parser.add_argument('--functions', type=int, default=5)
+    parser.add_argument('--star-imports', type=float, default=0.1)
+    parser.add_argument('--aliased-imports', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--config', action='append', choices=sorted(CONFIGURATIONS), dest='configs',
+                        help='Measured configuration, all of them by default. Can be repeated.')
+    parser.add_argument('--output', help='File the JSON results are saved to.')
+    parser.add_argument('--compare', help='File of the JSON results the results are compared with.')
+    args = parser.parse_args(argv)
+
+    parameters = {name: getattr(args, name) for name in ('modules', 'depth', 'fan_out', 'entries', 'functions',
+                                                         'star_imports', 'aliased_imports', 'seed')}
+    results = {'version': __version__, 'python': platform.python_version(), 'parameters': parameters,
+               'results': {}}
+    root = tempfile.mkdtemp()
+    try:
+        package = generate_package(root, **parameters)
+        for name in args.configs or CONFIGURATIONS:
+            metrics = results['results'][name] = measure(package, CONFIGURATIONS[name], args.repeat)
+            print('{:<16} transform={transform_time:.4f}s peak={peak_memory:>10} bytes size={output_size:>10} bytes '
+                  'startup={startup_time:.4f}s'.format(name, **metrics))
+    finally:
+        shutil.rmtree(root)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(results, json.load(fh))
+    return results
+
+
+if __name__ == '__main__':
+    main()
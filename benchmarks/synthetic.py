@@ -0,0 +1,96 @@
+"""
+Generator of the synthetic packages used by the benchmarks.
+"""
+import os
+import random
+from collections import namedtuple
+
+
+# Generated package: entry file, paths of the modules in order of generation and the output of the entry file.
+SyntheticPackage = namedtuple('SyntheticPackage', ['root', 'entry', 'modules', 'expected_output'])
+
+FUNCTION_TEMPLATE = '''
+
+def function_{index}_{number}(value):
+    """ Function {number} of the module {index}. """
+    result = [item * {number} for item in range(value) if item % 3]
+    return value + sum(result) + sum(DEPENDENCIES_{index})
+'''
+
+
+def get_module_paths(name, modules, depth):
+    """ Returns paths of the modules distributed round robin between the packages of the nesting depth. """
+    packages = [name]
+    for level in range(1, depth):
+        packages.append('{}.sub_{}'.format(packages[-1], level))
+    return ['{}.module_{}'.format(packages[index % len(packages)], index) for index in range(modules)]
+
+
+def get_import(path, index, kind):
+    """ Returns import statement of the module of the kind and the expression of its constant. """
+    constant = 'CONSTANT_{}'.format(index)
+    if kind == 'star':
+        return 'from {} import *\n'.format(path), constant
+    if kind == 'alias':
+        return 'import {} as m_{}\n'.format(path, index), 'm_{}.{}'.format(index, constant)
+    if kind == 'from':
+        return 'from {} import {}\n'.format(path, constant), constant
+    return 'import {}\n'.format(path), '{}.{}'.format(path, constant)
+
+
+def generate_package(root, name='synthpkg', modules=20, depth=2, fan_out=3, entries=3, functions=5,
+                     star_imports=0.1, aliased_imports=0.2, seed=0):
+    """
+    Generates the package under the root and the entry file importing it.
+    modules: Number of the modules.
+    depth: Nesting depth of the packages the modules are distributed between.
+    fan_out: Number of the modules imported by every module, imported modules are chosen from the previously
+        generated ones, so the first modules have the largest fan in.
+    entries: Number of the last modules imported by the entry file.
+    functions: Number of the functions defined by every module.
+    star_imports, aliased_imports: Shares of the star and aliased imports, the rest are split between
+        from X import name and import X imports.
+    seed: Seed of the random choice of the dependencies and imports kinds.
+    :return SyntheticPackage
+    """
+    rand = random.Random(seed)
+    # {module index: indexes of the imported modules}
+    dependencies = {}
+    paths = get_module_paths(name, modules, depth)
+    os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+    for path in paths:
+        directory = os.path.join(root, *path.split('.')[:-1])
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, '__init__.py'), 'a').close()
+
+    for index, path in enumerate(paths):
+        imports, constants = [], []
+        dependencies[index] = sorted(rand.sample(range(index), min(fan_out, index)))
+        for dependency in dependencies[index]:
+            chance = rand.random()
+            if chance < star_imports:
+                kind = 'star'
+            elif chance < star_imports + aliased_imports:
+                kind = 'alias'
+            else:
+                kind = rand.choice(('from', 'import'))
+            statement, constant = get_import(paths[dependency], dependency, kind)
+            imports.append(statement)
+            constants.append(constant)
+        sources = '""" Synthetic module {}. """\n'.format(index) + ''.join(imports)
+        names = ['CONSTANT_{}'.format(index)] + ['function_{}_{}'.format(index, number) for number in range(functions)]
+        sources += '__all__ = {!r}\nCONSTANT_{} = {}\nDEPENDENCIES_{} = ({})\n'.format(
+            names, index, index, index, ''.join(constant + ', ' for constant in constants))
+        sources += ''.join(FUNCTION_TEMPLATE.format(index=index, number=number) for number in range(functions))
+        with open(os.path.join(root, *path.split('.')) + '.py', 'w') as fh:
+            fh.write(sources)
+
+    entry_modules = list(enumerate(paths))[-entries:]
+    entry = os.path.join(root, 'entry.py')
+    with open(entry, 'w') as fh:
+        fh.writelines('import {} as m_{}\n'.format(path, index) for index, path in entry_modules)
+        fh.write('print({})\n'.format(' + '.join('m_{}.function_{}_0(3)'.format(index, index)
+                                                for index, _ in entry_modules) or 0))
+    # function_i_0(3) is 3 plus sum of the constants of the imported modules, which are equal to their indexes.
+    expected = sum(3 + sum(dependencies[index]) for index, _ in entry_modules)
+    return SyntheticPackage(root=root, entry=entry, modules=paths, expected_output='{}\n'.format(expected))
@@ -1,4 +1,4 @@
-from .import_transformer import ImportsTransformer
+__version__ = '1.0.0'
 
 
-__version__ = '1.0.0'
+from .import_transformer import ImportsTransformer
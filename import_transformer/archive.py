@@ -0,0 +1,102 @@
+import os
+import marshal
+import zipfile
+import logging
+from importlib.util import MAGIC_NUMBER, source_hash
+
+from .bundler import ModuleGraph
+from .stats import CODEGEN, WRITE
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '.pyz'
+MAIN_MODULE = '__main__.py'
+SHEBANG = b'#!/usr/bin/env python3\n'
+# Flags of the hash based pyc which isn't checked against its source (PEP 552).
+UNCHECKED_HASH_FLAGS = 0b01
+# Fixed time of the archive entries, so the same sources produce the same archive.
+ENTRY_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def get_bytecode(sources, filename):
+    """ Returns contents of the unchecked hash based pyc of the sources. """
+    code = compile(sources, filename, 'exec', dont_inherit=True)
+    data = bytearray(MAGIC_NUMBER)
+    data += UNCHECKED_HASH_FLAGS.to_bytes(4, 'little')
+    data += source_hash(sources.encode('utf-8'))
+    data += marshal.dumps(code)
+    return bytes(data)
+
+
+def get_parents(path):
+    """ Returns paths of the parent packages of the module. """
+    parts = path.split('.')
+    return ['.'.join(parts[:index]) for index in range(1, len(parts))]
+
+
+class ArchiveBuilder(object):
+    """ Builds the executable zip archive of the entry sources and the modules under transform_package_path reachable
+    from them. The modules are loaded by zipimport through the regular import machinery, from the bytecode compiled
+    at transformation time, and their sources are kept for tracebacks. The entry sources are the __main__ module of
+    the archive and stay unchanged. """
+
+    def __init__(self, transformer, bytecode=True, compression=zipfile.ZIP_STORED):
+        """
+        bytecode: Add unchecked hash based pyc of every module.
+        compression: Compression of the archive entries, stored entries are the fastest to load.
+        """
+        self.transformer = transformer
+        self.bytecode = bytecode
+        self.compression = compression
+        self.graph = ModuleGraph(transformer, keep_trees=False)
+
+    def get_modules(self, tree):
+        """ Returns paths of the modules reachable from the tree and of their parent packages, the parent packages go
+        first. """
+        self.graph.build(tree)
+        while True:
+            missing = sorted({parent for path in self.graph.dependencies for parent in get_parents(path)
+                              if parent not in self.graph.dependencies})
+            if not missing:
+                break
+            self.graph.add(missing)
+        return sorted(self.graph.dependencies, key=lambda path: (path.count('.'), path))
+
+    def get_entry_name(self, path):
+        """ Returns name of the archive entry of the module sources. """
+        location = self.transformer.get_module_location(path)
+        name = path.replace('.', '/')
+        # Namespace packages imported without the static resolution have no location.
+        if location is None or os.path.isdir(location) or os.path.basename(location) == '__init__.py':
+            return name + '/__init__.py'
+        return name + '.py'
+
+    def write_entry(self, archive, name, data):
+        info = zipfile.ZipInfo(name, date_time=ENTRY_TIME)
+        info.compress_type = self.compression
+        archive.writestr(info, data)
+
+    def build(self, tree, sources, output_path):
+        """ Writes the archive of the entry sources to the output path. Returns False without writing the archive if
+        the tree has no inlined imports. """
+        modules = self.get_modules(tree)
+        if not modules:
+            return False
+        with open(output_path, 'wb') as out:
+            out.write(SHEBANG)
+            with zipfile.ZipFile(out, 'w') as archive:
+                self.write_entry(archive, MAIN_MODULE, sources)
+                for path in modules:
+                    name = self.get_entry_name(path)
+                    # Sources of the namespace packages are empty.
+                    module_sources = self.transformer.read_sources(path) or ''
+                    with self.transformer.stats.measure(WRITE, path):
+                        self.write_entry(archive, name, module_sources)
+                    if self.bytecode:
+                        with self.transformer.stats.measure(CODEGEN, path):
+                            data = get_bytecode(module_sources, os.path.join(output_path, name))
+                        self.write_entry(archive, name + 'c', data)
+        os.chmod(output_path, os.stat(output_path).st_mode | 0o111)
+        self.transformer.types_imported = True
+        return True
@@ -0,0 +1,175 @@
+import os
+import ast
+import sys
+import time
+import fnmatch
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .cache import ModuleCache
+from .index import ModuleIndex, get_module_index
+from .resolver import ModuleResolver
+from .import_transformer import ImportsTransformer, get_output_path
+
+
+logger = logging.getLogger(__name__)
+
+# Result of the file transformation. output_path is None if the file has no transforming imports,
+# error is the description of the failure or None, stats are TransformStats.as_dict() if the stats are enabled.
+TransformReport = namedtuple('TransformReport', ['path', 'output_path', 'modified', 'error', 'duration', 'stats'])
+
+# Transformer configuration of the worker process, shared by all the files processed by the worker.
+_worker_options = {}
+
+
+def get_worker_options(transform_package_path, options, cache_size=None):
+    """ Returns transformer options of the worker. Resolution results and transformed modules are shared by the
+    files of the worker, persistent cache (if configured) shares the transformed modules between the workers.
+    cache_size: Memory budget of the transformed modules kept by the worker in bytes. """
+    options = dict(options, transform_package_path=transform_package_path, cache=ModuleCache(cache_size))
+    options['module_index'] = get_module_index(options.get('module_index'), transform_package_path)
+    if options.get('static_resolution') or options['module_index'] is not None:
+        options['static_resolution'] = ModuleResolver(options['module_index'])
+    return options
+
+
+def _init_worker(transform_package_path, options, cache_size=None):
+    """ Configures worker process. """
+    _worker_options.clear()
+    _worker_options.update(get_worker_options(transform_package_path, options, cache_size))
+
+
+def _transform_file(fpath):
+    """ Transforms the file with the worker configuration and returns its report. """
+    return transform_file(ImportsTransformer(**_worker_options), fpath)
+
+
+def transform_file(transformer, fpath):
+    """ Transforms the file with the transformer and returns its report, failures are logged and reported. """
+    started = time.perf_counter()
+    output_path, error = None, None
+    try:
+        transformer.transform_file_imports(fpath)
+        if transformer.is_modified:
+            output_path = transformer.get_output_path(fpath)
+    except Exception as exc:
+        logger.exception('Import transformation of %s failed.', fpath)
+        error = '{}: {}'.format(type(exc).__name__, exc)
+    stats = transformer.stats.as_dict() if transformer.stats.enabled else None
+    return TransformReport(path=fpath, output_path=output_path, modified=bool(output_path), error=error,
+                           duration=time.perf_counter() - started, stats=stats)
+
+
+def writes_output(transformer, fpath):
+    """ Checks whether the file has transforming imports, so its transformation writes the output file. Files which
+    can't be read or parsed fail to transform and write nothing. """
+    try:
+        with open(fpath) as fh:
+            tree = ast.parse(fh.read(), fpath)
+        transformer.reset()
+        transformer.search_path = (os.path.dirname(fpath),) + tuple(sys.path)
+        return bool(transformer.get_imported_names(tree))
+    except Exception:
+        return False
+
+
+def get_output_conflicts(fpaths, transform_package_path, options):
+    """ Returns {file path: paths of the other files} map of the files whose output files are the same. Only the
+    files which write the output are checked, e.g. the empty __init__ files of the packages never conflict. """
+    outputs = {}
+    for fpath in fpaths:
+        outputs.setdefault(get_output_path(transform_package_path, fpath, options.get('archive')), []).append(fpath)
+    shared_outputs = [shared for shared in outputs.values() if len(shared) > 1]
+    if not shared_outputs:
+        return {}
+    transformer = ImportsTransformer(**get_worker_options(transform_package_path, options))
+    shared_outputs = [[fpath for fpath in shared if writes_output(transformer, fpath)] for shared in shared_outputs]
+    return {fpath: [other for other in shared if other != fpath]
+            for shared in shared_outputs if len(shared) > 1 for fpath in shared}
+
+
+def get_shared_options(transform_package_path, options):
+    """ Returns options of the worker processes whose module index is built once by the current process, so the
+    workers share the resolution results instead of resolving the modules on their own. """
+    module_index = options.get('module_index')
+    if not module_index and options.get('static_resolution') is True:
+        module_index = ModuleIndex(transform_package_path)
+    module_index = get_module_index(module_index, transform_package_path)
+    if module_index is None:
+        return options
+    module_index.save()
+    return dict(options, module_index=module_index)
+
+
+def transform_many(fpaths, transform_package_path='/', processes=None, threads=False, cache_size=None, **options):
+    """
+    Transforms imports of the files using the pool of processes.
+    fpaths: Paths of the transforming files.
+    transform_package_path: Defines path under which imports will be transformed.
+    processes: Number of the worker processes, os.cpu_count() by default. Files are transformed in the current
+        process if it's 1.
+    threads: Use the pool of threads of the current process instead of the processes, the threads share the caches
+        and the resolver of the run. The modules are resolved statically, so the threads don't import them.
+    cache_size: Memory budget of the transformed modules kept by every worker in bytes, unlimited by default.
+    options: Other options of the ImportsTransformer.
+    :return list of TransformReport in order of the fpaths. Files with the same name which have transforming imports
+        would be written to the same output file, they aren't transformed and their reports have the error.
+    """
+    fpaths = [os.path.abspath(fpath) for fpath in fpaths]
+    transform_package_path = os.path.abspath(transform_package_path)
+    os.makedirs(os.path.join(transform_package_path, 'tmp'), exist_ok=True)
+    archive = options.get('archive', False)
+    reports = {}
+    for fpath, others in get_output_conflicts(fpaths, transform_package_path, options).items():
+        error = 'Output file {} is shared with {}.'.format(get_output_path(transform_package_path, fpath, archive),
+                                                           ', '.join(others))
+        logger.error('Import transformation of %s skipped: %s', fpath, error)
+        reports[fpath] = TransformReport(path=fpath, output_path=None, modified=False, error=error, duration=0.0,
+                                         stats=None)
+    pending = [fpath for fpath in fpaths if fpath not in reports]
+    reports.update(zip(pending, _transform_many(pending, transform_package_path, processes, threads, cache_size,
+                                                options)))
+    return [reports[fpath] for fpath in fpaths]
+
+
+def _transform_many(fpaths, transform_package_path, processes, threads, cache_size, options):
+    processes = min(processes or os.cpu_count() or 1, len(fpaths) or 1)
+    if threads:
+        options = dict(options, static_resolution=options.get('static_resolution') or True)
+    if processes == 1 or threads:
+        # The caches of the current process are released once the files are transformed.
+        worker_options = get_worker_options(transform_package_path, options, cache_size)
+        if processes == 1:
+            return [transform_file(ImportsTransformer(**worker_options), fpath) for fpath in fpaths]
+        with ThreadPoolExecutor(processes) as executor:
+            return list(executor.map(lambda fpath: transform_file(ImportsTransformer(**worker_options), fpath),
+                                     fpaths))
+    options = get_shared_options(transform_package_path, options)
+    chunksize = max(1, len(fpaths) // (processes * 4))
+    with ProcessPoolExecutor(processes, initializer=_init_worker,
+                             initargs=(transform_package_path, options, cache_size)) as executor:
+        return list(executor.map(_transform_file, fpaths, chunksize=chunksize))
+
+
+def find_files(directory, pattern='*.py', exclude=()):
+    """ Returns sorted paths of the files matching the pattern under the directory, excluding the exclude paths,
+    hidden and __pycache__ directories. """
+    exclude = {os.path.abspath(path) for path in exclude}
+    fpaths = []
+    for dirpath, dirnames, filenames in os.walk(os.path.abspath(directory)):
+        dirnames[:] = [dirname for dirname in dirnames
+                       if not dirname.startswith('.') and dirname != '__pycache__'
+                       and os.path.join(dirpath, dirname) not in exclude]
+        fpaths += [os.path.join(dirpath, filename) for filename in fnmatch.filter(filenames, pattern)]
+    return sorted(fpaths)
+
+
+def transform_tree(directory, transform_package_path='/', pattern='*.py', processes=None, threads=False,
+                   cache_size=None, **options):
+    """ Transforms imports of all the files matching the pattern under the directory. The output directory of the
+    transformer is skipped. See transform_many for the rest of arguments. """
+    output_directory = os.path.join(os.path.abspath(transform_package_path), 'tmp')
+    fpaths = find_files(directory, pattern, exclude=[output_directory])
+    return transform_many(fpaths, transform_package_path, processes=processes, threads=threads,
+                          cache_size=cache_size, **options)
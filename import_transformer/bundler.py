@@ -0,0 +1,364 @@
+import logging
+from ast import (NodeTransformer, NodeVisitor, Assign, Attribute, Call, Expr, If, ImportFrom, Index, Load, Module,
+                 Name, Store, Str, Subscript, fix_missing_locations, parse)
+
+from .cache import get_hash
+from .runtime import (IMPORT_ALL, INLINE_BODY, INLINE_MODULE, LAZY_PAYLOAD, PAYLOADS, get_inline_import,
+                      get_registry_module, get_runtime)
+from .shaking import ModuleShaker
+from .stats import CODEGEN, PARSE
+
+
+logger = logging.getLogger(__name__)
+
+VISITING, VISITED = range(2)
+
+
+def merge_imported_names(names, other_names):
+    """ Merges {module path: imported names} maps, where None stands for the whole module. """
+    for path, path_names in other_names.items():
+        if path not in names:
+            names[path] = None if path_names is None else set(path_names)
+        elif names[path] is not None:
+            names[path] = None if path_names is None else names[path] | path_names
+    return names
+
+
+def is_exposed(path, exposed):
+    """ Returns True if the module is reachable as an attribute of any of the exposed modules. """
+    return any(path.startswith(f'{module}.') for module in exposed)
+
+
+class ImportsCollector(NodeVisitor):
+    """ Collects paths of the inlined modules imported by the tree in order of their appearance, and names imported
+    from them. """
+
+    def __init__(self, transformer):
+        self.transformer = transformer
+        self.paths = []
+        # {module path: imported names}, names are None if the module is imported itself or with star import.
+        self.names = {}
+        # Paths of the modules bound to the names by the tree, their submodules are reachable as their attributes.
+        self.exposed = set()
+
+    def visit_Import(self, node):
+        if not self.transformer._to_transform(node):
+            return
+        for node_name, node_info in self.transformer.get_node_modules(node).items():
+            for package in self.transformer.get_inlined_packages(node_info.path):
+                if package not in self.paths:
+                    self.paths.append(package)
+                merge_imported_names(self.names, {package: None})
+            if node_info.path not in self.paths:
+                self.paths.append(node_info.path)
+            if node_info.is_module:
+                # import foo.bar.baz binds foo, but not import foo.bar.baz as fbz
+                plain = node_name == node_info.path and not node_info.alias
+                self.exposed.add(node_info.path.split('.')[0] if plain else node_info.path)
+            whole_module = node_info.is_module or node_name == IMPORT_ALL
+            names = None if whole_module else {node_name}
+            # Star import of the folded constants binds the exported names only.
+            folded = self.transformer.get_folded_assignments(node_name, node_info) if whole_module else None
+            if folded is not None:
+                names = {assignment.targets[0].id for assignment in folded}
+            merge_imported_names(self.names, {node_info.path: names})
+
+    visit_ImportFrom = visit_Import
+
+
+class ImportsBinder(NodeTransformer):
+    """ Replaces imports of the inlined modules with bindings of their names to the modules from the registry. """
+
+    def __init__(self, transformer, bundled=()):
+        """ bundled: Paths of the bundled modules, whose bodies are executed at their first import sites before the
+        bindings, parent packages first. """
+        self.transformer = transformer
+        self.bundled = bundled
+
+    def visit_Import(self, node):
+        if not self.transformer._to_transform(node):
+            return node
+        return self.get_bindings(self.transformer.get_node_modules(node))
+
+    def get_bindings(self, node_modules):
+        """ Returns statements binding the names of the node modules, see ImportsTransformer.get_node_modules. """
+        bindings = []
+        imported = set()
+        for node_name, node_info in node_modules.items():
+            folded = self.transformer.get_folded_assignments(node_name, node_info)
+            if folded is not None:
+                bindings += folded
+                continue
+            parts = node_info.path.split('.')
+            for index in range(1, len(parts) + 1):
+                path = '.'.join(parts[:index])
+                if path in self.bundled and path not in imported:
+                    imported.add(path)
+                    bindings.append(get_inline_import(path))
+            module = get_registry_module(node_info.path)
+            # for from foo.bar import *
+            if node_name == IMPORT_ALL:
+                update = Attribute(value=Call(func=Name(id='globals', ctx=Load()), args=[], keywords=[]),
+                                   attr='update', ctx=Load())
+                names = Call(func=Name(id='__inline_all__', ctx=Load()), args=[module], keywords=[])
+                bindings.append(Expr(value=Call(func=update, args=[names], keywords=[])))
+                continue
+            # for import foo.bar.baz, but not import foo.bar.baz as fbz
+            if node_name == node_info.path and not node_info.alias:
+                identifier = node_name.split('.')[0]
+                value = get_registry_module(identifier)
+            else:
+                identifier = node_info.alias or node_name
+                value = module if node_info.is_module else Attribute(value=module, attr=node_name, ctx=Load())
+            bindings.append(Assign(targets=[Name(id=identifier, ctx=Store())], value=value))
+        return [fix_missing_locations(binding) for binding in bindings]
+
+    visit_ImportFrom = visit_Import
+
+
+class ModuleGraph(object):
+    """ Dependency graph of the modules under transform_package_path reachable from the entry sources. """
+
+    def __init__(self, transformer, keep_trees=True):
+        """ keep_trees: Keep trees and sources of the modules after the graph is built, otherwise they are read again
+        by load. """
+        self.transformer = transformer
+        self.keep_trees = keep_trees
+        self.trees = {}
+        self.sources = {}
+        # {module path: [paths of the imported modules]}
+        self.dependencies = {}
+        # {module path: names imported from the module by the graph}
+        self.names = {}
+        # Paths of the modules bound to the names by the graph, their submodules aren't shaken.
+        self.exposed = set()
+        self.shaken = set()
+        self.cycles = []
+
+    def get_dependencies(self, tree):
+        collector = ImportsCollector(self.transformer)
+        collector.visit(tree)
+        merge_imported_names(self.names, collector.names)
+        self.exposed |= collector.exposed
+        return collector.paths
+
+    def get_shaken_names(self, path):
+        """ Returns the names the module is shaken to, None if it isn't shaken. """
+        if is_exposed(path, self.exposed):
+            return None
+        return self.names.get(path)
+
+    def build(self, tree):
+        """ Adds the modules reachable from the tree to the graph and returns paths of the modules imported
+        by the tree. """
+        roots = self.get_dependencies(tree)
+        self.add(roots)
+        return roots
+
+    def add(self, paths):
+        """ Adds the modules and the modules reachable from them to the graph. """
+        pending = list(reversed(paths))
+        while pending:
+            path = pending.pop()
+            if path in self.dependencies:
+                continue
+            self.sources[path] = self.transformer.read_sources(path)
+            self.transformer.cache.source_hashes[path] = get_hash(self.sources[path])
+            self.transformer.dependencies[path] = self.transformer.cache.source_hashes[path]
+            with self.transformer.stats.measure(PARSE, path):
+                self.trees[path] = parse(self.sources[path], path)
+            self.dependencies[path] = self.get_dependencies(self.trees[path])
+            pending += reversed(self.dependencies[path])
+            if not self.keep_trees:
+                self.release(path)
+
+    def load(self, path):
+        """ Returns tree of the module, reading and parsing the module again if it has been released. """
+        if path not in self.trees:
+            self.sources[path] = self.transformer.read_sources(path)
+            with self.transformer.stats.measure(PARSE, path):
+                self.trees[path] = parse(self.sources[path], path)
+        return self.trees[path]
+
+    def release(self, path):
+        """ Frees tree and sources of the module. """
+        self.trees.pop(path, None)
+        self.sources.pop(path, None)
+
+    def shake(self, roots):
+        """ Removes definitions of the modules which aren't used by the graph, and the modules which become
+        unreachable from the roots. """
+        for path, tree in self.trees.items():
+            names = self.get_shaken_names(path)
+            if names is None:
+                continue
+            result = ModuleShaker(tree).shake(names, self.sources[path])
+            if result.removed_statements:
+                self.shaken.add(path)
+                self.transformer.report_shaking(path, result)
+                self.dependencies[path] = self.get_dependencies(tree)
+        reachable = set()
+        pending = list(roots)
+        while pending:
+            path = pending.pop()
+            if path not in reachable:
+                reachable.add(path)
+                pending += self.dependencies[path]
+        for path in set(self.trees) - reachable:
+            for mapping in (self.trees, self.sources, self.dependencies, self.transformer.dependencies):
+                mapping.pop(path, None)
+
+    def get_order(self, roots):
+        """ Returns paths of the modules in topological order, dependencies go first. Modules of the import cycle
+        are ordered by the first import, as python does, and the cycle is recorded to the cycles. """
+        order = []
+        states = {}
+        for root in roots:
+            if root in states:
+                continue
+            states[root] = VISITING
+            stack = [(root, iter(self.dependencies[root]))]
+            while stack:
+                path, dependencies = stack[-1]
+                for dependency in dependencies:
+                    if dependency not in states:
+                        states[dependency] = VISITING
+                        stack.append((dependency, iter(self.dependencies[dependency])))
+                        break
+                    if states[dependency] == VISITING:
+                        cycle = [item[0] for item in stack]
+                        self.cycles.append(cycle[cycle.index(dependency):] + [dependency])
+                else:
+                    stack.pop()
+                    states[path] = VISITED
+                    order.append(path)
+        return order
+
+
+class Bundler(object):
+    """ Bundles the entry sources with the inlined modules. Each module body is emitted once, in topological order,
+    before the entry sources, and executed at its first import site, so the imports guarded by try or if statements
+    behave as the regular ones. Imports are replaced with bindings of the names to the modules. """
+
+    def __init__(self, transformer):
+        self.transformer = transformer
+        self.graph = ModuleGraph(transformer)
+        # Paths of the modules whose bodies are executed at their import sites.
+        self.bundled = set()
+
+    def get_binder(self):
+        return ImportsBinder(self.transformer, self.bundled)
+
+    def get_module_sources(self, path):
+        codegen = self.transformer.codegen
+        tree = self.graph.load(path)
+        if codegen.reuse_sources and not self.graph.dependencies[path] and path not in self.graph.shaken:
+            return self.graph.sources[path]
+        with self.transformer.stats.measure(CODEGEN, path):
+            return codegen.to_source(self.get_binder().visit(tree))
+
+    def get_order(self, roots):
+        """ Returns paths of the modules in the order of their execution and reports the import cycles. """
+        order = self.graph.get_order(roots)
+        for cycle in self.graph.cycles:
+            logger.warning('Import cycle met: %s .', ' -> '.join(cycle))
+        # Modules whose imported names are all folded to their values aren't executed.
+        order = [path for path in order if not self.transformer.is_folded(path, self.graph.names.get(path))]
+        # Lazy modules execute their bodies on the first access to their attributes instead.
+        self.bundled = {path for path in order if not self.transformer.is_lazy(path)}
+        return order
+
+    def get_preamble(self, order):
+        """ Returns statements of the runtime and creation of the lazy modules. The other modules are created by
+        their first import, so they aren't registered before their bodies are executed. """
+        body = get_runtime(self.transformer.lazy, self.transformer.sys_modules) + self.transformer.payload.get_imports()
+        for path in order:
+            body += self.transformer.get_package_declarations(path)
+            if path not in self.bundled:
+                body.append(Expr(value=Call(func=Name(id=INLINE_MODULE, ctx=Load()), args=[Str(s=path)],
+                                            keywords=[])))
+        return body
+
+    def get_module_statement(self, path):
+        """ Returns statement storing payload of the module, which is executed at the first import site. """
+        payload = self.transformer.payload.encode(self.get_module_sources(path), path)
+        if path in self.bundled:
+            return Assign(targets=[Subscript(value=Name(id=PAYLOADS, ctx=Load()), slice=Index(value=Str(s=path)),
+                                             ctx=Store())],
+                          value=payload)
+        # Lazy modules execute the payload on the first access to their attributes.
+        statement = Assign(targets=[Attribute(value=get_registry_module(path), attr=LAZY_PAYLOAD, ctx=Store())],
+                           value=payload)
+        # Modules of sys.modules may have been imported before the bundle.
+        if self.transformer.sys_modules:
+            statement = If(test=Call(func=Name(id=INLINE_BODY, ctx=Load()), args=[Str(s=path)], keywords=[]),
+                           body=[statement], orelse=[])
+        return statement
+
+    @staticmethod
+    def get_head(tree):
+        """ Returns number of the statements at the beginning of the tree, docstring and future imports, which shall
+        stay before the bundled modules. """
+        for head, node in enumerate(tree.body):
+            is_docstring = head == 0 and isinstance(node, Expr) and isinstance(node.value, Str)
+            if not is_docstring and not (isinstance(node, ImportFrom) and node.module == '__future__'):
+                return head
+        return len(tree.body)
+
+    def bundle(self, tree):
+        """ Returns the tree bundled with its dependencies. The tree is returned as is if it has no inlined
+        imports. """
+        roots = self.graph.build(tree)
+        if not roots:
+            return tree
+        if self.transformer.tree_shaking:
+            self.graph.shake(roots)
+        order = self.get_order(roots)
+        body = self.get_preamble(order)
+        for path in order:
+            body.append(self.get_module_statement(path))
+            # The module is emitted, its tree and sources aren't needed anymore.
+            self.graph.release(path)
+        tree = self.get_binder().visit(tree)
+        head = self.get_head(tree)
+        tree.body[head:head] = body
+        fix_missing_locations(tree)
+        self.transformer.types_imported = True
+        return tree
+
+    def stream(self, tree, output_path):
+        """ Writes the tree bundled with its dependencies to the output file statement by statement. Modules are
+        read again when they are emitted and released right after, so only one module is kept in memory. The
+        unreachable modules aren't pruned after tree shaking. Returns False without writing the file if the tree has
+        no inlined imports. """
+        self.graph.keep_trees = False
+        roots = self.graph.build(tree)
+        if not roots:
+            return False
+        order = self.get_order(roots)
+        tree = self.get_binder().visit(tree)
+        head = self.get_head(tree)
+        codegen = self.transformer.codegen
+        with open(output_path, 'w') as out:
+            out.write(codegen.to_source(fix_missing_locations(Module(body=tree.body[:head], type_ignores=[]))))
+            out.write(codegen.to_source(fix_missing_locations(Module(body=self.get_preamble(order),
+                                                                     type_ignores=[]))))
+            for path in order:
+                self.shake_module(path)
+                statement = self.get_module_statement(path)
+                self.graph.release(path)
+                out.write(codegen.to_source(fix_missing_locations(Module(body=[statement], type_ignores=[]))))
+            out.write(codegen.to_source(fix_missing_locations(Module(body=tree.body[head:], type_ignores=[]))))
+        self.transformer.types_imported = True
+        return True
+
+    def shake_module(self, path):
+        """ Shakes the module loaded for the streaming output. """
+        tree = self.graph.load(path)
+        names = self.graph.get_shaken_names(path)
+        if not self.transformer.tree_shaking or names is None:
+            return
+        result = ModuleShaker(tree).shake(names, self.graph.sources[path])
+        if result.removed_statements:
+            self.graph.shaken.add(path)
+            self.transformer.report_shaking(path, result)
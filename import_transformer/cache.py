@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from . import __version__
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENTRY_SUFFIX = '.json'
+TEMPORARY_SUFFIX = '.tmp'
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+# Number of the writes after which the size of the cache directory is counted again, as the other processes write
+# to it as well.
+EVICT_INTERVAL = 100
+# Age in seconds of the temporary files which are left by the crashed writers.
+STALE_AGE = 3600
+
+
+def get_hash(sources):
+    """ Returns hash of the sources. """
+    return hashlib.sha256(sources.encode('utf-8')).hexdigest()
+
+
+class ModuleCache(object):
+    """ Memoizes parsed and transformed sources of the modules, so each module is processed once per run.
+    The cache is shared by all nested transformers of the run, and can be shared by the transformers running in the
+    different threads. If the size of the cached sources exceeds max_size bytes, the least recently used modules are
+    evicted and transformed again when they are needed. """
+
+    def __init__(self, max_size=None, keep_trees=False):
+        """
+        max_size: Memory budget of the cached sources in bytes, unlimited by default.
+        keep_trees: Keep the transformed AST of every module, otherwise they are released once the sources are
+            generated.
+        """
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.keep_trees = keep_trees
+        self.trees = {}
+        self.sources = OrderedDict()
+        # {module path: size of the sources in bytes}
+        self.sizes = {}
+        self.nbytes = 0
+        self.evictions = 0
+        self.dependencies = {}
+        self.source_hashes = {}
+        # {module path: constants of the module or None}, see folding.get_module_constants.
+        self.constants = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, path):
+        return path in self.sources
+
+    def __len__(self):
+        return len(self.sources)
+
+    def get(self, path):
+        """ Returns transformed sources of the module or None if the module hasn't been processed yet. """
+        entry = self.get_entry(path)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, path):
+        """ Returns (sources, dependencies) of the module or None if the module hasn't been processed yet. """
+        with self._lock:
+            sources = self.sources.get(path)
+            if sources is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.sources.move_to_end(path)
+            return sources, self.dependencies[path]
+
+    def add(self, path, tree, sources, dependencies=None):
+        """ Stores transformed AST and sources of the module.
+        dependencies: {module path: sources hash} map of the modules inlined into the module sources. """
+        with self._lock:
+            if self.keep_trees:
+                self.trees[path] = tree
+            self.dependencies[path] = dependencies or {}
+            # Sources are stored last, as they mark the module as processed.
+            self.sources[path] = sources
+            self.sources.move_to_end(path)
+            self.nbytes += sys.getsizeof(sources) - self.sizes.get(path, 0)
+            self.sizes[path] = sys.getsizeof(sources)
+            self._evict()
+
+    def evict(self):
+        """ Removes the least recently used modules until the cache fits max_size, the last added module is kept. """
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while self.max_size is not None and self.nbytes > self.max_size and len(self.sources) > 1:
+            path, _ = self.sources.popitem(last=False)
+            self._remove(path)
+            self.evictions += 1
+
+    def _remove(self, path):
+        self.sources.pop(path, None)
+        self.trees.pop(path, None)
+        self.dependencies.pop(path, None)
+        self.nbytes -= self.sizes.pop(path, 0)
+
+    def invalidate(self, paths):
+        """ Removes the modules which inline any of the module paths, and the source hashes of the paths.
+        Returns keys of the removed modules. """
+        paths = set(paths)
+        with self._lock:
+            removed = [key for key, dependencies in self.dependencies.items() if paths.intersection(dependencies)]
+            for key in removed:
+                self._remove(key)
+            for path in paths:
+                self.source_hashes.pop(path, None)
+                self.constants.pop(path, None)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self.sources.clear()
+            self.sizes.clear()
+            self.nbytes = self.evictions = 0
+            self.trees.clear()
+            self.dependencies.clear()
+            self.source_hashes.clear()
+            self.constants.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def info(self):
+        """ Returns statistics of the cache usage. """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class PersistentCache(object):
+    """ On-disk cache of the transformed sources, shared between the runs and the processes.
+    Entries are keyed by hash of the sources, transformer version and transformation options. Every entry is
+    written to temporary file and atomically renamed, so concurrent writers never expose partial entries.
+    Least recently used entries are evicted once total size of the cache exceeds max_size bytes. The size is counted
+    by the writes of the instance, the directory is listed on the first write, once the size exceeds max_size and
+    every EVICT_INTERVAL writes, as the other processes write to the cache as well. """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # Approximate total size of the entries in bytes, None until the directory is listed.
+        self.size = None
+        self.writes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getstate__(self):
+        """ The cache is passed to the worker processes without its lock. """
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_default_directory(transform_package_path):
+        """ Returns cache directory located next to the transformation output. """
+        return os.path.join(transform_package_path, 'tmp', 'transform_cache')
+
+    @staticmethod
+    def get_key(name, sources, options):
+        """ Returns key of the cache entry of the module or file. """
+        key_data = json.dumps([__version__, name, sources, options], sort_keys=True)
+        return get_hash(key_data)
+
+    def get_entry_path(self, key):
+        return os.path.join(self.directory, key + CACHE_ENTRY_SUFFIX)
+
+    def get(self, key):
+        """ Returns cache entry or None if there is no valid entry for the key. """
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path) as fh:
+                entry = json.load(fh)
+            # Refresh access time of the entry for the eviction order.
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def set(self, key, entry):
+        """ Stores cache entry and evicts the least recently used entries if cache is oversized. """
+        entry_path = self.get_entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=TEMPORARY_SUFFIX)
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(entry, fh)
+                size = fh.tell()
+            try:
+                size -= os.stat(entry_path).st_size
+            except OSError:
+                pass
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            logger.warning('Failed to store cache entry %s.', key, exc_info=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self.writes += 1
+            if self.size is not None:
+                self.size += size
+            evict = self.size is None or self.size > self.max_size or not self.writes % EVICT_INTERVAL
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """ Removes the least recently used entries until cache fits max_size, and the temporary files left by the
+        crashed writers. """
+        entries = []
+        total_size = 0
+        stale_time = time.time() - STALE_AGE
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+                if entry.name.endswith(TEMPORARY_SUFFIX) and stat.st_mtime < stale_time:
+                    os.remove(entry.path)
+            except OSError:
+                # Removed by the concurrent writer.
+                continue
+            if entry.name.endswith(CACHE_ENTRY_SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+        with self._lock:
+            self.size = total_size
@@ -0,0 +1,124 @@
+import os
+import sys
+import logging
+import argparse
+
+from .batch import find_files, transform_many
+from .codegen import CODEGENS
+from .payloads import DEFAULT_THRESHOLD, PAYLOADS, CompressedPayload, get_payload_encoder
+from .stats import TransformStats
+from .watch import Watcher
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='import-transformer',
+                                     description='Replaces imports of the package modules with their sources.')
+    parser.add_argument('paths', nargs='+', help='Transforming files or directories to search them in.')
+    parser.add_argument('-p', '--package-path', default=os.getcwd(),
+                        help='Path under which imports will be transformed (current directory by default).')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='Number of the worker processes or threads (number of CPUs by default).')
+    parser.add_argument('--threads', action='store_true',
+                        help='Transform the files by the pool of threads instead of the processes, implies '
+                             '--static-resolution.')
+    parser.add_argument('--cache-size', type=int, default=None, metavar='BYTES',
+                        help='Memory budget of the transformed modules kept by every worker (unlimited by default).')
+    parser.add_argument('--pattern', default='*.py', help='Pattern of the files searched in the directories.')
+    parser.add_argument('--static-resolution', action='store_true',
+                        help='Resolve imports without importing the modules when possible.')
+    parser.add_argument('--persistent-cache', nargs='?', const=True, default=None, metavar='DIRECTORY',
+                        help='Keep transformed sources in the persistent cache (tmp/transform_cache by default).')
+    parser.add_argument('--module-index', nargs='?', const=True, default=None, metavar='FILE',
+                        help='Resolve the modules by the index of the package path kept in FILE '
+                             '(in the tmp directory by default) between the runs.')
+    parser.add_argument('--bundle', action='store_true',
+                        help='Emit every inlined module once, in topological order of the dependency graph.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Write the bundle module by module, keeping one module in memory (implies --bundle).')
+    parser.add_argument('--archive', action='store_true',
+                        help='Write executable zip archive of the file and the modules it imports instead of inlining.')
+    parser.add_argument('--registry', action='store_true',
+                        help='Keep the inlined modules in the registry instead of declaring them at every import.')
+    parser.add_argument('--sys-modules', action='store_true',
+                        help='Register the inlined modules in sys.modules, imported by name without reloading.')
+    parser.add_argument('--trace', action='store_true', help='Print the transformed imports when they are executed.')
+    parser.add_argument('--payload', choices=sorted(PAYLOADS), default='source',
+                        help='Form of the inlined modules: sources, code objects compiled at transformation time '
+                             '(all the modules with --bundle only) or compressed sources.')
+    parser.add_argument('--compression-level', type=int, default=None,
+                        help='Compression level of the zlib and lzma payloads (codec default by default).')
+    parser.add_argument('--compression-threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help='Size in bytes of the modules which are compressed by the zlib and lzma payloads.')
+    parser.add_argument('--codegen', choices=['auto'] + sorted(CODEGENS), default='astor',
+                        help='Backend rendering the transformed sources.')
+    parser.add_argument('--tree-shaking', action='store_true',
+                        help='Inline only the definitions needed by the names imported from the modules, '
+                             'ignored with --sys-modules.')
+    parser.add_argument('--fold-constants', action='store_true',
+                        help='Bind the names imported from the modules of literals directly to their values.')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Execute bodies of the inlined modules on the first access to their attributes.')
+    parser.add_argument('--eager-module', action='append', default=[], dest='eager_modules', metavar='MODULE',
+                        help='Module or package executed eagerly in the lazy mode, can be repeated.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep polling the files and transform the entries affected by the changes again.')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between the polls in the watch mode.')
+    parser.add_argument('--stats', nargs='?', type=int, const=10, default=None, metavar='COUNT',
+                        help='Print the modules which took the longest time to transform (10 by default).')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log progress of the transformation.')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    output_directory = os.path.join(os.path.abspath(args.package_path), 'tmp')
+    fpaths = []
+    for path in args.paths:
+        fpaths += find_files(path, args.pattern, exclude=[output_directory]) if os.path.isdir(path) else [path]
+    payload = args.payload
+    if issubclass(PAYLOADS[payload], CompressedPayload):
+        payload = get_payload_encoder(payload, level=args.compression_level, threshold=args.compression_threshold)
+    options = dict(static_resolution=args.static_resolution, persistent_cache=args.persistent_cache,
+                   bundle=args.bundle, payload=payload, codegen=args.codegen, tree_shaking=args.tree_shaking,
+                   lazy=args.lazy, eager_modules=args.eager_modules, stats=args.stats is not None,
+                   stream=args.stream, archive=args.archive, registry=args.registry, trace=args.trace,
+                   sys_modules=args.sys_modules, module_index=args.module_index,
+                   fold_constants=args.fold_constants)
+    if args.watch:
+        watcher = Watcher(fpaths, args.package_path, interval=args.interval, cache_size=args.cache_size, **options)
+        try:
+            watcher.watch(print_reports)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    reports = transform_many(fpaths, args.package_path, processes=args.processes, threads=args.threads,
+                             cache_size=args.cache_size, **options)
+    print_reports(reports)
+    if args.stats is not None:
+        print_stats(reports, args.stats)
+    return 1 if any(report.error for report in reports) else 0
+
+
+def print_reports(reports):
+    for report in reports:
+        if report.error:
+            status = 'failed: {}'.format(report.error)
+        else:
+            status = '-> {}'.format(report.output_path) if report.modified else 'unchanged'
+        print('{} {} ({:.3f}s)'.format(report.path, status, report.duration))
+
+
+def print_stats(reports, count):
+    stats = TransformStats()
+    for report in reports:
+        stats.update(report.stats or {})
+    print('Slowest modules:')
+    for module, duration in stats.get_slowest(count):
+        print('  {:.4f}s {}'.format(duration, module))
+    for phase, total in sorted(stats.totals.items()):
+        print('{}: {:.4f}s in {} calls'.format(phase, total['time'], total['count']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import ast
+
+import astor
+
+
+class AstorCodegen(object):
+    """ Renders AST with the astor pretty printer. Keeps output byte-identical to the previous releases. """
+    name = 'astor'
+    # Whether sources of the modules without transformed imports are emitted as is.
+    reuse_sources = False
+
+    def to_source(self, tree):
+        return astor.to_source(tree, indent_with=' ' * 4, add_line_information=False)
+
+
+class UnparseCodegen(AstorCodegen):
+    """ Renders AST with the ast.unparse of the standard library (python 3.9+). Sources of the modules without
+    transformed imports are emitted as is. """
+    name = 'unparse'
+    reuse_sources = True
+
+    def to_source(self, tree):
+        return ast.unparse(tree) + '\n'
+
+
+CODEGENS = {codegen.name: codegen for codegen in (AstorCodegen, UnparseCodegen)}
+
+
+def get_codegen(codegen):
+    """ Returns code generator by its name. 'auto' selects ast.unparse where it's available. Code generator instances
+    are returned as is. """
+    if isinstance(codegen, AstorCodegen):
+        return codegen
+    if codegen == 'auto':
+        codegen = UnparseCodegen.name if hasattr(ast, 'unparse') else AstorCodegen.name
+    if codegen == UnparseCodegen.name and not hasattr(ast, 'unparse'):
+        raise ValueError('ast.unparse is not available in this python version.')
+    try:
+        return CODEGENS[codegen]()
+    except KeyError:
+        raise ValueError('Unknown codegen {!r}, expected one of: auto, {}.'.format(codegen, ', '.join(CODEGENS)))
@@ -0,0 +1,55 @@
+import ast
+from ast import AnnAssign, Assign, Expr, ImportFrom, Name, Str
+
+
+# Types of the literals which are folded, values of the other types may be mutated through the module.
+IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), type(Ellipsis))
+
+
+def is_immutable(value):
+    """ Checks whether the literal value can't be changed, so its copies are indistinguishable from it. """
+    if isinstance(value, (tuple, frozenset)):
+        return all(is_immutable(item) for item in value)
+    return isinstance(value, IMMUTABLE_TYPES)
+
+
+def is_foldable(node):
+    """ Checks whether the value expression of the constant may replace the attribute of its module. """
+    return is_immutable(ast.literal_eval(node))
+
+
+def get_module_constants(tree):
+    """ Returns {name: value expression} of the module, whose top level statements only bind the names to literals
+    (besides the docstring and the future imports), None is returned for the other modules. Such module has no side
+    effects, so the names imported from it can be bound to their values without execution of the module. """
+    constants = {}
+    for index, statement in enumerate(tree.body):
+        if index == 0 and isinstance(statement, Expr) and isinstance(statement.value, Str):
+            continue
+        if isinstance(statement, ImportFrom) and statement.module == '__future__':
+            continue
+        if isinstance(statement, Assign):
+            targets = statement.targets
+        elif isinstance(statement, AnnAssign) and statement.simple and statement.value is not None:
+            targets = [statement.target]
+        else:
+            return None
+        if not all(isinstance(target, Name) for target in targets):
+            return None
+        try:
+            ast.literal_eval(statement.value)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            return None
+        for target in targets:
+            constants[target.id] = statement.value
+    return constants
+
+
+def get_exported_names(constants):
+    """ Returns names bound by the star import of the constants module, None if its __all__ isn't valid. """
+    if '__all__' not in constants:
+        return sorted(name for name in constants if not name.startswith('_'))
+    names = ast.literal_eval(constants['__all__'])
+    if not isinstance(names, (list, tuple)) or not all(isinstance(name, str) and name in constants for name in names):
+        return None
+    return list(names)
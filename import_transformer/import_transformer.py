@@ -1,87 +1,485 @@
+import copy
 import importlib
 import sys
 import os
 import inspect
 import ntpath
+from collections import namedtuple
+from importlib.machinery import PathFinder
+from importlib.util import decode_source, module_from_spec
 from ast import (NodeTransformer, Import, Expr, Call, Name, Load, Str, parse, Attribute, Assign, Store, Module,
-                 fix_missing_locations, alias, If, Dict, Not, UnaryOp)
+                 fix_missing_locations, alias, If, Dict, Not, UnaryOp, Pass)
 import logging
 
-import astor
-
+from .archive import ARCHIVE_SUFFIX, ArchiveBuilder
+from .bundler import Bundler, ImportsBinder, ImportsCollector, ModuleGraph, is_exposed
+from .cache import ModuleCache, PersistentCache, get_hash
+from .codegen import get_codegen
+from .folding import get_exported_names, get_module_constants, is_foldable
+from .index import get_module_index
+from .payloads import SOURCE_PAYLOAD, get_payload_encoder
+from .resolver import ModuleResolver
+from .runtime import (IMPORT_ALL, INLINE_BODY, LAZY_MODULE, LAZY_PAYLOAD, get_lazy_module_type, get_package_declaration,
+                      get_registry_module, get_registry_namespace, get_runtime)
+from .shaking import ModuleShaker
+from .stats import CODEGEN, PARSE, READ, RESOLUTION, TRANSFORM, WRITE, get_stats
 
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 logger = logging.getLogger(__name__)
 
-IMPORT_ALL = '*'
+# Imported module or object of the import statement: path of the module, alias used in the import, the module
+# imported from and whether the module itself is imported.
+ImportRecord = namedtuple('ImportRecord', ['path', 'alias', 'from_module', 'is_module'])
+
+
+def get_output_path(transform_package_path, fpath, archive=False):
+    """ Returns path of the file which transformed sources of the fpath are written to, the output files of the
+    files with the same name are the same. """
+    fname = ntpath.basename(fpath)
+    if archive:
+        fname = os.path.splitext(fname)[0] + ARCHIVE_SUFFIX
+    return os.path.join(os.path.abspath(transform_package_path), 'tmp', 'transformed_imports_{}'.format(fname))
 
 
 class ImportsTransformer(NodeTransformer):
-    """ Performs transformation of the imported modules and objects of the provided file. """
-    types_imported = False
+    """ Performs transformation of the imported modules and objects of the provided file. The state of the
+    transformation is kept by the instance, and the caches, resolver and stats shared between the instances are
+    thread safe, so the instances can transform the files concurrently in the threads of one process. The modules
+    which are imported to resolve them are looked up in the search path of the file, sys.path isn't changed. """
 
-    def __init__(self, transform_package_path='/'):
+    def __init__(self, transform_package_path='/', static_resolution=False, cache=None, persistent_cache=None,
+                 bundle=False, payload='source', codegen='astor', tree_shaking=False, lazy=False, eager_modules=(),
+                 stats=None, stream=False, archive=False, registry=False, trace=False, sys_modules=False,
+                 module_index=None, fold_constants=False):
         """
         Initialize import transformer.
         transform_package_path: Defines path under which imports will be transformed.
+        static_resolution: Resolve imports by spec lookup and file system inspection instead of importing them.
+            The modules are imported only when static analysis can't decide. ModuleResolver instance can be passed
+            to share resolution results between the transformers.
+        cache: ModuleCache shared by the transformers of the run, the new one is created if not provided.
+        persistent_cache: PersistentCache or its directory, which keeps transformed sources between the runs.
+            If True the cache is kept in the tmp directory of the transform_package_path.
+        bundle: Emit body of every inlined module once, in topological order of the dependency graph, execute it at
+            its first import site and bind imported names to the modules at the import sites.
+        payload: Form of the inlined modules in the output: 'source' or 'bytecode', which embeds code objects
+            compiled at transformation time (all the modules are loaded from them with bundle only). Payload encoder
+            instance can be passed as well. Only the modules inlined into the file are encoded, the modules they
+            inline are embedded in their sources as is.
+        codegen: Backend rendering the sources: 'astor' (byte-identical output of the previous releases), 'unparse'
+            (ast.unparse, which reuses sources of the modules without transformed imports) or 'auto'.
+        tree_shaking: Inline only the definitions needed to produce the names imported with from X import name,
+            removed statements and bytes are reported to the shaking_report. Ignored with sys_modules, since the
+            modules registered in sys.modules can be imported by their names anywhere.
+        lazy: Defer execution of the inlined module bodies until the first access to their attributes. Star imports
+            are always executed eagerly.
+        eager_modules: Paths of the modules and packages which are executed eagerly in the lazy mode, for the
+            modules relying on the import time side effects.
+        stats: Record time and number of calls of the transformation phases per module to the TransformStats, which
+            is shared with the nested transformers. True creates new TransformStats, instance can be passed to share
+            it or to attach the hooks. Disabled stats cost a no-op call per phase.
+        stream: Write the bundle to the output file module by module, releasing every module once it's written, so
+            the memory is bounded by the largest module rather than by the output. Implies bundle, the persistent
+            cache isn't used and transform_file_imports returns None for the transformed files.
+        archive: Write executable zip archive of the file and the modules it reaches under transform_package_path
+            instead of inlining them. The modules are imported by zipimport from the bytecode compiled at
+            transformation time. The persistent cache isn't used and transform_file_imports returns None for the
+            transformed files.
+        registry: Keep the inlined modules in the registry dict created by the runtime emitted once per file, instead
+            of declaring them with the locals() guard chains at every import site. Body of every module is executed
+            once, parent packages are wired when the module is created.
+        trace: Print every transformed import statement when it's executed.
+        sys_modules: Register the inlined modules and their parent packages in sys.modules before execution of their
+            bodies, so the later imports of the modules by their names don't load them again. Modules imported before
+            the inlined ones are used as is. Parent packages under transform_package_path are inlined and executed
+            before their submodules, as python imports them. Inlined packages get __path__ of their directories at
+            transformation time, so their submodules which aren't inlined are imported from there. Implies registry
+            unless bundle is used.
+        module_index: Resolve the modules under transform_package_path by the ModuleIndex built once per run instead
+            of the spec lookups. True keeps the index in the tmp directory of the transform_package_path between the
+            runs, path of the index file or ModuleIndex instance can be passed as well. Implies static_resolution,
+            ModuleResolver passed as static_resolution is used as is.
+        fold_constants: Bind the names imported from the modules which only assign immutable literals directly to
+            their values, without creation and execution of the modules.
         """
-        super(ImportsTransformer).__init__()
+        super().__init__()
         self.transform_package_path = os.path.abspath(transform_package_path)
-        self.initialized = {}
+        # Paths of the modules initialized by the transforming sources.
+        self.initialized = set()
+        # Paths of the packages declared with their search paths by the transforming sources.
+        self.packages = set()
+        self.types_imported = False
+        # Search path of the transforming file: its directory followed by sys.path, None until it's transformed.
+        self.search_path = None
+        self.module_index = get_module_index(module_index, self.transform_package_path)
+        if static_resolution is True or (self.module_index is not None and not static_resolution):
+            static_resolution = ModuleResolver(self.module_index)
+        self.resolver = static_resolution or None
+        self.cache = ModuleCache() if cache is None else cache
+        if persistent_cache is True:
+            persistent_cache = PersistentCache.get_default_directory(self.transform_package_path)
+        if isinstance(persistent_cache, str):
+            persistent_cache = PersistentCache(persistent_cache)
+        self.persistent_cache = persistent_cache
+        self.stream = stream
+        self.archive = archive
+        self.sys_modules = sys_modules
+        self.registry = registry or (sys_modules and not (bundle or stream))
+        self.trace = trace
+        # Nested transformers transform sources of the inlined modules, which share the runtime of the file.
+        self.nested = False
+        self.bundle = bundle or stream
+        self.payload = get_payload_encoder(payload)
+        self.codegen = get_codegen(codegen)
+        self.tree_shaking = tree_shaking and not sys_modules
+        self.fold_constants = fold_constants
+        self.lazy = lazy
+        self.eager_modules = tuple(eager_modules)
+        self.stats = get_stats(stats)
+        # {module path: names imported from the module by the transforming sources}
+        self.imported_names = {}
+        # Hash of the imported_names of the whole file, which the inlined sources depend on with the registry.
+        self.shaking_key = None
+        # {module key: {'statements': removed statements, 'bytes': removed bytes}}, shared with nested transformers.
+        self.shaking_report = {}
+        # {module path: sources hash} map of the modules inlined into the transforming sources.
+        self.dependencies = {}
 
     @property
     def is_modified(self):
         """ If that flag is True the sources was modified. """
         return self.types_imported
 
+    @property
+    def options(self):
+        """ Returns options which affect the transformation output. """
+        return dict(self.payload.options, transform_package_path=self.transform_package_path, bundle=self.bundle,
+                    codegen=self.codegen.name, tree_shaking=self.tree_shaking, lazy=self.lazy,
+                    registry=self.registry, trace=self.trace, sys_modules=self.sys_modules,
+                    fold_constants=self.fold_constants,
+                    eager_modules=sorted(self.eager_modules) if self.lazy else [])
+
+    def is_lazy(self, path):
+        """ Checks whether body of the inlined module shall be executed on the first access to its attributes. """
+        return self.lazy and not any(path == module or path.startswith(module + '.') for module in self.eager_modules)
+
     def _to_transform(self, node):
         """ Checks whether import shall be transformed. """
         module_path = getattr(node, 'module', '')
         if not module_path:
             module_path = node.names[0].name
-        module = importlib.import_module(module_path)
-        return module_path not in sys.builtin_module_names and self.transform_package_path in module.__file__
+        if module_path in sys.builtin_module_names:
+            return False
+        with self.stats.measure(RESOLUTION, module_path):
+            return self.transform_package_path in self.get_module_location(module_path)
+
+    def get_module_location(self, module_path):
+        """ Returns the file of the module, importing it only if the file can't be found statically. """
+        location = self.resolver.get_location(module_path, self.search_path) if self.resolver else None
+        if location is None:
+            location = self.import_module(module_path).__file__
+        return location
+
+    def is_module(self, module_path):
+        """ Checks whether the path points to a module rather than to an object of its parent module. """
+        is_module = self.resolver.is_module(module_path, self.search_path) if self.resolver else None
+        if is_module is None:
+            try:
+                self.import_module(module_path)
+                is_module = True
+            except ModuleNotFoundError:
+                is_module = False
+        return is_module
+
+    def get_package_locations(self, module_path):
+        """ Returns search path of the submodules of the package, None if the path points to the plain module. """
+        location = self.resolver.get_location(module_path, self.search_path) if self.resolver else None
+        if location is None:
+            locations = getattr(self.import_module(module_path), '__path__', None)
+            return None if locations is None else list(locations)
+        if os.path.isdir(location):
+            return [location]
+        if os.path.splitext(os.path.basename(location))[0] == '__init__':
+            return [os.path.dirname(location)]
+        return None
+
+    def get_package_declarations(self, path):
+        """ Returns statements creating the module and its parent packages which aren't declared yet, with the
+        search paths of the packages, so their submodules which aren't inlined are imported by their real names. """
+        if not self.sys_modules:
+            return []
+        declarations = []
+        parts = path.split('.')
+        for index in range(1, len(parts) + 1):
+            package = '.'.join(parts[:index])
+            if package in self.packages:
+                continue
+            self.packages.add(package)
+            locations = self.get_package_locations(package)
+            if locations is not None:
+                declarations.append(get_package_declaration(package, locations))
+        return declarations
+
+    def get_inlined_packages(self, path):
+        """ Returns parent packages of the module under transform_package_path, which are inlined before it with
+        sys_modules, so the packages are registered with their __init__ executed, as python imports them. """
+        if not self.sys_modules:
+            return []
+        parts = path.split('.')
+        packages = ['.'.join(parts[:index]) for index in range(1, len(parts))]
+        return [package for package in packages
+                if self.transform_package_path in (self.get_module_location(package) or '')]
+
+    def read_sources(self, path):
+        """ Returns the original sources of the module, importing it only if they can't be found statically. """
+        with self.stats.measure(READ, path):
+            sources = self.resolver.get_source(path, self.search_path) if self.resolver else None
+            if sources is None:
+                sources = self.get_module_sources(self.import_module(path))
+        return sources
+
+    @staticmethod
+    def get_module_sources(module):
+        """ Returns sources of the imported module, empty string for the namespace packages as the resolver does. """
+        location = getattr(module, '__file__', None)
+        if location is None and hasattr(module, '__path__'):
+            return ''
+        try:
+            return inspect.getsource(module)
+        except OSError:
+            # inspect can't get sources of the empty files.
+            if not (location or '').endswith('.py'):
+                raise
+            with open(location, 'rb') as fh:
+                return decode_source(fh.read())
+
+    def import_module(self, module_path):
+        """ Imports the module, looking its top level package up in the search path of the transforming file rather
+        than in sys.path, so the concurrent transformers don't import the modules of each other's files. """
+        top_level = module_path.partition('.')[0]
+        if self.search_path and top_level not in sys.modules:
+            spec = PathFinder.find_spec(top_level, list(self.search_path))
+            if spec is not None:
+                module = module_from_spec(spec)
+                sys.modules[top_level] = module
+                try:
+                    spec.loader.exec_module(module)
+                except BaseException:
+                    sys.modules.pop(top_level, None)
+                    raise
+        return importlib.import_module(module_path)
+
+    def get_nested_transformer(self):
+        """ Returns transformer for the sources of the importing module, which shares configuration of the current
+        transformer. """
+        transformer = copy.copy(self)
+        transformer.reset()
+        transformer.nested = True
+        # Sources of the inlined modules are encoded once, by the payload of the file they are inlined into.
+        # Encoding them at every level would embed the sources of the deeper modules once per level above.
+        transformer.payload = SOURCE_PAYLOAD
+        if self.registry:
+            # Every module is executed once from the registry, so it's shaken to the names imported by the whole file.
+            transformer.imported_names = self.imported_names
+            transformer.shaking_key = self.shaking_key
+        return transformer
+
+    def reset(self):
+        """ Forgets the state of the transformed sources, so the next sources are transformed from scratch. """
+        self.initialized = set()
+        self.packages = set()
+        self.types_imported = False
+        self.dependencies = {}
+        self.imported_names = {}
+        self.shaking_key = None
+
+    def get_module_key(self, path, names=None):
+        """ Returns key of the module sources in the caches, names are the names the module is shaken to. """
+        key = path if names is None else '{}:{}'.format(path, ','.join(sorted(names)))
+        return key if self.shaking_key is None else '{}@{}'.format(key, self.shaking_key)
+
+    def get_imported_names(self, tree):
+        """ Returns {module path: imported names} map of the transforming imports of the tree. Names are None if
+        the module itself is imported or with the star import, or it's reachable as an attribute of a package bound to
+        a name. With the registry the names imported by all the modules reachable from the tree are merged, since
+        every module is executed once for all of them. """
+        if self.registry:
+            graph = ModuleGraph(self, keep_trees=False)
+            graph.build(tree)
+            names = {path: graph.get_shaken_names(path) for path in graph.names}
+            self.shaking_key = get_hash(repr(sorted((path, path_names if path_names is None else sorted(path_names))
+                                                    for path, path_names in names.items())))
+            return names
+        collector = ImportsCollector(self)
+        collector.visit(tree)
+        return {path: None if is_exposed(path, collector.exposed) else names for path, names in collector.names.items()}
+
+    def report_shaking(self, key, result):
+        """ Records ShakeResult of the module to the shaking_report. """
+        logger.info('Tree shaking of %s removed %s statements, %s bytes.', key, result.removed_statements,
+                    result.removed_bytes)
+        self.shaking_report[key] = {'statements': result.removed_statements, 'bytes': result.removed_bytes}
+
+    def get_source_hash(self, path):
+        """ Returns hash of the original sources of the module. """
+        if path not in self.cache.source_hashes:
+            self.cache.source_hashes[path] = get_hash(self.read_sources(path))
+        return self.cache.source_hashes[path]
+
+    def get_persistent_entry(self, name, sources):
+        """ Returns key and entry of the persistent cache. Entry is None if it's missing or any of the inlined modules
+        has been changed since it was stored. """
+        key = self.persistent_cache.get_key(name, sources, self.options)
+        entry = self.persistent_cache.get(key)
+        if entry is None:
+            return key, None
+        for path, source_hash in entry['dependencies'].items():
+            try:
+                if self.get_source_hash(path) != source_hash:
+                    return key, None
+            except (ImportError, OSError):
+                return key, None
+        return key, entry
+
+    def get_constants(self, path):
+        """ Returns {name: value expression} of the module which only assigns literals, None for other modules. """
+        if path not in self.cache.constants:
+            sources = self.read_sources(path)
+            with self.stats.measure(PARSE, path):
+                tree = parse(sources, path)
+            self.cache.constants[path] = get_module_constants(tree)
+        return self.cache.constants[path]
+
+    def is_folded(self, path, names):
+        """ Checks whether all the names imported from the module are folded to their values. """
+        if not self.fold_constants or names is None:
+            return False
+        constants = self.get_constants(path)
+        return constants is not None and all(name in constants and is_foldable(constants[name]) for name in names)
+
+    def get_folded_assignments(self, node_name, node_info):
+        """ Returns statements binding the imported names to the values of the module constants, None if the names
+        can't be folded: the module isn't constants module, the module itself is imported or the values are mutable.
+        """
+        if not self.fold_constants or node_info.is_module:
+            return None
+        path = node_info.path
+        constants = self.get_constants(path)
+        if constants is None:
+            return None
+        if node_name == IMPORT_ALL:
+            names = get_exported_names(constants)
+            targets = names
+        else:
+            names = [node_name]
+            targets = [node_info.alias or node_name]
+        if names is None or not all(name in constants and is_foldable(constants[name]) for name in names):
+            return None
+        # Folded module is never executed, but it's still the dependency of the output.
+        self.dependencies[path] = self.get_source_hash(path)
+        return [Assign(targets=[Name(id=target, ctx=Store())], value=copy.deepcopy(constants[name]))
+                for target, name in zip(targets, names)]
 
     def get_sources(self, path):
         """ Returns the sources of selected module. If the sources aren't available ( init file) returns None. """
-        module = importlib.import_module(path)
-        sources = inspect.getsource(module)
-        # The sources of importing module may contain imports which suppose to be replaced to.
-        sources_ast = ImportsTransformer(self.transform_package_path).visit(parse(sources, path))
-        sources = astor.to_source(sources_ast, indent_with=' ' * 4, add_line_information=False)
+        names = self.imported_names.get(path) if self.tree_shaking else None
+        module_key = self.get_module_key(path, names)
+        entry = self.cache.get_entry(module_key)
+        if entry is None:
+            entry = self.transform_module(path, names)
+        sources, dependencies = entry
+        self.dependencies.update(dependencies)
         return sources
 
+    def transform_module(self, path, names=None):
+        """ Transforms the sources of the module and stores them in the caches. Returns the sources and
+        {module path: sources hash} map of the modules inlined into them.
+        names: Names imported from the module, other definitions are removed from the sources. """
+        module_key = self.get_module_key(path, names)
+        original_sources = self.read_sources(path)
+        source_hash = self.cache.source_hashes[path] = get_hash(original_sources)
+        key = None
+        if self.persistent_cache is not None:
+            key, entry = self.get_persistent_entry(module_key, original_sources)
+            if entry is not None:
+                self.cache.add(module_key, None, entry['sources'], entry['dependencies'])
+                return entry['sources'], entry['dependencies']
+        with self.stats.measure(PARSE, path):
+            tree = parse(original_sources, path)
+        shaken = False
+        if names is not None:
+            result = ModuleShaker(tree).shake(names, original_sources)
+            shaken = bool(result.removed_statements)
+            if shaken:
+                self.report_shaking(module_key, result)
+        transformer = self.get_nested_transformer()
+        if self.sys_modules:
+            # The module and its parent packages are being executed wherever the sources are inlined.
+            transformer.initialized.update(self.get_inlined_packages(path) + [path])
+        # The sources of importing module may contain imports which suppose to be replaced to.
+        with self.stats.measure(TRANSFORM, path):
+            sources_ast = transformer.visit(tree)
+        if self.codegen.reuse_sources and not transformer.is_modified and not shaken:
+            sources = original_sources
+        else:
+            with self.stats.measure(CODEGEN, path):
+                sources = self.codegen.to_source(sources_ast)
+        dependencies = dict(transformer.dependencies)
+        dependencies[path] = source_hash
+        self.cache.add(module_key, sources_ast, sources, dependencies)
+        if key is not None:
+            self.persistent_cache.set(key, {'sources': sources, 'dependencies': dependencies})
+        return sources, dependencies
+
     def get_transformed_import(self, node):
         """ Emulates importing of the module or it's constants. . """
+        if self.registry:
+            return self.get_registry_import(node)
         replacing_node_body = self.get_replacing_node_body()
         node_modules_map = self.get_node_modules(node)  # from package import subpackage, ClassA, FuncD
+        trace = None
+        handled = False
 
         for node_name, node_info in node_modules_map.items():
-            sources = self.get_sources(node_info['path'])
-            if sources is None:
+            folded = self.get_folded_assignments(node_name, node_info)
+            sources = self.get_sources(node_info.path) if folded is None else None
+            if folded is None and sources is None:
                 continue
+            handled = True
 
-            replacing_node_body.append(Expr(value=Call(func=Name(id='print', ctx=Load()),
-                                                       args=[Str(s=astor.to_source(node))],
-                                                       keywords=[])))
+            if self.trace:
+                trace = trace or self.get_trace(node)
+                replacing_node_body.append(trace)
+            if folded is not None:
+                replacing_node_body += folded
+                continue
             # for from foo.bar import *
             if node_name == IMPORT_ALL:
                 replacing_node_body.append(Expr(value=Call(
                     func=Name(id='exec', ctx=Load()),
-                    args=[Str(s=sources), Call(func=Name(id='locals', ctx=Load()), args=[], keywords=[])],
+                    args=[self.payload.encode(sources, node_info.path),
+                          Call(func=Name(id='locals', ctx=Load()), args=[], keywords=[])],
                     keywords=[]))
                 )
                 continue
-            if not self.initialized.get(node_info['path']):
-                replacing_node_body += self.get_module_assignments(node_info['path'])
-                replacing_node_body.append(Expr(value=Call(func=Name(id='exec', ctx=Load()),
-                                                           args=[Str(s=sources),
-                                                                 Attribute(value=Name(id=node_info['path'], ctx=Load()),
-                                                                           attr='__dict__',
-                                                                           ctx=Load())], keywords=[])))
-                self.initialized[node_info['path']] = True
+            if node_info.path not in self.initialized:
+                lazy = self.is_lazy(node_info.path)
+                payload = self.payload.encode(sources, node_info.path)
+                replacing_node_body += self.get_module_assignments(node_info.path, lazy)
+                if lazy:
+                    replacing_node_body.append(Assign(targets=[Attribute(value=Name(id=node_info.path, ctx=Load()),
+                                                                         attr=LAZY_PAYLOAD, ctx=Store())],
+                                                      value=payload))
+                else:
+                    replacing_node_body.append(Expr(value=Call(func=Name(id='exec', ctx=Load()),
+                                                               args=[payload,
+                                                                     Attribute(value=Name(id=node_info.path,
+                                                                                          ctx=Load()),
+                                                                               attr='__dict__',
+                                                                               ctx=Load())], keywords=[])))
+                self.initialized.add(node_info.path)
             # for import foo.bar.baz, but not import foo.bar.baz as fbz
-            if node_name == node_info['path'] and not node_info['alias']:
+            if node_name == node_info.path and not node_info.alias:
                 continue
             value = None
             items = node_name.split('.')
@@ -90,25 +488,71 @@ class ImportsTransformer(NodeTransformer):
                                   attr=items[index + 1], ctx=Load())
             # for from coco import bunny
             if value is None:
-                if node_info['is_module']:
-                    value = Name(id=node_info['path'], ctx=Load())
+                if node_info.is_module:
+                    value = Name(id=node_info.path, ctx=Load())
                 else:
-                    value = Attribute(value=Name(id=node_info['path'], ctx=Load()),
+                    value = Attribute(value=Name(id=node_info.path, ctx=Load()),
                                       attr=node_name, ctx=Load())
-            identifier = node_info['alias'] or node_name
+            identifier = node_info.alias or node_name
             assign_node = Assign(targets=[Name(id=identifier, ctx=Store())], value=value)
 
             replacing_node_body.append(assign_node)
 
-        replacing_node = Module(body=replacing_node_body)
-        return replacing_node if replacing_node_body else node
+        if not handled:
+            # Nothing is inlined, the import is kept as is.
+            return Module(body=replacing_node_body + [node], type_ignores=[]) if replacing_node_body else node
+        # Import of the initialized module binds nothing, but the import itself is still replaced.
+        return Module(body=replacing_node_body or [Pass()], type_ignores=[])
+
+    def get_trace(self, node):
+        """ Returns statement printing the import statement. """
+        return Expr(value=Call(func=Name(id='print', ctx=Load()), args=[Str(s=self.codegen.to_source(node))],
+                               keywords=[]))
+
+    def get_registry_import(self, node):
+        """ Emulates importing of the modules with the registry of the inlined modules: body of every module is
+        executed unless it's been executed already, and the imported names are bound to the modules. """
+        replacing_node_body = self.get_replacing_node_body()
+        node_modules_map = self.get_node_modules(node)
+        if self.trace:
+            replacing_node_body.append(self.get_trace(node))
+        for node_name, node_info in node_modules_map.items():
+            if self.get_folded_assignments(node_name, node_info) is not None:
+                continue
+            for path in self.get_inlined_packages(node_info.path) + [node_info.path]:
+                replacing_node_body += self.get_registry_body(path)
+        replacing_node_body += ImportsBinder(self).get_bindings(node_modules_map)
+        return Module(body=replacing_node_body, type_ignores=[])
+
+    def get_registry_body(self, path):
+        """ Returns statements executing body of the module from the registry, none if it's initialized already. """
+        if path in self.initialized:
+            return []
+        sources = self.get_sources(path)
+        if sources is None:
+            return []
+        self.initialized.add(path)
+        body = self.get_package_declarations(path)
+        payload = self.payload.encode(sources, path)
+        if self.is_lazy(path):
+            statement = Assign(targets=[Attribute(value=get_registry_module(path), attr=LAZY_PAYLOAD, ctx=Store())],
+                               value=payload)
+        else:
+            statement = Expr(value=Call(func=Name(id='exec', ctx=Load()),
+                                        args=[payload, get_registry_namespace(path)], keywords=[]))
+        body.append(If(test=Call(func=Name(id=INLINE_BODY, ctx=Load()), args=[Str(s=path)], keywords=[]),
+                       body=[statement], orelse=[]))
+        return body
 
     @staticmethod
-    def get_module_assignments(node_info_path):
+    def get_module_assignments(node_info_path, lazy=False):
         """ Returns module assignment nodes which declare ModuleType object in case
-        if this object has not been declared in the current scope. """
+        if this object has not been declared in the current scope. Lazy modules are declared if lazy is True. """
         target_id = ''
         module_assignments = []
+        module_type = Attribute(value=Name(id='types', ctx=Load()), attr='ModuleType', ctx=Load())
+        if lazy:
+            module_type = Name(id=LAZY_MODULE, ctx=Load())
         for item in node_info_path.split('.'):
             target_id += f'.{item}' if target_id else item
             target = Name(id=target_id, ctx=Store())
@@ -126,50 +570,59 @@ class ImportsTransformer(NodeTransformer):
                                       keywords=[])
             module_assignments.append(
                 If(test=UnaryOp(Not(), is_module_imported),
-                    body=[Assign(targets=[target], value=Call(func=Attribute(value=Name(id='types', ctx=Load()),
-                                                                             attr='ModuleType', ctx=Load()),
+                    body=[Assign(targets=[target], value=Call(func=module_type,
                                                               args=[Str(s=target.id), Str(s=f'The {target.id} module')],
                                                               keywords=[]))], orelse=[]))
         return module_assignments
 
     def get_node_modules(self, node):
         """
-        Process all importing items and build node modules and objects map.
-        :return dict {
-            'name': {
-                path: path to the sources,
-                alias: alias used in the import,
-                from_module: the root package of the module}
-        }
+        Process all importing items and build node modules and objects map. Module paths are interned, so the records
+        of the modules imported by many files share them.
+        :return dict {'name': ImportRecord}
         """
         if getattr(node, 'module', ''):
-            node_module = f'{node.module}'
+            node_module = sys.intern(node.module)
         else:
             # assert len(node.names) == 1
             node_module = ''
         modules = {}
 
-        for module_candidate in node.names:
-            try:
+        with self.stats.measure(RESOLUTION, node_module or node.names[0].name):
+            for module_candidate in node.names:
                 module_path = f'{node_module}.{module_candidate.name}' if node_module else module_candidate.name
-                importlib.import_module(module_path)
-                modules[module_candidate.name] = {'path': module_path, 'alias': module_candidate.asname,
-                                                  'from_module': node_module, 'is_module': True}
-            except ModuleNotFoundError:
-                # Importing of an object met.
-                modules[module_candidate.name] = {'path': node_module, 'alias': module_candidate.asname,
-                                                  'from_module': node_module, 'is_module': False}
+                if self.is_module(module_path):
+                    modules[module_candidate.name] = ImportRecord(sys.intern(module_path), module_candidate.asname,
+                                                                  node_module, True)
+                else:
+                    # Importing of an object met.
+                    modules[module_candidate.name] = ImportRecord(node_module, module_candidate.asname, node_module,
+                                                                  False)
         return modules
 
     def get_replacing_node_body(self) -> 'list':
         """ Returns replacing node body, which is [] or [ImportNode], where ImportNode = 'import types',
         used for further imports transformation and shall be imported once. """
         replacing_node_body = []
-        if not self.types_imported:
+        if not self.types_imported and self.registry:
+            # Sources of the inlined modules use the runtime of the file, which is injected to the modules.
+            if not self.nested:
+                replacing_node_body += get_runtime(self.lazy, self.sys_modules)
+            replacing_node_body += self.payload.get_imports()
+            self.types_imported = True
+        elif not self.types_imported:
             replacing_node_body.append(Import(names=[alias(name='types', asname=None)]))
+            replacing_node_body += self.payload.get_imports()
+            if self.lazy:
+                replacing_node_body += get_lazy_module_type()
             self.types_imported = True
         return replacing_node_body
 
+    def visit_Module(self, node):
+        if self.tree_shaking and not (self.registry and self.nested):
+            self.imported_names = self.get_imported_names(node)
+        return self.generic_visit(node)
+
     def visit_Import(self, node):
         if not self._to_transform(node):
             return node
@@ -184,25 +637,81 @@ class ImportsTransformer(NodeTransformer):
         fix_missing_locations(node)
         return node
 
+    def get_file_sources(self, fpath, initial_sources):
+        """ Returns transformed sources of the file, served from the persistent cache if they are up to date. """
+        key = None
+        if self.persistent_cache is not None:
+            key, entry = self.get_persistent_entry(os.path.abspath(fpath), initial_sources)
+            if entry is not None:
+                self.types_imported = entry['modified']
+                self.dependencies.update(entry['dependencies'])
+                return entry['sources']
+        with self.stats.measure(PARSE, fpath):
+            root = parse(initial_sources, fpath)
+        with self.stats.measure(TRANSFORM, fpath):
+            if self.bundle:
+                root = Bundler(self).bundle(root)
+            else:
+                self.visit(root)
+        sources = initial_sources
+        if self.is_modified:
+            with self.stats.measure(CODEGEN, fpath):
+                sources = self.codegen.to_source(root)
+        if key is not None:
+            self.persistent_cache.set(key, {'sources': sources, 'dependencies': self.dependencies,
+                                            'modified': bool(self.is_modified)})
+        return sources
+
+    def stream_file_sources(self, fpath, initial_sources):
+        """ Writes the bundle of the file to the output file. Returns None if the file has been transformed, initial
+        sources otherwise. """
+        with self.stats.measure(PARSE, fpath):
+            root = parse(initial_sources, fpath)
+        with self.stats.measure(TRANSFORM, fpath):
+            modified = Bundler(self).stream(root, self.get_output_path(fpath))
+        if not modified:
+            logger.info('File %s has no local subpackage dependencies. The transformation skipped.', fpath)
+            return initial_sources
+        logger.info('Completed streaming import transformation of %s .', fpath)
+        return None
+
+    def archive_file_sources(self, fpath, initial_sources):
+        """ Writes the archive of the file to the output file. Returns None if the file has been transformed, initial
+        sources otherwise. """
+        with self.stats.measure(PARSE, fpath):
+            root = parse(initial_sources, fpath)
+        with self.stats.measure(TRANSFORM, fpath):
+            modified = ArchiveBuilder(self).build(root, initial_sources, self.get_output_path(fpath))
+        if not modified:
+            logger.info('File %s has no local subpackage dependencies. The transformation skipped.', fpath)
+            return initial_sources
+        logger.info('Completed archiving of %s .', fpath)
+        return None
+
+    def get_output_path(self, fpath):
+        """ Returns path of the file which transformed sources of the fpath are written to. """
+        return get_output_path(self.transform_package_path, fpath, self.archive)
+
     def transform_file_imports(self, fpath):
         with open(fpath) as fh:
             initial_sources = fh.read()
-        root = parse(initial_sources, fpath)
+        self.reset()
+        # The directory of the file is searched first for correct processing of relative imports.
+        self.search_path = (os.path.dirname(fpath),) + tuple(sys.path)
         try:
-            # Changing directory for correct processing of relative imports.
-            sys.path.insert(0, os.path.dirname(fpath))
-            self.visit(root)
-        except Exception as exc:
-            raise exc
+            if self.archive:
+                return self.archive_file_sources(fpath, initial_sources)
+            if self.stream:
+                return self.stream_file_sources(fpath, initial_sources)
+            sources = self.get_file_sources(fpath, initial_sources)
         finally:
-            sys.path.pop(0)
+            if self.module_index is not None:
+                self.module_index.save()
 
         if not self.is_modified:
             logger.info('File %s has no local subpackage dependencies. The transformation skipped.', fpath)
             return initial_sources
         logger.info('Completed import transformation of %s .', fpath)
-        sources = astor.to_source(root, indent_with=' ' * 4, add_line_information=False)
-        fname = ntpath.basename(fpath)
-        with open(os.path.join(self.transform_package_path, 'tmp', 'transformed_imports_{}'.format(fname)), 'w+') as out:
+        with self.stats.measure(WRITE, fpath), open(self.get_output_path(fpath), 'w+') as out:
             out.write(sources)
         return sources
@@ -0,0 +1,328 @@
+import os
+import ast
+import json
+import logging
+import tempfile
+import threading
+from collections import namedtuple
+from importlib.machinery import BYTECODE_SUFFIXES, EXTENSION_SUFFIXES, SOURCE_SUFFIXES
+from importlib.util import decode_source
+
+from . import __version__
+from .resolver import DYNAMIC_MARKERS
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = 'module_index.json'
+# Suffixes of the module files in order of their priority for the path finder.
+MODULE_SUFFIXES = tuple(EXTENSION_SUFFIXES) + tuple(SOURCE_SUFFIXES) + tuple(BYTECODE_SUFFIXES)
+# Output directory of the transformer, which is never imported from.
+OUTPUT_DIRECTORY = 'tmp'
+
+# Indexed module: its file (directory for namespace packages) and the kind of the module.
+ModuleEntry = namedtuple('ModuleEntry', ['location', 'is_package', 'is_namespace'])
+# Names bound by the top level statements of the module and whether it may register its submodules dynamically.
+ModuleInfo = namedtuple('ModuleInfo', ['names', 'dynamic'])
+
+
+def get_stat(path):
+    """ Returns modification time and size of the file, None if it's missing. """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def get_module_file(files, name):
+    """ Returns name of the file the module is loaded from by the path finder, None if there is no such file. """
+    for suffix in MODULE_SUFFIXES:
+        if name + suffix in files:
+            return name + suffix
+    return None
+
+
+def get_module_name(filename):
+    """ Returns name of the module loaded from the file, None if it's not the importable module. """
+    for suffix in MODULE_SUFFIXES:
+        if filename.endswith(suffix):
+            name = filename[:-len(suffix)]
+            if name.isidentifier():
+                return name
+    return None
+
+
+def get_top_level_names(tree):
+    """ Returns names bound by the top level statements of the module, including the conditional ones. """
+    names = set()
+    statements = list(tree.body)
+    while statements:
+        statement = statements.pop()
+        targets = []
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(statement.name)
+            continue
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            names.update(item.asname or item.name.split('.')[0] for item in statement.names if item.name != '*')
+        elif isinstance(statement, ast.Assign):
+            targets = statement.targets
+        elif isinstance(statement, (ast.AnnAssign, ast.AugAssign)):
+            targets = [statement.target]
+        elif isinstance(statement, (ast.For, ast.AsyncFor)):
+            targets = [statement.target]
+        elif isinstance(statement, (ast.With, ast.AsyncWith)):
+            targets = [item.optional_vars for item in statement.items if item.optional_vars is not None]
+        elif isinstance(statement, ast.Try):
+            names.update(handler.name for handler in statement.handlers if handler.name)
+        for target in targets:
+            names.update(node.id for node in ast.walk(target)
+                         if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store))
+        # Bodies of the conditional statements are executed at the top level as well.
+        for field in ('body', 'orelse', 'finalbody'):
+            statements += getattr(statement, field, None) or []
+        statements += [node for handler in getattr(statement, 'handlers', ()) for node in handler.body]
+    return names
+
+
+class ModuleIndex(object):
+    """ Index of the modules under the root directory: dotted paths of the modules mapped to their files, kinds and
+    names defined by their top level statements. The index is built once and kept in the file between the runs.
+    Loaded index lists again only the directories whose modification time has changed, and the names of the module
+    are parsed again only if its file has been changed. Symbolic links to directories and the output directory of
+    the transformer aren't indexed, modules under them are resolved by the spec lookup. The index can be shared by
+    the transformers running in the different threads. """
+
+    def __init__(self, root, path=None):
+        """
+        root: Directory of the indexed modules, which is on the search path.
+        path: File the index is kept in, the index isn't kept if it's None.
+        """
+        self.root = os.path.abspath(root)
+        self.path = path
+        # {directory relative to the root: {'mtime': ns, 'files': module files, 'directories': subdirectories}}
+        self.directories = {}
+        # {module file relative to the root: {'stat': [mtime, size], 'names': names, 'dynamic': bool}}
+        self.files = {}
+        # {module path: ModuleEntry}
+        self.modules = {}
+        # Paths of the packages whose directories aren't indexed.
+        self.unindexed = set()
+        self.modified = False
+        self._lock = threading.RLock()
+        if not self.load():
+            self.build()
+
+    def __getstate__(self):
+        """ The index is passed to the worker processes without its lock. """
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def load(self):
+        """ Loads the index from its file and updates the changed directories. Returns False if there is no valid
+        index in the file. """
+        if not self.path:
+            return False
+        try:
+            with open(self.path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get('version') != __version__ or data.get('root') != self.root:
+            return False
+        self.directories = data['directories']
+        self.files = data['files']
+        if not self.validate():
+            self.rebuild()
+        return True
+
+    def save(self):
+        """ Writes the index to its file if it's been changed since it was loaded. The file is written to temporary
+        file and atomically renamed, so the concurrent readers never see partial index. """
+        with self._lock:
+            if not self.path or not self.modified:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as fh:
+                    json.dump({'version': __version__, 'root': self.root, 'directories': self.directories,
+                               'files': self.files}, fh)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                logger.warning('Failed to store module index %s.', self.path, exc_info=True)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            self.modified = False
+
+    def build(self):
+        """ Indexes all the directories under the root. """
+        self.directories.clear()
+        self.files.clear()
+        self.scan('')
+        self.rebuild()
+
+    def is_indexed(self, relative_path, entry):
+        """ Checks whether the subdirectory is indexed. """
+        return not entry.is_symlink() and relative_path != OUTPUT_DIRECTORY and entry.name != '__pycache__'
+
+    def scan(self, relative_path):
+        """ Lists the directory and its subdirectories which aren't listed yet. """
+        directory = os.path.join(self.root, relative_path)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            self.directories.pop(relative_path, None)
+            return
+        files, directories, subdirectories = [], [], []
+        for entry in entries:
+            try:
+                is_directory = entry.is_dir()
+            except OSError:
+                continue
+            if is_directory and entry.name.isidentifier():
+                directories.append(entry.name)
+                child = os.path.join(relative_path, entry.name)
+                if self.is_indexed(child, entry):
+                    subdirectories.append(child)
+            elif not is_directory and get_module_name(entry.name):
+                files.append(entry.name)
+        self.directories[relative_path] = {'mtime': mtime, 'files': sorted(files), 'directories': sorted(directories)}
+        self.modified = True
+        for child in subdirectories:
+            if child not in self.directories:
+                self.scan(child)
+
+    def validate(self):
+        """ Lists again the directories modified since they were listed. Returns True if there are such. """
+        with self._lock:
+            return self._validate()
+
+    def _validate(self):
+        changed = False
+        for relative_path in sorted(self.directories, key=len):
+            listing = self.directories.get(relative_path)
+            # The subtree of the removed directory has been dropped.
+            if listing is None:
+                continue
+            stat = get_stat(os.path.join(self.root, relative_path))
+            if stat is not None and stat[0] == listing['mtime']:
+                continue
+            changed = True
+            self.scan(relative_path)
+            listing = self.directories.get(relative_path)
+            if listing is None:
+                self.drop(relative_path)
+                continue
+            # Subdirectories removed from the directory.
+            children = {os.path.join(relative_path, name) for name in listing['directories']}
+            prefix = os.path.join(relative_path, '')
+            for path in list(self.directories):
+                if path.startswith(prefix) and path.count(os.sep) == prefix.count(os.sep) and path not in children:
+                    self.drop(path)
+        if changed:
+            self.rebuild()
+        return changed
+
+    def drop(self, relative_path):
+        """ Forgets the directory and its subdirectories. """
+        prefix = os.path.join(relative_path, '')
+        for path in list(self.directories):
+            if path == relative_path or path.startswith(prefix):
+                del self.directories[path]
+        self.modified = True
+
+    def rebuild(self):
+        """ Builds map of the modules from the listings of the directories. """
+        modules, unindexed = {}, set()
+        for relative_path, listing in self.directories.items():
+            prefix = relative_path.replace(os.sep, '.')
+            files = set(listing['files'])
+            directories = set(listing['directories'])
+            for name in directories.union(filter(None, map(get_module_name, files))):
+                path = '{}.{}'.format(prefix, name) if prefix else name
+                child = os.path.join(relative_path, name)
+                if name in directories:
+                    child_listing = self.directories.get(child)
+                    if child_listing is None:
+                        unindexed.add(path)
+                        continue
+                    init = get_module_file(child_listing['files'], '__init__')
+                    # Regular package takes precedence over the module, which takes precedence over namespace package.
+                    if init:
+                        modules[path] = ModuleEntry(os.path.join(self.root, child, init), True, False)
+                        continue
+                module = get_module_file(files, name)
+                if module:
+                    modules[path] = ModuleEntry(os.path.join(self.root, relative_path, module), False, False)
+                else:
+                    modules[path] = ModuleEntry(os.path.join(self.root, child), True, True)
+        # The maps are replaced at once, so the concurrent lookups never see partial maps.
+        self.modules, self.unindexed = modules, unindexed
+        locations = {os.path.relpath(entry.location, self.root) for entry in modules.values()}
+        for location in set(self.files).difference(locations):
+            del self.files[location]
+
+    def lookup(self, module_path):
+        """ Returns (indexed, entry) of the module. indexed is False if the module is under the directory which isn't
+        indexed, entry is None if there is no such module. """
+        parts = module_path.split('.')
+        entry = None
+        for index in range(1, len(parts) + 1):
+            path = '.'.join(parts[:index])
+            if path in self.unindexed:
+                return False, None
+            entry = self.modules.get(path)
+            if entry is None or (index < len(parts) and not entry.is_package):
+                return True, None
+        return True, entry
+
+    def get_info(self, module_path):
+        """ Returns ModuleInfo of the module, None if it's missing or there are no sources of the module. """
+        _, entry = self.lookup(module_path)
+        if entry is None:
+            return None
+        if entry.is_namespace:
+            return ModuleInfo(names=(), dynamic=False)
+        if not entry.location.endswith('.py'):
+            return None
+        relative_path = os.path.relpath(entry.location, self.root)
+        stat = get_stat(entry.location)
+        info = self.files.get(relative_path)
+        if info is None or info['stat'] != stat:
+            try:
+                with open(entry.location, 'rb') as fh:
+                    sources = decode_source(fh.read())
+                names = sorted(get_top_level_names(ast.parse(sources)))
+                dynamic = any(marker in sources for marker in DYNAMIC_MARKERS)
+            except (OSError, SyntaxError, ValueError, UnicodeDecodeError):
+                names, dynamic = [], True
+            with self._lock:
+                info = self.files[relative_path] = {'stat': stat, 'names': names, 'dynamic': dynamic}
+                self.modified = True
+        return ModuleInfo(names=info['names'], dynamic=info['dynamic'])
+
+
+def get_default_path(transform_package_path):
+    """ Returns path of the index file located next to the transformation output. """
+    return os.path.join(transform_package_path, OUTPUT_DIRECTORY, INDEX_NAME)
+
+
+def get_module_index(module_index, transform_package_path):
+    """ Returns index by the transformer option: True creates index of the transform_package_path kept in its tmp
+    directory, string is the path of the index file, instances are returned as is, None is returned otherwise. """
+    if not module_index:
+        return None
+    if isinstance(module_index, ModuleIndex):
+        return module_index
+    if module_index is True:
+        module_index = get_default_path(transform_package_path)
+    return ModuleIndex(transform_package_path, module_index)
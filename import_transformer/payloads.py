@@ -0,0 +1,133 @@
+import lzma
+import zlib
+import base64
+import marshal
+from importlib.util import MAGIC_NUMBER
+from ast import Attribute, Bytes, Call, Compare, Eq, IfExp, Import, Load, Name, Str, alias
+
+
+class SourcePayload(object):
+    """ Embeds sources of the inlined module as the string literal, which is compiled on every execution. """
+    name = 'source'
+    imports = ()
+
+    @property
+    def options(self):
+        """ Returns options which affect the encoded payloads. """
+        return {'payload': self.name}
+
+    def get_imports(self):
+        """ Returns import nodes of the modules used by the payload expressions. """
+        return [Import(names=[alias(name=name, asname=None)]) for name in self.imports]
+
+    def encode(self, sources, path):
+        """ Returns expression of the payload which is passed to the exec. """
+        return Str(s=sources)
+
+
+SOURCE_PAYLOAD = SourcePayload()
+
+
+class BytecodePayload(SourcePayload):
+    """ Embeds marshalled code object of the inlined module compiled at transformation time as base64 string
+    literal. The code object is tagged with magic number of the transforming interpreter, the sources are used if the
+    executing interpreter doesn't match it. Only the payloads of the file are compiled, so all the modules are
+    loaded from the code objects in the bundle mode only: the nested modules execute the sources of the modules
+    they inline. """
+    name = 'bytecode'
+    imports = ('marshal', 'importlib.util', 'base64')
+    # Magic number of the interpreter the code objects are compiled by.
+    magic_number = MAGIC_NUMBER
+
+    @property
+    def options(self):
+        return dict(super(BytecodePayload, self).options, magic_number=self.magic_number.hex())
+
+    def encode(self, sources, path):
+        code = compile(sources, '<{}>'.format(path), 'exec', dont_inherit=True)
+        magic_number = Attribute(value=Attribute(value=Name(id='importlib', ctx=Load()), attr='util', ctx=Load()),
+                                 attr='MAGIC_NUMBER', ctx=Load())
+        loads = Attribute(value=Name(id='marshal', ctx=Load()), attr='loads', ctx=Load())
+        b64decode = Attribute(value=Name(id='base64', ctx=Load()), attr='b64decode', ctx=Load())
+        # Escaped bytes literal of the code would be several times longer than the code.
+        data = Call(func=b64decode, args=[Str(s=base64.b64encode(marshal.dumps(code)).decode('ascii'))], keywords=[])
+        return IfExp(test=Compare(left=magic_number, ops=[Eq()], comparators=[Bytes(s=self.magic_number)]),
+                     body=Call(func=loads, args=[data], keywords=[]),
+                     orelse=Str(s=sources))
+
+
+# Modules smaller than the threshold (in bytes) are embedded as plain sources by the compressed payloads.
+DEFAULT_THRESHOLD = 512
+
+
+class CompressedPayload(SourcePayload):
+    """ Embeds compressed sources of the inlined module as base64 string literal, which is decoded and decompressed
+    on every execution. Sources of the modules smaller than the threshold, or whose payload isn't shorter than their
+    string literal, are embedded as is. """
+    default_level = None
+    # Length of the payload expression besides the base64 literal, e.g. zlib.decompress(base64.b64decode(''))...
+    overhead = len(".decompress(base64.b64decode('')).decode('utf-8')")
+
+    def __init__(self, level=None, threshold=DEFAULT_THRESHOLD):
+        """
+        level: Compression level (preset of lzma), the default one of the codec if None.
+        threshold: Size of the sources in bytes, smaller sources aren't compressed.
+        """
+        self.level = self.default_level if level is None else level
+        self.threshold = threshold
+
+    @property
+    def imports(self):
+        return (self.name, 'base64')
+
+    @property
+    def options(self):
+        return dict(super(CompressedPayload, self).options, level=self.level, threshold=self.threshold)
+
+    def compress(self, data):
+        raise NotImplementedError
+
+    def encode(self, sources, path):
+        data = sources.encode('utf-8')
+        if len(data) < self.threshold:
+            return super(CompressedPayload, self).encode(sources, path)
+        encoded = base64.b64encode(self.compress(data)).decode('ascii')
+        # Escaped bytes literal of the compressed data would be several times longer than the data.
+        if len(self.name) + self.overhead + len(encoded) >= len(repr(sources)):
+            return super(CompressedPayload, self).encode(sources, path)
+        b64decode = Attribute(value=Name(id='base64', ctx=Load()), attr='b64decode', ctx=Load())
+        decompress = Attribute(value=Name(id=self.name, ctx=Load()), attr='decompress', ctx=Load())
+        data = Call(func=b64decode, args=[Str(s=encoded)], keywords=[])
+        return Call(func=Attribute(value=Call(func=decompress, args=[data], keywords=[]), attr='decode', ctx=Load()),
+                    args=[Str(s='utf-8')], keywords=[])
+
+
+class ZlibPayload(CompressedPayload):
+    """ Embeds sources compressed with zlib, which is fast to decompress. """
+    name = 'zlib'
+    default_level = 9
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+
+class LzmaPayload(CompressedPayload):
+    """ Embeds sources compressed with lzma, which is the smallest but slower to decompress. """
+    name = 'lzma'
+    default_level = 6
+
+    def compress(self, data):
+        return lzma.compress(data, preset=self.level)
+
+
+PAYLOADS = {payload.name: payload for payload in (SourcePayload, BytecodePayload, ZlibPayload, LzmaPayload)}
+
+
+def get_payload_encoder(payload, **options):
+    """ Returns payload encoder by its name created with the options, encoder instances are returned as is. """
+    if isinstance(payload, SourcePayload):
+        return payload
+    try:
+        return PAYLOADS[payload](**options)
+    except KeyError:
+        raise ValueError('Unknown payload {!r}, expected one of: {}.'.format(payload, ', '.join(PAYLOADS)))
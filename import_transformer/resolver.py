@@ -0,0 +1,137 @@
+import sys
+import threading
+from importlib.machinery import BuiltinImporter, FrozenImporter, PathFinder
+from importlib.util import decode_source
+
+
+# Markers of the module sources which make the static analysis of their submodules unreliable.
+DYNAMIC_MARKERS = ('sys.modules', '__path__')
+
+
+class ModuleResolver(object):
+    """ Resolves import paths using spec lookup and file system inspection, without executing the modules.
+    Every method returns None when the question can't be decided statically. Modules of the ModuleIndex are
+    resolved by the lookups of the index, if their top level package is found in the indexed directory.
+    The methods take the search path of the top level modules, sys.path by default. The resolver can be shared by
+    the transformers running in the different threads. """
+
+    def __init__(self, index=None):
+        """ index: ModuleIndex of the transform_package_path. """
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self.index = index
+
+    def clear(self):
+        """ Forgets the found specs, so added or removed modules are found. """
+        with self._lock:
+            self._scopes.clear()
+        if self.index is not None:
+            self.index.validate()
+
+    def find_spec(self, module_path, search_path=None):
+        """ Returns the spec of the module or None if it can't be found statically. """
+        search_path = tuple(sys.path) if search_path is None else tuple(search_path)
+        # Lookups of the top level modules depend on the search path, so results are memoized per search path.
+        specs = self._scopes.get(search_path)
+        if specs is None:
+            with self._lock:
+                specs = self._scopes.setdefault(search_path, {})
+        try:
+            return specs[module_path]
+        except KeyError:
+            pass
+        # The spec is found without the lock, the spec found first is kept if the threads race.
+        spec = self._find_spec(module_path, search_path)
+        with self._lock:
+            return specs.setdefault(module_path, spec)
+
+    def _find_spec(self, module_path, search_path):
+        parent_path, _, _ = module_path.rpartition('.')
+        if not parent_path:
+            for finder in (BuiltinImporter, FrozenImporter):
+                spec = finder.find_spec(module_path)
+                if spec is not None:
+                    return spec
+            return PathFinder.find_spec(module_path, list(search_path))
+        parent = self.find_spec(parent_path, search_path)
+        if parent is None or not parent.submodule_search_locations:
+            return None
+        return PathFinder.find_spec(module_path, list(parent.submodule_search_locations))
+
+    def lookup(self, module_path, search_path=None):
+        """ Returns (indexed, entry) of the module in the index. indexed is False if the module isn't resolved by
+        the index: its top level package is found elsewhere on the search path or it's under the directory which
+        isn't indexed. """
+        if self.index is None:
+            return False, None
+        top_level_path = module_path.partition('.')[0]
+        entry = self.index.modules.get(top_level_path)
+        if entry is None:
+            return False, None
+        spec = self.find_spec(top_level_path, search_path)
+        if spec is None:
+            return False, None
+        if entry.is_namespace:
+            if spec.has_location or list(spec.submodule_search_locations or []) != [entry.location]:
+                return False, None
+        elif spec.origin != entry.location:
+            return False, None
+        return self.index.lookup(module_path)
+
+    def get_location(self, module_path, search_path=None):
+        """ Returns the file (or directory for namespace packages) the module is loaded from.
+        Empty string is returned for the modules without location (builtin, frozen). """
+        indexed, entry = self.lookup(module_path, search_path)
+        if indexed:
+            return entry.location if entry is not None else None
+        spec = self.find_spec(module_path, search_path)
+        if spec is None:
+            return None
+        if spec.has_location:
+            return spec.origin
+        return next(iter(spec.submodule_search_locations or []), '')
+
+    def get_source(self, module_path, search_path=None):
+        """ Returns the sources of the module. Empty string is returned for the modules without sources file
+        (namespace packages). """
+        indexed, entry = self.lookup(module_path, search_path)
+        if indexed:
+            if entry is None or not (entry.is_namespace or entry.location.endswith('.py')):
+                return None
+            if entry.is_namespace:
+                return ''
+            with open(entry.location, 'rb') as fh:
+                return decode_source(fh.read())
+        spec = self.find_spec(module_path, search_path)
+        if spec is None:
+            return None
+        if not spec.has_location:
+            return '' if spec.submodule_search_locations else None
+        if not spec.origin.endswith('.py'):
+            return None
+        with open(spec.origin, 'rb') as fh:
+            return decode_source(fh.read())
+
+    def is_module(self, module_path, search_path=None):
+        """ Checks whether the path points to a module (True) or to an attribute of its parent module (False). """
+        indexed, entry = self.lookup(module_path, search_path)
+        if indexed:
+            if entry is not None:
+                return True
+            parent_path, _, name = module_path.rpartition('.')
+            info = self.index.get_info(parent_path) if parent_path else None
+            if info is None:
+                return None
+            if name in info.names:
+                return False
+            return None if info.dynamic else False
+        if self.find_spec(module_path, search_path) is not None:
+            return True
+        parent_path, _, _ = module_path.rpartition('.')
+        if not parent_path or self.find_spec(parent_path, search_path) is None:
+            return None
+        # The parent module may register its submodules dynamically.
+        parent_sources = self.get_source(parent_path, search_path)
+        if parent_sources is None or any(marker in parent_sources for marker in DYNAMIC_MARKERS):
+            return None
+        return False
@@ -0,0 +1,131 @@
+from ast import Attribute, Call, Expr, Index, List, Load, Name, Str, Subscript, parse
+
+
+IMPORT_ALL = '*'
+
+# Name of the registry of the inlined modules in the generated code.
+REGISTRY = '__inlined_modules__'
+# Name of the runtime function which returns the inlined module, creating it on the first call.
+INLINE_MODULE = '__inline_module__'
+# Name of the runtime function which checks whether body of the inlined module shall be executed.
+INLINE_BODY = '__inline_body__'
+# Name of the runtime function which executes body of the bundled module at its first import site.
+INLINE_IMPORT = '__inline_import__'
+# Name of the dict of the payloads of the bundled modules, which aren't executed yet.
+PAYLOADS = '__inline_payloads__'
+# Name of the module type, which executes the module payload on the first access to its attributes.
+LAZY_MODULE = '__LazyModule__'
+# Name of the module attribute holding the payload of the lazy module.
+LAZY_PAYLOAD = '__lazy_payload__'
+
+# Runtime of the generated code, which creates inlined modules and binds their names.
+RUNTIME_SOURCES = '''
+import types
+__inlined_modules__ = {}
+__module_type__ = types.ModuleType
+
+
+def __inline_module__(name, path=None):
+    """ Returns inlined module, creating it and its parent packages on the first call. path is the search path of
+    the submodules of the package, which aren't inlined. """
+    module = __inlined_modules__.get(name)
+    if module is None:
+        module = __inlined_modules__[name] = __module_type__(name, 'The {} module'.format(name))
+        module.__dict__.update(__inlined_modules__=__inlined_modules__, __inline_module__=__inline_module__,
+                               __inline_body__=__inline_body__, __inline_import__=__inline_import__,
+                               __inline_all__=__inline_all__, __inlined__=False)
+        if path is not None:
+            module.__path__ = path
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(__inline_module__(parent), child, module)
+    return module
+
+
+def __inline_body__(name):
+    """ Checks whether body of the inlined module shall be executed, it's executed once. Modules imported
+    without the inlining are never executed. """
+    module = __inline_module__(name)
+    if module.__dict__.get('__inlined__', True):
+        return False
+    module.__inlined__ = True
+    return True
+
+
+def __inline_import__(name):
+    """ Executes body of the bundled module on its first import, as python does. Module whose body raises is
+    removed from the registry, so the next import executes it again. """
+    module = __inline_module__(name)
+    if __inline_body__(name):
+        try:
+            exec(__inline_payloads__[name], module.__dict__)
+        except BaseException:
+            __inlined_modules__.pop(name, None)
+            raise
+        del __inline_payloads__[name]
+    return module
+
+
+def __inline_all__(module):
+    """ Returns names bound by the star import of the module. """
+    names = getattr(module, '__all__', None)
+    if names is None:
+        names = [name for name in vars(module) if not name.startswith('_')]
+    return {name: getattr(module, name) for name in names}
+
+
+__inline_payloads__ = {}
+'''
+
+# Type of the lazy modules, which defer execution of their bodies in the spirit of importlib.util.LazyLoader.
+LAZY_MODULE_SOURCES = '''
+class __LazyModule__(types.ModuleType):
+    """ Module which executes its payload on the first access to the missing attribute. """
+
+    def __getattr__(self, name):
+        payload = self.__dict__.pop('__lazy_payload__', None)
+        if payload is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(self.__name__, name))
+        exec(payload, self.__dict__)
+        return getattr(self, name)
+'''
+
+
+def get_runtime(lazy=False, sys_modules=False):
+    """ Returns statements of the runtime, which shall be executed before any inlined module.
+    lazy: Create the inlined modules as lazy modules.
+    sys_modules: Use sys.modules as the registry, so the inlined modules are imported by their names without
+        loading them again. """
+    runtime = parse(RUNTIME_SOURCES).body
+    if lazy:
+        runtime += get_lazy_module_type() + parse('__module_type__ = {}'.format(LAZY_MODULE)).body
+    if sys_modules:
+        runtime += parse('import sys\n{} = sys.modules'.format(REGISTRY)).body
+    return runtime
+
+
+def get_lazy_module_type():
+    """ Returns definition of the lazy module type. """
+    return parse(LAZY_MODULE_SOURCES).body
+
+
+def get_registry_module(path):
+    """ Returns expression of the inlined module lookup in the registry. """
+    return Subscript(value=Name(id=REGISTRY, ctx=Load()), slice=Index(value=Str(s=path)), ctx=Load())
+
+
+def get_registry_namespace(path):
+    """ Returns expression of the namespace of the inlined module. """
+    return Attribute(value=get_registry_module(path), attr='__dict__', ctx=Load())
+
+
+def get_package_declaration(path, locations):
+    """ Returns statement creating the inlined package with the search path of its submodules. """
+    return Expr(value=Call(func=Name(id=INLINE_MODULE, ctx=Load()),
+                           args=[Str(s=path), List(elts=[Str(s=location) for location in locations], ctx=Load())],
+                           keywords=[]))
+
+
+def get_inline_import(path):
+    """ Returns statement executing body of the bundled module unless it's been executed already. """
+    return Expr(value=Call(func=Name(id=INLINE_IMPORT, ctx=Load()), args=[Str(s=path)], keywords=[]))
@@ -0,0 +1,156 @@
+import ast
+import builtins
+from ast import (AnnAssign, Assign, AsyncFunctionDef, AugAssign, Await, Call, ClassDef, Expr, FunctionDef, Global,
+                 ImportFrom, Lambda, Name, Pass, Str, Yield, YieldFrom)
+from collections import namedtuple
+
+
+# Names which give access to the module namespace, so usage of the module names can't be tracked.
+DYNAMIC_NAMES = frozenset(('globals', 'locals', 'vars', 'eval', 'exec', '__import__', '__getattr__', '__dir__'))
+# Expressions which may have side effects when evaluated.
+EFFECTFUL_EXPRESSIONS = (Call, Await, Yield, YieldFrom)
+
+ShakeResult = namedtuple('ShakeResult', ['tree', 'removed_statements', 'removed_bytes'])
+
+
+def get_used_names(node):
+    """ Returns all the names used by the node. """
+    return {child.id for child in ast.walk(node) if isinstance(child, Name)}
+
+
+def get_bound_names(statement):
+    """ Returns names bound in the module namespace by the top level statement. """
+    if isinstance(statement, (FunctionDef, AsyncFunctionDef, ClassDef)):
+        names = {statement.name}
+    elif isinstance(statement, Assign):
+        names = set().union(*(get_used_names(target) for target in statement.targets))
+    elif isinstance(statement, (AnnAssign, AugAssign)):
+        names = get_used_names(statement.target)
+    elif isinstance(statement, ast.Import):
+        names = {item.asname or item.name.split('.')[0] for item in statement.names}
+    elif isinstance(statement, ImportFrom):
+        names = {item.asname or item.name for item in statement.names}
+    else:
+        names = set()
+    # Functions may rebind module names declaring them global.
+    for node in ast.walk(statement):
+        if isinstance(node, Global):
+            names.update(node.names)
+    return names
+
+
+def has_side_effects(node):
+    """ Checks whether evaluation of the expression may have side effects. Bodies of the lambdas aren't evaluated. """
+    if node is None:
+        return False
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, EFFECTFUL_EXPRESSIONS):
+            return True
+        if isinstance(node, Lambda):
+            pending += node.args.defaults + [default for default in node.args.kw_defaults if default]
+            continue
+        pending += ast.iter_child_nodes(node)
+    return False
+
+
+def is_builtin_type(node):
+    """ Checks whether the expression is the name of builtin type, such as property or Exception. """
+    return isinstance(node, Name) and isinstance(getattr(builtins, node.id, None), type)
+
+
+class ModuleShaker(object):
+    """ Removes top level definitions of the module which aren't needed to produce the imported names.
+    Statements which may have side effects are always kept together with the definitions they use. Modules which
+    access their namespace dynamically or use star imports aren't shaken. """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.pure_classes = set()
+
+    def is_pure_class(self, statement):
+        """ Checks whether class creation has no side effects: no decorators, metaclass, or bases which could
+        register their subclasses. """
+        if statement.decorator_list or statement.keywords:
+            return False
+        for base in statement.bases:
+            if not isinstance(base, Name):
+                return False
+            if base.id not in self.pure_classes and not is_builtin_type(base):
+                return False
+        for node in statement.body:
+            if isinstance(node, (FunctionDef, AsyncFunctionDef)) and node.name == '__init_subclass__':
+                return False
+            if not self.is_pure(node):
+                return False
+        return True
+
+    def is_pure(self, statement):
+        """ Checks whether the statement only binds names, so it can be removed if the names aren't used. """
+        if isinstance(statement, Pass) or (isinstance(statement, Expr) and isinstance(statement.value, Str)):
+            return True
+        if isinstance(statement, (FunctionDef, AsyncFunctionDef)):
+            arguments = statement.args
+            evaluated = arguments.defaults + arguments.kw_defaults + [statement.returns]
+            evaluated += [argument.annotation for argument in arguments.args + arguments.kwonlyargs]
+            # Decorators may register the functions, only builtin ones such as property are safe.
+            if not all(is_builtin_type(node) for node in statement.decorator_list):
+                return False
+            return not any(has_side_effects(node) for node in evaluated)
+        if isinstance(statement, ClassDef):
+            return self.is_pure_class(statement)
+        if isinstance(statement, (Assign, AnnAssign, AugAssign)):
+            targets = statement.targets if isinstance(statement, Assign) else [statement.target]
+            names_only = all(isinstance(node, (Name, ast.Tuple, ast.List, ast.Starred, ast.Load, ast.Store))
+                             for target in targets for node in ast.walk(target))
+            return names_only and not has_side_effects(statement.value) and not has_side_effects(
+                getattr(statement, 'annotation', None))
+        return False
+
+    def is_shakeable(self, names):
+        """ Checks whether usage of the module names can be tracked statically. """
+        if not names or '*' in names:
+            return False
+        bound_names = set()
+        for statement in self.tree.body:
+            if isinstance(statement, ImportFrom) and any(item.name == '*' for item in statement.names):
+                return False
+            if get_used_names(statement) & DYNAMIC_NAMES:
+                return False
+            bound_names |= get_bound_names(statement)
+        return not (bound_names & DYNAMIC_NAMES) and set(names) <= bound_names
+
+    def shake(self, names, sources=None):
+        """
+        Returns ShakeResult with the tree which keeps only the definitions needed by the names.
+        names: Names imported from the module.
+        sources: Sources of the tree, used to count removed bytes.
+        """
+        if not self.is_shakeable(names):
+            return ShakeResult(self.tree, 0, 0)
+        needed = set(names)
+        kept = set()
+        for index, statement in enumerate(self.tree.body):
+            if isinstance(statement, ClassDef) and self.is_pure_class(statement):
+                self.pure_classes.add(statement.name)
+            # Side effects of the module are kept, as well as its docstring and __all__ declaration.
+            is_docstring = index == 0 and isinstance(statement, Expr) and isinstance(statement.value, Str)
+            if not self.is_pure(statement) or is_docstring or '__all__' in get_bound_names(statement):
+                kept.add(index)
+                needed |= get_used_names(statement)
+        changed = True
+        while changed:
+            changed = False
+            for index, statement in enumerate(self.tree.body):
+                if index not in kept and get_bound_names(statement) & needed:
+                    kept.add(index)
+                    needed |= get_used_names(statement)
+                    changed = True
+
+        removed = [statement for index, statement in enumerate(self.tree.body) if index not in kept]
+        removed_bytes = 0
+        if sources is not None:
+            removed_bytes = sum(len(ast.get_source_segment(sources, statement) or '') for statement in removed)
+        self.tree.body = [statement for index, statement in enumerate(self.tree.body) if index in kept]
+        return ShakeResult(self.tree, len(removed), removed_bytes)
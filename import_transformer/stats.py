@@ -0,0 +1,119 @@
+import time
+import threading
+
+
+# Phases of the transformation measured by the stats.
+RESOLUTION, READ, PARSE, TRANSFORM, CODEGEN, WRITE = PHASES = (
+    'resolution', 'read', 'parse', 'transform', 'codegen', 'write')
+
+
+class NullStats(object):
+    """ Stats which record nothing, used when the instrumentation is disabled. """
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def measure(self, phase, module):
+        return self
+
+    def record(self, phase, module, duration):
+        pass
+
+
+NULL_STATS = NullStats()
+
+
+class PhaseTimer(object):
+    """ Context manager measuring the phase of the module transformation. """
+    __slots__ = ('stats', 'phase', 'module', 'started')
+
+    def __init__(self, stats, phase, module):
+        self.stats = stats
+        self.phase = phase
+        self.module = module
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.phase, self.module, time.perf_counter() - self.started)
+        return False
+
+
+class TransformStats(NullStats):
+    """ Records time and number of the calls of every transformation phase per module. The transform phase of the
+    module includes transformation of the modules it inlines. The stats are shared with the nested transformers, and
+    can be shared by the transformers running in the different threads. """
+    enabled = True
+
+    def __init__(self, hooks=()):
+        """ hooks: Callables called with the phase, module and duration of every measured call. """
+        self._lock = threading.Lock()
+        # {module: {phase: [time, count]}}
+        self.modules = {}
+        self.hooks = list(hooks)
+
+    def measure(self, phase, module):
+        """ Returns context manager measuring the phase of the module. """
+        return PhaseTimer(self, phase, module)
+
+    def record(self, phase, module, duration):
+        with self._lock:
+            entry = self.modules.setdefault(module, {}).setdefault(phase, [0.0, 0])
+            entry[0] += duration
+            entry[1] += 1
+        for hook in self.hooks:
+            hook(phase, module, duration)
+
+    def update(self, modules):
+        """ Adds the stats of the modules in the as_dict format, e.g. collected by the other process. """
+        with self._lock:
+            for module, phases in modules.items():
+                for phase, entry in phases.items():
+                    total = self.modules.setdefault(module, {}).setdefault(phase, [0.0, 0])
+                    total[0] += entry['time']
+                    total[1] += entry['count']
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def clear(self):
+        with self._lock:
+            self.modules.clear()
+
+    @property
+    def totals(self):
+        """ Returns {phase: {'time': seconds, 'count': calls}} summed over the modules. """
+        totals = {}
+        for phases in self.modules.values():
+            for phase, (duration, count) in phases.items():
+                total = totals.setdefault(phase, {'time': 0.0, 'count': 0})
+                total['time'] += duration
+                total['count'] += count
+        return totals
+
+    def get_slowest(self, count=10, phases=None):
+        """ Returns [(module, seconds)] of the modules which took the longest time in the phases (all of them except
+        the inclusive transform phase by default), the slowest first. """
+        phases = phases or [phase for phase in PHASES if phase != TRANSFORM]
+        durations = [(module, sum(entries[phase][0] for phase in phases if phase in entries))
+                     for module, entries in self.modules.items()]
+        return sorted(durations, key=lambda item: item[1], reverse=True)[:count]
+
+    def as_dict(self):
+        """ Returns {module: {phase: {'time': seconds, 'count': calls}}} suitable for serialization. """
+        return {module: {phase: {'time': duration, 'count': count} for phase, (duration, count) in phases.items()}
+                for module, phases in self.modules.items()}
+
+
+def get_stats(stats):
+    """ Returns stats by the transformer option: True creates new TransformStats, stats instances are returned as is,
+    NullStats is returned otherwise. """
+    if stats is True:
+        return TransformStats()
+    return stats or NULL_STATS
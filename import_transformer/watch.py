@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+
+from .batch import transform_file
+from .cache import ModuleCache, get_hash
+from .index import get_module_index
+from .resolver import ModuleResolver
+from .import_transformer import ImportsTransformer
+
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher(object):
+    """ Incrementally transforms the entry files. Transformed modules and dependencies of the entries are kept between
+    the runs, and when the files under transform_package_path change only the changed modules and the entries which
+    transitively inline them are transformed again. Changes are found by polling modification times of the files. """
+
+    def __init__(self, fpaths, transform_package_path='/', interval=1.0, cache_size=None, **options):
+        """
+        fpaths: Paths of the transforming entry files.
+        transform_package_path: Defines path under which imports will be transformed.
+        interval: Seconds between the polls of the files.
+        cache_size: Memory budget of the transformed modules kept between the runs in bytes, unlimited by default.
+        options: Other options of the ImportsTransformer.
+        """
+        self.fpaths = [os.path.abspath(fpath) for fpath in fpaths]
+        self.transform_package_path = os.path.abspath(transform_package_path)
+        self.interval = interval
+        os.makedirs(os.path.join(self.transform_package_path, 'tmp'), exist_ok=True)
+        self.cache = ModuleCache(cache_size)
+        options['module_index'] = get_module_index(options.get('module_index'), self.transform_package_path)
+        if options.get('static_resolution') is True or options['module_index'] is not None:
+            options['static_resolution'] = ModuleResolver(options['module_index'])
+        self.options = options
+        # {entry path: {module path: sources hash}} map of the modules inlined into the entries by the last run.
+        self.dependencies = {}
+        # {module path: file}
+        self.locations = {}
+        # {file: (modification time, size)}
+        self.stats = {}
+
+    @property
+    def resolver(self):
+        return self.options.get('static_resolution') or None
+
+    def get_transformer(self):
+        return ImportsTransformer(self.transform_package_path, cache=self.cache, **self.options)
+
+    @staticmethod
+    def get_stat(fpath):
+        """ Returns modification time and size of the file, None if it's missing. """
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def transform(self, fpaths):
+        """ Transforms the entries and records the modules they depend on. Returns list of TransformReport. """
+        reports = []
+        for fpath in fpaths:
+            transformer = self.get_transformer()
+            self.stats[fpath] = self.get_stat(fpath)
+            reports.append(transform_file(transformer, fpath))
+            # Modules inlined before the failure aren't known, so the failed entry depends on all the read modules.
+            dependencies = self.cache.source_hashes if reports[-1].error else transformer.dependencies
+            self.dependencies[fpath] = dict(dependencies)
+            for path in dependencies:
+                if path not in self.locations:
+                    self.locations[path] = transformer.get_module_location(path)
+                    self.stats[self.locations[path]] = self.get_stat(self.locations[path])
+        return reports
+
+    def run(self):
+        """ Transforms all the entries from scratch. """
+        self.cache.clear()
+        self.dependencies.clear()
+        return self.transform(self.fpaths)
+
+    def get_changed_modules(self):
+        """ Returns paths of the inlined modules whose sources have been changed since the last run. Files which were
+        touched without changes of the sources aren't reported. """
+        hashes = {}
+        for dependencies in self.dependencies.values():
+            hashes.update(dependencies)
+        changed = []
+        for path, location in self.locations.items():
+            stat = self.get_stat(location)
+            if stat == self.stats.get(location):
+                continue
+            self.stats[location] = stat
+            try:
+                with open(location, 'rb') as fh:
+                    source_hash = get_hash(fh.read().decode('utf-8'))
+            except (OSError, UnicodeDecodeError):
+                source_hash = None
+            if source_hash != hashes.get(path):
+                changed.append(path)
+        return changed
+
+    def update(self):
+        """ Transforms the entries affected by the changes since the last run. Returns list of TransformReport of the
+        transformed entries. """
+        changed = set(self.get_changed_modules())
+        affected = [fpath for fpath in self.fpaths if self.get_stat(fpath) != self.stats.get(fpath)
+                    or changed.intersection(self.dependencies.get(fpath, ()))]
+        if not affected:
+            return []
+        logger.info('Modules changed: %s, transforming %s .', ', '.join(sorted(changed)) or '-', ', '.join(affected))
+        self.cache.invalidate(changed)
+        for path in changed:
+            self.locations.pop(path, None)
+        # Modules may have been added or removed.
+        if self.resolver is not None:
+            self.resolver.clear()
+        return self.transform(affected)
+
+    def watch(self, callback=None, iterations=None):
+        """
+        Transforms the entries and polls the files for changes, transforming the affected entries again.
+        callback: Called with the list of TransformReport after every transformation.
+        iterations: Number of the polls, infinite by default.
+        """
+        reports = self.run()
+        if callback is not None:
+            callback(reports)
+        while iterations is None or iterations > 0:
+            time.sleep(self.interval)
+            reports = self.update()
+            if reports and callback is not None:
+                callback(reports)
+            if iterations is not None:
+                iterations -= 1
@@ -26,7 +26,8 @@ setup(
     author='Andriy Ivaneyko',
     url='https://github.com/',
     scripts=[],
-    packages=find_packages(),
+    entry_points={'console_scripts': ['import-transformer=import_transformer.cli:main']},
+    packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'benchmarks.*']),
     install_requires=['astor'],
     include_package_data=True,
     license="Apache License 2.0",
@@ -0,0 +1,77 @@
+import os
+import zipfile
+from unittest import TestCase, mock
+
+from import_transformer import ImportsTransformer
+from import_transformer.archive import get_bytecode, get_parents
+
+from .test_bundler import BUNDLE_FILES, run
+from .utils import TemporaryPackage
+
+
+ARCHIVE_FILES = dict(BUNDLE_FILES, **{
+    'bundlepkg/nested/__init__.py': "from bundlepkg.nested.inner import INNER\n",
+    'bundlepkg/nested/inner.py': "INNER = 'inner'\n",
+    'nested.py': "import bundlepkg.nested.inner\nprint(bundlepkg.nested.INNER, bundlepkg.nested.inner.__name__)\n",
+})
+
+
+class TestArchive(TestCase):
+
+    def test_get_parents(self):
+        """ Tests listing of the parent packages. """
+        self.assertEqual(get_parents('a.b.c'), ['a', 'a.b'])
+        self.assertEqual(get_parents('a'), [])
+
+    def test_archive(self):
+        """ Tests that the archive behaves as the original file and holds the reachable modules only. """
+        with TemporaryPackage(ARCHIVE_FILES) as root:
+            for fname in ('entry.py', 'cycle.py', 'nested.py'):
+                entry = os.path.join(root, fname)
+                expected = run(entry)
+                transformer = ImportsTransformer(root, static_resolution=True, archive=True)
+                self.assertIsNone(transformer.transform_file_imports(entry))
+                self.assertTrue(transformer.is_modified)
+                output_path = transformer.get_output_path(entry)
+                self.assertEqual(os.path.basename(output_path), 'transformed_imports_{}.pyz'.format(fname[:-3]))
+                self.assertEqual(run(output_path), expected)
+            with zipfile.ZipFile(output_path) as archive:
+                self.assertEqual(sorted(archive.namelist()),
+                                 ['__main__.py', 'bundlepkg/__init__.py', 'bundlepkg/__init__.pyc',
+                                  'bundlepkg/nested/__init__.py', 'bundlepkg/nested/__init__.pyc',
+                                  'bundlepkg/nested/inner.py', 'bundlepkg/nested/inner.pyc'])
+
+    def test_default_resolution(self):
+        """ Tests archiving of the empty and namespace packages with the modules resolved by importing them. """
+        files = {'emptypkg/__init__.py': "", 'emptypkg/mod.py': "VALUE = 1\n", 'nspkg/mod.py': "OTHER = 2\n",
+                 'entry.py': "from emptypkg.mod import VALUE\nfrom nspkg.mod import OTHER\nprint(VALUE, OTHER)\n"}
+        with TemporaryPackage(files) as root:
+            entry = os.path.join(root, 'entry.py')
+            transformer = ImportsTransformer(root, archive=True)
+            transformer.transform_file_imports(entry)
+            output_path = transformer.get_output_path(entry)
+            self.assertEqual(run(output_path), "1 2\n")
+            with zipfile.ZipFile(output_path) as archive:
+                self.assertEqual(archive.read('emptypkg/__init__.py'), b'')
+                self.assertIn('nspkg/__init__.py', archive.namelist())
+
+    def test_bytecode(self):
+        """ Tests that the modules are loaded from the bytecode. """
+        with TemporaryPackage(ARCHIVE_FILES) as root:
+            entry = os.path.join(root, 'nested.py')
+            transformer = ImportsTransformer(root, static_resolution=True, archive=True)
+
+            def get_patched_bytecode(sources, filename):
+                return get_bytecode(sources.replace("'inner'", "'compiled'"), filename)
+
+            with mock.patch('import_transformer.archive.get_bytecode', side_effect=get_patched_bytecode):
+                transformer.transform_file_imports(entry)
+            self.assertEqual(run(transformer.get_output_path(entry)), "compiled bundlepkg.nested.inner\n")
+
+    def test_not_modified(self):
+        """ Tests that the archive isn't written for sources without inlined imports. """
+        with TemporaryPackage({'plain.py': "import os\nprint(os.sep)\n"}) as root:
+            transformer = ImportsTransformer(root, static_resolution=True, archive=True)
+            fpath = os.path.join(root, 'plain.py')
+            self.assertEqual(transformer.transform_file_imports(fpath), "import os\nprint(os.sep)\n")
+            self.assertFalse(os.path.exists(transformer.get_output_path(fpath)))
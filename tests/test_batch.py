@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import pickle
+from contextlib import redirect_stdout
+from unittest import TestCase, mock
+
+from benchmarks.synthetic import generate_package
+from import_transformer import ImportsTransformer
+from import_transformer.batch import find_files, get_shared_options, transform_many, transform_tree
+from import_transformer.cli import main
+from import_transformer.index import ModuleIndex
+from import_transformer.stats import TransformStats
+
+from .utils import TemporaryPackage
+
+
+BATCH_FILES = {
+    'batchpkg/__init__.py': "",
+    'batchpkg/constants.py': "BETA = 2\nZETA = 3\n",
+    'batchpkg/util.py': "from batchpkg.constants import BETA\n\n\ndef double():\n    return BETA * 2\n",
+    'scripts/first.py': "from batchpkg.util import double\nprint(double())\n",
+    'scripts/second.py': "import batchpkg.constants as constants\nprint(constants.ZETA)\n",
+    'scripts/third.py': "import os\nprint(os.sep)\n",
+    'scripts/nested/fourth.py': "from batchpkg.constants import *\nprint(ZETA)\n",
+    'scripts/broken.py': "from batchpkg.constants import\n",
+}
+
+# Package found only in the directory of the file.
+LOCAL_FILES = {
+    'scripts/localpkg/__init__.py': "",
+    'scripts/localpkg/values.py': "X = 5\n",
+    'scripts/local.py': "from localpkg.values import X\nprint(X)\n",
+}
+
+
+class FrozenSearchPath(list):
+    """ sys.path which fails on changes. """
+
+    def insert(self, index, path):
+        raise AssertionError('sys.path is changed')
+
+    def remove(self, path):
+        raise AssertionError('sys.path is changed')
+
+
+class TestBatch(TestCase):
+
+    def test_find_files(self):
+        """ Tests searching of the transforming files. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            os.makedirs(os.path.join(root, 'scripts', '__pycache__'))
+            with open(os.path.join(root, 'scripts', '__pycache__', 'cached.py'), 'w'):
+                pass
+            actual = find_files(os.path.join(root, 'scripts'), exclude=[os.path.join(root, 'scripts', 'nested')])
+            expected = [os.path.join(root, 'scripts', fname) for fname in ('broken.py', 'first.py', 'second.py',
+                                                                          'third.py')]
+            self.assertEqual(actual, expected)
+
+    def test_transform_many(self):
+        """ Tests that files transformed by the pool of processes are the same as serially transformed ones. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            fpaths = [os.path.join(root, 'scripts', fname) for fname in ('first.py', 'second.py', 'third.py')]
+            for processes in (1, 2):
+                reports = transform_many(fpaths, root, processes=processes, static_resolution=True)
+                self.assertEqual([report.path for report in reports], fpaths)
+                self.assertEqual([report.modified for report in reports], [True, True, False])
+                self.assertEqual([report.error for report in reports], [None, None, None])
+                self.assertIsNone(reports[2].output_path)
+                for report in reports[:2]:
+                    with open(report.output_path) as fh:
+                        self.assertEqual(fh.read(), ImportsTransformer(root).transform_file_imports(report.path))
+
+    def test_transform_tree(self):
+        """ Tests transformation of the directory and reporting of the failures. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            reports = transform_tree(os.path.join(root, 'scripts'), root, processes=2)
+            self.assertEqual([os.path.basename(report.path) for report in reports],
+                             ['broken.py', 'first.py', 'fourth.py', 'second.py', 'third.py'])
+            self.assertTrue(reports[0].error.startswith('SyntaxError'))
+            self.assertFalse(reports[0].modified)
+            self.assertEqual([report.modified for report in reports[1:]], [True, True, True, False])
+
+    def test_output_conflicts(self):
+        """ Tests that the files with the same name aren't transformed to the same output file. """
+        files = dict(BATCH_FILES, **{'other/first.py': "from batchpkg.constants import BETA\nprint(BETA)\n",
+                                     'other/__init__.py': "import os\n"})
+        with TemporaryPackage(files) as root:
+            fpaths = [os.path.join(root, 'scripts', 'first.py'), os.path.join(root, 'scripts', 'second.py'),
+                      os.path.join(root, 'other', 'first.py'), os.path.join(root, 'batchpkg', '__init__.py'),
+                      os.path.join(root, 'other', '__init__.py')]
+            for processes in (1, 2):
+                reports = transform_many(fpaths, root, processes=processes)
+                self.assertEqual([report.path for report in reports], fpaths)
+                self.assertEqual([report.modified for report in reports], [False, True, False, False, False])
+                self.assertIn(fpaths[2], reports[0].error)
+                self.assertIn(fpaths[0], reports[2].error)
+                # The files without transforming imports write nothing, so they don't conflict.
+                self.assertEqual([report.error for report in reports[3:]], [None, None])
+                self.assertFalse(os.path.exists(os.path.join(root, 'tmp', 'transformed_imports_first.py')))
+
+    def test_shared_index(self):
+        """ Tests that the worker processes share the module index built by the current process. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            fpaths = [os.path.join(root, 'scripts', fname) for fname in ('first.py', 'second.py')]
+            options = get_shared_options(root, {'static_resolution': True})
+            self.assertIsInstance(options['module_index'], ModuleIndex)
+            self.assertEqual(get_shared_options(root, {}), {})
+            index = pickle.loads(pickle.dumps(options['module_index']))
+            self.assertEqual(index.modules, options['module_index'].modules)
+            self.assertEqual(index.lookup('batchpkg.util'), (True, options['module_index'].modules['batchpkg.util']))
+            reports = transform_many(fpaths, root, processes=2, module_index=True)
+            self.assertEqual([report.error for report in reports], [None, None])
+            self.assertTrue(os.path.exists(os.path.join(root, 'tmp', 'module_index.json')))
+
+    def test_cli(self):
+        """ Tests command line interface. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                exit_code = main([os.path.join(root, 'scripts', 'nested'), os.path.join(root, 'scripts', 'third.py'),
+                                  '-p', root, '-j', '1', '--static-resolution'])
+            self.assertEqual(exit_code, 0)
+            lines = output.getvalue().splitlines()
+            self.assertEqual(len(lines), 2)
+            self.assertIn('transformed_imports_fourth.py', lines[0])
+            self.assertIn('unchanged', lines[1])
+
+            with redirect_stdout(io.StringIO()):
+                exit_code = main([os.path.join(root, 'scripts', 'broken.py'), '-p', root])
+            self.assertEqual(exit_code, 1)
+
+
+class TestThreads(TestCase):
+
+    @staticmethod
+    def write_entries(package, count):
+        """ Writes entry files importing the last modules of the synthetic package. """
+        fpaths = []
+        for index, path in enumerate(package.modules[-count:]):
+            fpaths.append(os.path.join(package.root, 'scripts', 'entry_{}.py'.format(index)))
+            os.makedirs(os.path.dirname(fpaths[-1]), exist_ok=True)
+            with open(fpaths[-1], 'w') as fh:
+                fh.write('import {} as module\nfrom {} import *\nprint(module.CONSTANT_{})\n'.format(
+                    path, path, len(package.modules) - count + index))
+        return fpaths
+
+    @staticmethod
+    def read_outputs(reports):
+        outputs = []
+        for report in reports:
+            with open(report.output_path) as fh:
+                outputs.append(fh.read())
+        return outputs
+
+    def test_transform_many(self):
+        """ Tests that files transformed by the pool of threads are the same as serially transformed ones. """
+        with TemporaryPackage({}) as root:
+            package = generate_package(root, modules=16, depth=3, fan_out=2)
+            fpaths = self.write_entries(package, 8)
+            for options in ({}, {'static_resolution': True}, {'bundle': True, 'module_index': True},
+                            {'registry': True, 'tree_shaking': True, 'static_resolution': True}):
+                expected = self.read_outputs(transform_many(fpaths, root, processes=1, **options))
+                for _ in range(3):
+                    reports = transform_many(fpaths, root, processes=8, threads=True, **options)
+                    self.assertEqual([report.error for report in reports], [None] * len(fpaths))
+                    self.assertEqual(self.read_outputs(reports), expected)
+
+    def test_threads_search_path(self):
+        """ Tests that the pool of threads resolves the modules statically without changes of sys.path. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            fpaths = [os.path.join(root, 'scripts', fname) for fname in ('first.py', 'second.py')]
+            search_path = list(sys.path)
+            observed = []
+            stats = TransformStats([lambda *args: observed.append(list(sys.path))])
+            reports = transform_many(fpaths, root, processes=2, threads=True, stats=stats)
+            self.assertEqual([report.modified for report in reports], [True, True])
+            self.assertTrue(observed)
+            self.assertTrue(all(path == search_path for path in observed))
+            # The modules aren't imported to resolve them.
+            self.assertNotIn('batchpkg.util', sys.modules)
+
+    def test_search_path(self):
+        """ Tests that the statically resolved transformation doesn't change sys.path. """
+        with TemporaryPackage(BATCH_FILES) as root:
+            search_path = list(sys.path)
+            observed = []
+            stats = TransformStats([lambda *args: observed.append(list(sys.path))])
+            transformer = ImportsTransformer(root, static_resolution=True, stats=stats)
+            transformer.transform_file_imports(os.path.join(root, 'scripts', 'first.py'))
+            self.assertTrue(transformer.is_modified)
+            self.assertTrue(observed)
+            self.assertTrue(all(path == search_path for path in observed))
+            self.assertEqual(transformer.search_path[0], os.path.join(root, 'scripts'))
+
+    def test_import_search_path(self):
+        """ Tests that the imported modules are looked up in the directory of the file without changes of sys.path. """
+        with TemporaryPackage(LOCAL_FILES) as root:
+            fpath = os.path.join(root, 'scripts', 'local.py')
+            transformer = ImportsTransformer(root)
+            with mock.patch.object(sys, 'path', FrozenSearchPath(sys.path)):
+                transformer.transform_file_imports(fpath)
+            self.assertTrue(transformer.is_modified)
+            self.assertEqual(sys.modules['localpkg'].__path__, [os.path.join(root, 'scripts', 'localpkg')])
@@ -0,0 +1,169 @@
+import os
+import ast
+import sys
+import subprocess
+import tracemalloc
+from unittest import TestCase, mock
+
+import astor
+
+from benchmarks.synthetic import generate_package
+from import_transformer import ImportsTransformer
+from import_transformer.bundler import ImportsBinder, ModuleGraph
+
+from .utils import TemporaryPackage
+
+
+BUNDLE_FILES = {
+    'bundlepkg/__init__.py': "NAME = 'bundlepkg'\n",
+    'bundlepkg/common.py': "COUNTER = []\nCOUNTER.append(1)\n__all__ = ['COUNTER']\n_PRIVATE = 1\n",
+    'bundlepkg/left.py': "from bundlepkg.common import COUNTER\nLEFT = len(COUNTER)\n",
+    'bundlepkg/right.py': "import bundlepkg.common as common\n\n\ndef right():\n    return len(common.COUNTER)\n",
+    'bundlepkg/cycle_a.py': "import bundlepkg.cycle_b\nVALUE = 1\n\n\ndef get():\n"
+                            "    return bundlepkg.cycle_b.OTHER\n",
+    'bundlepkg/cycle_b.py': "import bundlepkg.cycle_a\nOTHER = 2\n\n\ndef get():\n"
+                            "    return bundlepkg.cycle_a.VALUE\n",
+    'entry.py': '"""Entry docstring."""\nfrom __future__ import annotations\n'
+                "from bundlepkg.left import LEFT\nfrom bundlepkg.right import right\nfrom bundlepkg import NAME\n"
+                "from bundlepkg.common import *\nprint(LEFT, right(), NAME, COUNTER)\n",
+    'cycle.py': "import bundlepkg.cycle_a\nfrom bundlepkg import cycle_b\n"
+                "print(bundlepkg.cycle_a.get(), cycle_b.get())\n",
+}
+
+
+def run(fpath):
+    """ Runs the python file out of the package directory and returns its output. """
+    return subprocess.run([sys.executable, fpath], cwd=os.path.dirname(fpath), stdout=subprocess.PIPE,
+                          check=True, universal_newlines=True).stdout
+
+
+class TestModuleGraph(TestCase):
+
+    def test_build(self):
+        """ Tests building of the dependency graph and its topological order. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            graph = ModuleGraph(ImportsTransformer(root, static_resolution=True))
+            with open(os.path.join(root, 'entry.py')) as fh:
+                roots = graph.build(ast.parse(fh.read()))
+            self.assertEqual(roots, ['bundlepkg.left', 'bundlepkg.right', 'bundlepkg', 'bundlepkg.common'])
+            self.assertEqual(graph.dependencies, {'bundlepkg.left': ['bundlepkg.common'],
+                                                  'bundlepkg.right': ['bundlepkg.common'],
+                                                  'bundlepkg.common': [], 'bundlepkg': []})
+            self.assertEqual(graph.get_order(roots),
+                             ['bundlepkg.common', 'bundlepkg.left', 'bundlepkg.right', 'bundlepkg'])
+            self.assertEqual(graph.cycles, [])
+
+    def test_cycles(self):
+        """ Tests ordering of the import cycles. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            graph = ModuleGraph(ImportsTransformer(root, static_resolution=True))
+            with open(os.path.join(root, 'cycle.py')) as fh:
+                roots = graph.build(ast.parse(fh.read()))
+            self.assertEqual(graph.get_order(roots), ['bundlepkg.cycle_b', 'bundlepkg.cycle_a'])
+            self.assertEqual(graph.cycles, [['bundlepkg.cycle_a', 'bundlepkg.cycle_b', 'bundlepkg.cycle_a']])
+
+
+class TestBundler(TestCase):
+
+    def test_imports_binder(self):
+        """ Tests replacing of the imports with bindings to the registry modules. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            binder = ImportsBinder(ImportsTransformer(root, static_resolution=True))
+            sources = ("import os\nimport bundlepkg.left\nimport bundlepkg.left as left\n"
+                       "from bundlepkg import right, NAME as name\nfrom bundlepkg.common import *\n")
+            actual = astor.to_source(binder.visit(ast.parse(sources)))
+            expected = ("import os\n"
+                        "bundlepkg = __inlined_modules__['bundlepkg']\n"
+                        "left = __inlined_modules__['bundlepkg.left']\n"
+                        "right = __inlined_modules__['bundlepkg.right']\n"
+                        "name = __inlined_modules__['bundlepkg'].NAME\n"
+                        "globals().update(__inline_all__(__inlined_modules__['bundlepkg.common']))\n")
+            self.assertEqual(actual, expected)
+
+    def test_bundle(self):
+        """ Tests that every module is emitted once and the bundle behaves as the nested transformation. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            transformer = ImportsTransformer(root, static_resolution=True, bundle=True)
+            sources = transformer.transform_file_imports(entry)
+            self.assertTrue(transformer.is_modified)
+            self.assertTrue(sources.startswith('"""Entry docstring."""\nfrom __future__ import annotations\n'))
+            self.assertEqual(sources.count('COUNTER.append(1)'), 1)
+            self.assertEqual(sorted(transformer.dependencies),
+                             ['bundlepkg', 'bundlepkg.common', 'bundlepkg.left', 'bundlepkg.right'])
+            # Shared module is executed once, as with the regular imports.
+            self.assertEqual(run(transformer.get_output_path(entry)), "1 1 bundlepkg [1]\n")
+
+    def test_bundle_cycle(self):
+        """ Tests bundling of the import cycle. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            entry = os.path.join(root, 'cycle.py')
+            transformer = ImportsTransformer(root, static_resolution=True, bundle=True)
+            transformer.transform_file_imports(entry)
+            self.assertEqual(run(transformer.get_output_path(entry)), "2 1\n")
+
+    def test_guarded_import(self):
+        """ Tests that the module bodies are executed at their import sites, inside the try statements. """
+        files = {'optpkg/__init__.py': "", 'optpkg/opt.py': "raise ImportError('optional')\nX = 1\n",
+                 'optpkg/used.py': "print('used executed')\nY = 2\n",
+                 'entry.py': "try:\n    from optpkg.opt import X\nexcept ImportError:\n    X = None\n"
+                             "print('entry executed')\nfrom optpkg.used import Y\nprint(X, Y)\n"}
+        with TemporaryPackage(files) as root:
+            entry = os.path.join(root, 'entry.py')
+            expected = "entry executed\nused executed\nNone 2\n"
+            for options in ({'bundle': True}, {'stream': True}, {'bundle': True, 'sys_modules': True}):
+                transformer = ImportsTransformer(root, static_resolution=True, **options)
+                transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), expected, options)
+
+    def test_bundle_not_modified(self):
+        """ Tests that sources without inlined imports are kept as is. """
+        with TemporaryPackage({'plain.py': "import os\nprint(os.sep)\n"}) as root:
+            transformer = ImportsTransformer(root, static_resolution=True, bundle=True)
+            self.assertEqual(transformer.transform_file_imports(os.path.join(root, 'plain.py')),
+                             "import os\nprint(os.sep)\n")
+            self.assertFalse(transformer.is_modified)
+
+
+class TestStreaming(TestCase):
+
+    def test_stream(self):
+        """ Tests that the streamed bundle is the same as the bundle built in memory. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            for fname in ('entry.py', 'cycle.py'):
+                entry = os.path.join(root, fname)
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=True)
+                expected = transformer.transform_file_imports(entry)
+                transformer = ImportsTransformer(root, static_resolution=True, stream=True)
+                with mock.patch.object(ModuleGraph, 'release', autospec=True,
+                                       side_effect=ModuleGraph.release) as release:
+                    self.assertIsNone(transformer.transform_file_imports(entry))
+                self.assertTrue(transformer.is_modified)
+                self.assertEqual(release.call_args_list[-1], mock.call(mock.ANY, 'bundlepkg.cycle_a'
+                                                                       if fname == 'cycle.py' else 'bundlepkg'))
+                with open(transformer.get_output_path(entry)) as fh:
+                    self.assertEqual(fh.read(), expected)
+
+    def test_stream_not_modified(self):
+        """ Tests that the output isn't written for sources without inlined imports. """
+        with TemporaryPackage({'plain.py': "import os\nprint(os.sep)\n"}) as root:
+            transformer = ImportsTransformer(root, static_resolution=True, stream=True)
+            self.assertEqual(transformer.transform_file_imports(os.path.join(root, 'plain.py')),
+                             "import os\nprint(os.sep)\n")
+            self.assertFalse(os.path.exists(transformer.get_output_path(os.path.join(root, 'plain.py'))))
+
+    def test_stream_memory(self):
+        """ Tests that peak memory of the streaming doesn't grow with the size of the bundle. """
+        with TemporaryPackage({}) as root:
+            package = generate_package(root, modules=40, functions=10)
+            peaks = {}
+            for stream in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=True, stream=stream)
+                tracemalloc.start()
+                try:
+                    transformer.transform_file_imports(package.entry)
+                    peaks[stream] = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual(run(transformer.get_output_path(package.entry)), package.expected_output)
+            self.assertLess(peaks[True] * 3, peaks[False])
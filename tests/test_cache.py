@@ -0,0 +1,220 @@
+import os
+import sys
+import ast
+import tempfile
+import tracemalloc
+from unittest import TestCase, mock
+
+from benchmarks.synthetic import generate_package
+from import_transformer import ImportsTransformer
+from import_transformer.cache import EVICT_INTERVAL, ModuleCache, PersistentCache
+from import_transformer.resolver import ModuleResolver
+
+from .utils import TemporaryPackage
+
+
+# Diamond shaped dependencies: entry -> left, right -> common.
+DIAMOND_FILES = {
+    'diamondpkg/__init__.py': "",
+    'diamondpkg/common.py': "VALUE = 1\n",
+    'diamondpkg/left.py': "from diamondpkg.common import VALUE\nLEFT = VALUE + 1\n",
+    'diamondpkg/right.py': "from diamondpkg.common import VALUE\nRIGHT = VALUE + 2\n",
+    'entry.py': "from diamondpkg.left import LEFT\nfrom diamondpkg.right import RIGHT\nprint(LEFT, RIGHT)\n",
+}
+
+
+class TestModuleCache(TestCase):
+
+    def test_get(self):
+        """ Tests counting of the cache hits and misses. """
+        cache = ModuleCache(keep_trees=True)
+        self.assertIsNone(cache.get('somepackage.constants'))
+        tree = ast.parse("BETA = 2")
+        cache.add('somepackage.constants', tree, "BETA = 2\n")
+        self.assertEqual(cache.get('somepackage.constants'), "BETA = 2\n")
+        self.assertIs(cache.trees['somepackage.constants'], tree)
+        self.assertIn('somepackage.constants', cache)
+        self.assertEqual(cache.info, {'hits': 1, 'misses': 1, 'size': 1})
+
+        cache.clear()
+        self.assertEqual(cache.info, {'hits': 0, 'misses': 0, 'size': 0})
+
+    def test_invalidate(self):
+        """ Tests removing of the modules which inline the changed modules. """
+        cache = ModuleCache()
+        cache.add('pkg.constants', None, "BETA = 2\n", {'pkg.constants': 'a'})
+        cache.add('pkg.util', None, "...", {'pkg.util': 'b', 'pkg.constants': 'a'})
+        cache.add('pkg.other', None, "...", {'pkg.other': 'c'})
+        cache.source_hashes.update({'pkg.constants': 'a', 'pkg.other': 'c'})
+        self.assertEqual(cache.invalidate(['pkg.constants']), ['pkg.constants', 'pkg.util'])
+        self.assertEqual(list(cache.sources), ['pkg.other'])
+        self.assertEqual(cache.source_hashes, {'pkg.other': 'c'})
+
+    def test_shared_by_nested_transformers(self):
+        """ Tests that every module of the diamond shaped dependencies is transformed once. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            transformer = ImportsTransformer(root, static_resolution=True)
+            with mock.patch('import_transformer.import_transformer.parse', side_effect=ast.parse) as parse:
+                transformer.transform_file_imports(os.path.join(root, 'entry.py'))
+            # Entry file, left, right and common modules.
+            self.assertEqual(parse.call_count, 4)
+            self.assertEqual(transformer.cache.info, {'hits': 1, 'misses': 3, 'size': 3})
+
+    def test_shared_between_runs(self):
+        """ Tests passing of the cache to the transformers. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            cache = ModuleCache()
+            entry = os.path.join(root, 'entry.py')
+            expected = ImportsTransformer(root, cache=cache).transform_file_imports(entry)
+            actual = ImportsTransformer(root, cache=cache).transform_file_imports(entry)
+            self.assertEqual(actual, expected)
+            self.assertEqual(cache.info, {'hits': 3, 'misses': 3, 'size': 3})
+
+    def test_evict(self):
+        """ Tests eviction of the least recently used modules over the memory budget. """
+        cache = ModuleCache(max_size=3 * sys.getsizeof('A = 1\n'))
+        for path in ('pkg.a', 'pkg.b', 'pkg.c'):
+            cache.add(path, None, 'A = 1\n')
+        self.assertEqual(cache.get_entry('pkg.a'), ('A = 1\n', {}))
+        cache.add('pkg.d', None, 'A = 1\n')
+        self.assertEqual(list(cache.sources), ['pkg.c', 'pkg.a', 'pkg.d'])
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.nbytes, cache.max_size)
+        # The last added module is kept even if it exceeds the budget alone.
+        cache.add('pkg.e', None, 'A = 1\n' * 100)
+        self.assertEqual(list(cache.sources), ['pkg.e'])
+        self.assertEqual(cache.nbytes, sys.getsizeof('A = 1\n' * 100))
+
+    def test_memory_budget(self):
+        """ Tests that the evicted modules are transformed again to the same sources. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            expected = ImportsTransformer(root, cache=ModuleCache()).transform_file_imports(entry)
+            cache = ModuleCache(max_size=1)
+            self.assertEqual(ImportsTransformer(root, cache=cache).transform_file_imports(entry), expected)
+            self.assertEqual(len(cache), 1)
+            self.assertGreater(cache.evictions, 0)
+
+
+class TestMemoryBudget(TestCase):
+
+    @staticmethod
+    def transform(package, fpaths, cache):
+        """ Transforms the files with the shared cache, returns the outputs and memory retained by the cache. """
+        resolver = ModuleResolver()
+        tracemalloc.start()
+        try:
+            outputs = [ImportsTransformer(package.root, static_resolution=resolver, cache=cache, registry=True)
+                       .transform_file_imports(fpath) for fpath in fpaths]
+            del resolver
+            retained = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        return outputs, retained
+
+    def test_synthetic_package(self):
+        """ Tests that the memory retained by the bounded cache is lower, and the outputs are the same. """
+        with TemporaryPackage({}) as root:
+            package = generate_package(root, modules=24, depth=3, fan_out=2)
+            fpaths = []
+            for index, path in enumerate(package.modules):
+                fpaths.append(os.path.join(root, 'entry_{}.py'.format(index)))
+                with open(fpaths[-1], 'w') as fh:
+                    fh.write('from {} import *\n'.format(path))
+            unbounded = ModuleCache()
+            expected, unbounded_retained = self.transform(package, fpaths, unbounded)
+            bounded = ModuleCache(max_size=unbounded.nbytes // 8)
+            actual, bounded_retained = self.transform(package, fpaths, bounded)
+            self.assertEqual(actual, expected)
+            self.assertGreater(bounded.evictions, 0)
+            self.assertLess(len(bounded), len(unbounded))
+            self.assertLess(bounded_retained, unbounded_retained)
+
+
+class TestPersistentCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_get_key(self):
+        """ Tests that keys depend on the sources and options. """
+        key = PersistentCache.get_key('somepackage.constants', "BETA = 2", {'transform_package_path': '/'})
+        self.assertEqual(key, PersistentCache.get_key('somepackage.constants', "BETA = 2",
+                                                      {'transform_package_path': '/'}))
+        self.assertNotEqual(key, PersistentCache.get_key('somepackage.constants', "BETA = 3",
+                                                         {'transform_package_path': '/'}))
+        self.assertNotEqual(key, PersistentCache.get_key('somepackage.constants', "BETA = 2",
+                                                         {'transform_package_path': '/tmp'}))
+
+    def test_get_set(self):
+        """ Tests storing and loading of the cache entries. """
+        cache = PersistentCache(self.directory.name)
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'sources': "BETA = 2\n", 'dependencies': {}})
+        self.assertEqual(cache.get('key'), {'sources': "BETA = 2\n", 'dependencies': {}})
+        self.assertEqual(os.listdir(self.directory.name), ['key.json'])
+
+        # Corrupted entries are treated as missing.
+        with open(cache.get_entry_path('key'), 'w') as fh:
+            fh.write('{"sources": ')
+        self.assertIsNone(cache.get('key'))
+
+    def test_evict(self):
+        """ Tests eviction of the least recently used entries. """
+        cache = PersistentCache(self.directory.name, max_size=150)
+        for index, key in enumerate(('first', 'second', 'third')):
+            cache.set(key, {'sources': 'x' * 30})
+            os.utime(cache.get_entry_path(key), (index, index))
+        # Access makes entry the most recently used one.
+        self.assertIsNotNone(cache.get('first'))
+        cache.set('fourth', {'sources': 'x' * 30})
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['first.json', 'fourth.json', 'third.json'])
+
+    def test_evict_interval(self):
+        """ Tests that the directory is listed on the first write, once the cache is oversized and periodically. """
+        cache = PersistentCache(self.directory.name, max_size=10000)
+        with mock.patch('import_transformer.cache.os.scandir', side_effect=os.scandir) as scandir:
+            for index in range(EVICT_INTERVAL):
+                cache.set(str(index), {'sources': 'x' * 30})
+            self.assertEqual(scandir.call_count, 2)
+            self.assertEqual(cache.size, sum(os.path.getsize(cache.get_entry_path(str(index)))
+                                             for index in range(EVICT_INTERVAL)))
+            cache.set('large', {'sources': 'x' * 10000})
+            self.assertEqual(scandir.call_count, 3)
+        self.assertLessEqual(cache.size, cache.max_size)
+        self.assertNotIn('large.json', os.listdir(self.directory.name))
+
+    def test_stale_temporary_files(self):
+        """ Tests removing of the temporary files left by the crashed writers. """
+        cache = PersistentCache(self.directory.name)
+        for name in ('stale.tmp', 'fresh.tmp'):
+            with open(os.path.join(self.directory.name, name), 'w') as fh:
+                fh.write('{"sources": ')
+        os.utime(os.path.join(self.directory.name, 'stale.tmp'), (0, 0))
+        cache.set('key', {'sources': "BETA = 2\n", 'dependencies': {}})
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['fresh.tmp', 'key.json'])
+
+    def test_transformer_persistent_cache(self):
+        """ Tests serving of the unchanged files from the persistent cache. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            expected = ImportsTransformer(root, static_resolution=True,
+                                          persistent_cache=True).transform_file_imports(entry)
+            self.assertTrue(os.listdir(os.path.join(root, 'tmp', 'transform_cache')))
+
+            transformer = ImportsTransformer(root, static_resolution=True, persistent_cache=True)
+            with mock.patch('import_transformer.import_transformer.parse', side_effect=ast.parse) as parse:
+                actual = transformer.transform_file_imports(entry)
+            parse.assert_not_called()
+            self.assertEqual(actual, expected)
+            self.assertTrue(transformer.is_modified)
+
+            # Change of the common module invalidates all the entries depending on it.
+            with open(os.path.join(root, 'diamondpkg', 'common.py'), 'w') as fh:
+                fh.write("VALUE = 10\n")
+            transformer = ImportsTransformer(root, static_resolution=True, persistent_cache=True)
+            with mock.patch('import_transformer.import_transformer.parse', side_effect=ast.parse) as parse:
+                actual = transformer.transform_file_imports(entry)
+            self.assertEqual(parse.call_count, 4)
+            self.assertIn('VALUE = 10', actual)
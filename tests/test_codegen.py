@@ -0,0 +1,59 @@
+import os
+import ast
+from unittest import TestCase
+
+import astor
+
+from import_transformer import ImportsTransformer
+from import_transformer.codegen import AstorCodegen, UnparseCodegen, get_codegen
+
+from .test_bundler import BUNDLE_FILES, run
+from .utils import TemporaryPackage
+
+
+SOURCES = """
+import types
+
+
+def function(value, *args, key=None, **kwargs):
+    return {'value': value, 'args': args, 'key': key or [item for item in kwargs]}
+"""
+
+
+class TestCodegen(TestCase):
+
+    def test_get_codegen(self):
+        """ Tests getting of the code generators. """
+        self.assertIsInstance(get_codegen('astor'), AstorCodegen)
+        self.assertIsInstance(get_codegen('unparse'), UnparseCodegen)
+        self.assertIsInstance(get_codegen('auto'), UnparseCodegen)
+        codegen = UnparseCodegen()
+        self.assertIs(get_codegen(codegen), codegen)
+        with self.assertRaises(ValueError):
+            get_codegen('unknown')
+
+    def test_to_source(self):
+        """ Tests that all the backends render equivalent sources. """
+        tree = ast.parse(SOURCES)
+        self.assertEqual(AstorCodegen().to_source(tree), astor.to_source(tree, indent_with=' ' * 4,
+                                                                         add_line_information=False))
+        for codegen in (AstorCodegen(), UnparseCodegen()):
+            actual = codegen.to_source(tree)
+            self.assertTrue(actual.endswith('\n'))
+            self.assertEqual(ast.dump(ast.parse(actual)), ast.dump(tree))
+
+    def test_reuse_sources(self):
+        """ Tests that sources of the modules without transformed imports are reused by the unparse backend. """
+        files = dict(BUNDLE_FILES)
+        files['bundlepkg/common.py'] = "# Comment is kept.\n" + files['bundlepkg/common.py']
+        with TemporaryPackage(files) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle)
+                transformer.transform_file_imports(entry)
+                expected = run(transformer.get_output_path(entry))
+
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, codegen='unparse')
+                sources = transformer.transform_file_imports(entry)
+                self.assertIn('# Comment is kept.', sources)
+                self.assertEqual(run(transformer.get_output_path(entry)), expected)
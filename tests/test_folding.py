@@ -0,0 +1,87 @@
+import os
+import ast
+from unittest import TestCase
+
+from import_transformer import ImportsTransformer
+from import_transformer.folding import get_exported_names, get_module_constants, is_foldable
+
+from .test_bundler import run
+from .utils import TemporaryPackage
+
+
+FOLDING_FILES = {
+    'foldpkg/__init__.py': "",
+    'foldpkg/constants.py': '"""Constants."""\nSOME_CONSTANT = \'some_id\'\nTIMEOUT: int = -5\n'
+                            "LIMITS = (1, 2.5, None)\nNAMES = ['first']\n_PRIVATE = b'x'\n",
+    'foldpkg/settings.py': "__all__ = ['DEBUG', 'LEVEL']\nDEBUG = True\nLEVEL = 3\nOTHER = 4\n",
+    'foldpkg/effects.py': "print('effects executed')\nVALUE = 1\n",
+    'foldpkg/user.py': "from foldpkg.constants import SOME_CONSTANT\nUSER = SOME_CONSTANT + '!'\n",
+    'entry.py': "from foldpkg.constants import SOME_CONSTANT, TIMEOUT as timeout, LIMITS\n"
+                "from foldpkg.settings import *\nfrom foldpkg.effects import VALUE\nfrom foldpkg.user import USER\n"
+                "print(SOME_CONSTANT, timeout, LIMITS, DEBUG, LEVEL, VALUE, USER)\n",
+    'mutable.py': "from foldpkg.constants import NAMES, SOME_CONSTANT\nimport foldpkg.settings\n"
+                  "print(NAMES, SOME_CONSTANT, foldpkg.settings.OTHER)\n",
+}
+
+
+class TestConstantsAnalysis(TestCase):
+
+    def test_get_module_constants(self):
+        """ Tests detection of the modules which only assign literals. """
+        constants = get_module_constants(ast.parse(FOLDING_FILES['foldpkg/constants.py']))
+        self.assertEqual(sorted(constants), ['LIMITS', 'NAMES', 'SOME_CONSTANT', 'TIMEOUT', '_PRIVATE'])
+        self.assertEqual(ast.literal_eval(constants['TIMEOUT']), -5)
+        self.assertTrue(is_foldable(constants['LIMITS']))
+        self.assertFalse(is_foldable(constants['NAMES']))
+        self.assertEqual(get_exported_names(constants), ['LIMITS', 'NAMES', 'SOME_CONSTANT', 'TIMEOUT'])
+        self.assertEqual(get_exported_names(get_module_constants(ast.parse(FOLDING_FILES['foldpkg/settings.py']))),
+                         ['DEBUG', 'LEVEL'])
+        for sources in ("print(1)\nVALUE = 1\n", "VALUE = 1\nOTHER = VALUE\n", "A, B = 1, 2\n", "import os\n",
+                        "VALUE = [print]\n", "def function():\n    pass\n"):
+            self.assertIsNone(get_module_constants(ast.parse(sources)), sources)
+        self.assertEqual(get_module_constants(ast.parse("")), {})
+
+
+class TestConstantFolding(TestCase):
+
+    def test_nested(self):
+        """ Tests that the names imported from the constants modules are bound to their values. """
+        with TemporaryPackage(FOLDING_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            transformer = ImportsTransformer(root, static_resolution=True, fold_constants=True)
+            sources = transformer.transform_file_imports(entry)
+            self.assertIn("SOME_CONSTANT = 'some_id'\ntimeout = -5\nLIMITS = 1, 2.5, None\nDEBUG = True\nLEVEL = 3\n",
+                          sources)
+            self.assertNotIn("foldpkg.constants = types.ModuleType('foldpkg.constants'", sources)
+            self.assertNotIn('OTHER', sources)
+            # Modules with side effects are executed.
+            self.assertIn("print('effects executed')", sources)
+            self.assertIn('foldpkg.constants', transformer.dependencies)
+            self.assertEqual(run(transformer.get_output_path(entry)), run(entry))
+
+    def test_not_folded(self):
+        """ Tests that the mutable values and the modules imported themselves aren't folded. """
+        with TemporaryPackage(FOLDING_FILES) as root:
+            entry = os.path.join(root, 'mutable.py')
+            transformer = ImportsTransformer(root, static_resolution=True, fold_constants=True)
+            sources = transformer.transform_file_imports(entry)
+            self.assertIn('NAMES = foldpkg.constants.NAMES', sources)
+            self.assertIn("__all__ = ['DEBUG', 'LEVEL']", sources)
+            self.assertEqual(run(transformer.get_output_path(entry)), run(entry))
+
+    def test_output_modes(self):
+        """ Tests that the folded modules aren't executed by the registry and bundle output. """
+        with TemporaryPackage(FOLDING_FILES) as root:
+            for fname in ('entry.py', 'mutable.py'):
+                entry = os.path.join(root, fname)
+                expected = run(entry)
+                for options in ({'registry': True}, {'bundle': True}, {'stream': True}, {'bundle': True, 'lazy': True},
+                                {'registry': True, 'sys_modules': True}):
+                    transformer = ImportsTransformer(root, static_resolution=True, fold_constants=True, **options)
+                    transformer.transform_file_imports(entry)
+                    output_path = transformer.get_output_path(entry)
+                    self.assertEqual(run(output_path), expected, options)
+                    with open(output_path) as fh:
+                        sources = fh.read()
+                    for path in ("'foldpkg.constants'", "'foldpkg.settings'"):
+                        self.assertEqual(path in sources, fname == 'mutable.py', options)
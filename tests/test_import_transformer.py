@@ -5,6 +5,12 @@ from unittest import TestCase, mock
 import astor
 
 from import_transformer import ImportsTransformer
+from import_transformer.cache import ModuleCache
+from import_transformer.import_transformer import ImportRecord
+from import_transformer.payloads import PAYLOADS
+
+from .test_bundler import run
+from .utils import TemporaryPackage
 
 
 # {Key:Value} dictionary where key is string representation of the python import statement and
@@ -21,9 +27,8 @@ SOME_CONSTANT = somepackage.constants.SOME_CONSTANT\n"""),
 somepackage = types.ModuleType('somepackage', 'The somepackage module')\n
 somepackage.constants = types.ModuleType('somepackage.constants', 'The somepackage.constants module')
 """).body,
-         'get_node_modules': {'SOME_CONSTANT': {'path': 'somepackage.constants', 'alias': None,
-                                                          'from_module': 'somepackage.constants',
-                                                          'is_module': False}},
+         'get_node_modules': {'SOME_CONSTANT': ImportRecord('somepackage.constants', None, 'somepackage.constants',
+                                                            False)},
          'get_sources': "SOME_CONSTANT = 'some_id'",
          'get_replacing_node_body': ast.parse("import types").body
          }
@@ -42,9 +47,8 @@ somepackage.submod = types.ModuleType('somepackage.submod', 'The somepackage.sub
 somepackage.submod.some_class = types.ModuleType('somepackage.submod.some_class', \n
 'The somepackage.submod.some_class module')\n
 """).body,
-         'get_node_modules': {'SomeClass': {'path': 'somepackage.submod.some_class', 'alias': None,
-                                                   'from_module': 'somepackage.submod.some_class',
-                                                   'is_module': False}},
+         'get_node_modules': {'SomeClass': ImportRecord('somepackage.submod.some_class', None,
+                                                        'somepackage.submod.some_class', False)},
          'get_sources': "class SomeClass: pass",
          'get_replacing_node_body': []}
     ),
@@ -63,9 +67,8 @@ somepackage.submod = types.ModuleType('somepackage.submod', 'The somepackage.sub
 somepackage.submod.some_class = types.ModuleType('somepackage.submod.some_class', \n
 'The somepackage.submod.some_class module')\n
 """).body,
-         'get_node_modules': {'SomeClass': {'path': 'somepackage.submod.some_class', 'alias': 'nn',
-                                                   'from_module': 'somepackage.submod.some_class',
-                                                   'is_module': False}},
+         'get_node_modules': {'SomeClass': ImportRecord('somepackage.submod.some_class', 'nn',
+                                                        'somepackage.submod.some_class', False)},
          'get_sources': "class SomeClass: pass",
          'get_replacing_node_body': []
          }
@@ -82,8 +85,7 @@ exec(\"""BETA = 2\nZETA = 3\""", somepackage.constants.__dict__)\n
 somepackage = types.ModuleType('somepackage', 'The somepackage module')\n
 somepackage.constants = types.ModuleType('somepackage.constants', 'The somepackage.constants module')\n
 """).body,
-         'get_node_modules': {'somepackage.constants': {'path': 'somepackage.constants', 'alias': None,
-                                                          'from_module': '', 'is_module': True}},
+         'get_node_modules': {'somepackage.constants': ImportRecord('somepackage.constants', None, '', True)},
          'get_sources': "BETA = 2\nZETA = 3",
          'get_replacing_node_body': [],
          }),
@@ -98,8 +100,8 @@ m_constants = somepackage.constants\n"""),
 somepackage = types.ModuleType('somepackage', 'The somepackage module')\n
 somepackage.constants = types.ModuleType('somepackage.constants', 'The somepackage.constants module')\n
 """).body,
-         'get_node_modules': {'somepackage.constants': {'path': 'somepackage.constants', 'alias': 'm_constants',
-                                                          'from_module': '', 'is_module': True}},
+         'get_node_modules': {
+             'somepackage.constants': ImportRecord('somepackage.constants', 'm_constants', '', True)},
          'get_sources': "BETA = 2\nZETA = 3",
          'get_replacing_node_body': [],
          }
@@ -109,8 +111,7 @@ somepackage.constants = types.ModuleType('somepackage.constants', 'The somepacka
 print('from somepackage.constants import *\\n')\n
 exec(\"""BETA = 2\nZETA = 3\""", locals())\n
 """),
-        {'get_node_modules': {'*': {'path': 'somepackage.constants', 'alias': None,
-                                    'from_module': 'somepackage.constants', 'is_module': False}},
+        {'get_node_modules': {'*': ImportRecord('somepackage.constants', None, 'somepackage.constants', False)},
          'get_sources': "BETA = 2\nZETA = 3",
          'get_replacing_node_body': [],
          }
@@ -132,17 +133,22 @@ somepackage = types.ModuleType('somepackage', 'The somepackage module')\n
 somepackage.constants = types.ModuleType('somepackage.constants', 'The somepackage.constants module')\n
 """).body,
          'get_node_modules': {
-             'BETA': {'path': 'somepackage.constants', 'alias': None, 'from_module': 'somepackage.constants',
-                      'is_module': False},
-             'ZETA': {'path': 'somepackage.constants', 'alias': None, 'from_module': 'somepackage.constants',
-                      'is_module': False},
-             'constants': {'path': 'somepackage.constants', 'alias': None, 'from_module': 'somepackage.constants',
-                           'is_module': False}},
+             'BETA': ImportRecord('somepackage.constants', None, 'somepackage.constants', False),
+             'ZETA': ImportRecord('somepackage.constants', None, 'somepackage.constants', False),
+             'constants': ImportRecord('somepackage.constants', None, 'somepackage.constants', False)},
          'get_sources': "BETA = 2\nZETA = 3\nconstants=[1, 2, 3]",
          'get_replacing_node_body': []}
     )
 }
 
+# Inlined module importing the module it has already initialized.
+REPEATED_IMPORT_FILES = {
+    'reppkg/__init__.py': "",
+    'reppkg/constants.py': "A = 1\n",
+    'reppkg/user.py': "from reppkg.constants import A\nimport reppkg.constants\nB = A + reppkg.constants.A\n",
+    'entry.py': "from reppkg.user import B\nprint(B)\n",
+}
+
 
 class AggregatedImportTransformerMocks(object):
     """ Simple mock agreagator to avoid nested with context managers. """
@@ -166,24 +172,33 @@ class AggregatedImportTransformerMocks(object):
 
 class TestImportsTransformer(TestCase):
     transformable_imports = TRANSFORMING_IMPORTS.keys()
+    default_attributes = {'initialized': set(), 'resolver': None, 'cache': mock.ANY, 'persistent_cache': None,
+                          'dependencies': {}, 'bundle': False, 'payload': mock.ANY,
+                          'codegen': mock.ANY, 'tree_shaking': False, 'imported_names': {}, 'shaking_report': {},
+                          'shaking_key': None,
+                          'lazy': False, 'eager_modules': (), 'stats': mock.ANY, 'stream': False,
+                          'archive': False, 'registry': False, 'trace': False, 'nested': False,
+                          'sys_modules': False, 'module_index': None, 'packages': set(),
+                          'types_imported': False, 'search_path': None, 'fold_constants': False}
 
     def test__init__(self):
         """ Tests initialization of the ImportsTransformer. """
         instance = ImportsTransformer()
-        expected = {'transform_package_path': '/', 'initialized': {}}
+        expected = dict(self.default_attributes, transform_package_path='/')
         self.assertEqual(instance.__dict__, expected)
         self.assertEqual(instance.is_modified, False)
+        self.assertIsInstance(instance.cache, ModuleCache)
 
         # Tests relative and abs pathes of transforming package.
         transform_package_path = '../somepackage'
         instance = ImportsTransformer(transform_package_path)
-        expected = {'transform_package_path': os.path.abspath(transform_package_path), 'initialized': {}}
+        expected = dict(self.default_attributes, transform_package_path=os.path.abspath(transform_package_path))
         self.assertEqual(instance.__dict__, expected)
         self.assertEqual(instance.is_modified, False)
 
         transform_package_path = '/tmp/path/to/somepackage'
         instance = ImportsTransformer(transform_package_path)
-        expected = {'transform_package_path': transform_package_path, 'initialized': {}}
+        expected = dict(self.default_attributes, transform_package_path=transform_package_path)
         self.assertEqual(instance.__dict__, expected)
         self.assertEqual(instance.is_modified, False)
 
@@ -224,7 +239,7 @@ class TestImportsTransformer(TestCase):
         for import_str, import_info in TRANSFORMING_IMPORTS.items():
             import_node = ast.parse(import_str).body[0]
             expected, transforming_import_data = (import_info[0], import_info[1])
-            import_transformer = ImportsTransformer()
+            import_transformer = ImportsTransformer(trace=True)
             with AggregatedImportTransformerMocks(transforming_import_data):
                 actual = import_transformer.get_transformed_import(import_node)
                 # Compare actual sources, not ast trees.
@@ -290,3 +305,14 @@ if not isinstance(locals().get('somepackage', {}).__dict__.get('submod', {}
                 actual = transformer.transform_file_imports('/tmp/some_file.py')
                 expected = 'import pdb\n'
                 self.assertEqual(actual, expected)
+
+    def test_repeated_import(self):
+        """ Tests that import of the initialized module is replaced without tracing. """
+        with TemporaryPackage(REPEATED_IMPORT_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            options = [{}, {'lazy': True}, {'tree_shaking': True}, {'codegen': 'unparse'}]
+            options += [{'payload': payload} for payload in PAYLOADS]
+            for kwargs in options:
+                transformer = ImportsTransformer(root, **kwargs)
+                transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), "2\n", kwargs)
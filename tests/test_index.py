@@ -0,0 +1,144 @@
+import os
+import ast
+from importlib.machinery import PathFinder
+from unittest import TestCase, mock
+
+from import_transformer import ImportsTransformer
+from import_transformer.index import ModuleIndex, get_module_index, get_default_path
+from import_transformer.resolver import ModuleResolver
+
+from .test_resolver import PACKAGE_FILES
+from .utils import TemporaryPackage
+
+
+INDEX_FILES = dict(PACKAGE_FILES, **{
+    'resolverpkg/names.py': ("import os.path\nfrom sys import path as search_path\nVALUE = 1\n"
+                             "if VALUE:\n    CONDITIONAL = 2\nelse:\n    class Other: pass\n"
+                             "def function():\n    LOCAL = 3\n"),
+    'resolverpkg/shadowed.py': "VALUE = 'module'\n",
+    'resolverpkg/shadowed/__init__.py': "VALUE = 'package'\n",
+    'resolverpkg/portion/module.py': "VALUE = 1\n",
+    'resolverpkg/portion.py': "VALUE = 'module'\n",
+    'resolverpkg/not-a-module.py': "",
+})
+
+
+class TestModuleIndex(TestCase):
+
+    def test_build(self):
+        """ Tests indexing of the modules, packages and namespace packages. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            index = ModuleIndex(root)
+            self.assertEqual(index.modules['resolverpkg'], (os.path.join(root, 'resolverpkg', '__init__.py'),
+                                                            True, False))
+            self.assertEqual(index.modules['resolverpkg.submod.some_class'],
+                             (os.path.join(root, 'resolverpkg', 'submod', 'some_class.py'), False, False))
+            self.assertEqual(index.modules['resolvernamespace'], (os.path.join(root, 'resolvernamespace'), True, True))
+            # Regular package takes precedence over the module, which takes precedence over namespace package.
+            self.assertTrue(index.modules['resolverpkg.shadowed'].is_package)
+            self.assertFalse(index.modules['resolverpkg.portion'].is_package)
+            self.assertEqual(index.lookup('resolverpkg.portion.module'), (True, None))
+            self.assertNotIn('resolverpkg.not-a-module', index.modules)
+            self.assertIn('tmp', index.unindexed)
+            self.assertEqual(index.lookup('tmp.module'), (False, None))
+            self.assertEqual(index.lookup('resolverpkg.missing'), (True, None))
+
+    def test_get_info(self):
+        """ Tests collecting of the top level names of the modules. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            index = ModuleIndex(root)
+            info = index.get_info('resolverpkg.names')
+            self.assertEqual(info.names, ['CONDITIONAL', 'Other', 'VALUE', 'function', 'os', 'search_path'])
+            self.assertFalse(info.dynamic)
+            self.assertTrue(index.get_info('resolverpkg.dynamic').dynamic)
+            self.assertEqual(index.get_info('resolvernamespace'), ((), False))
+            self.assertIsNone(index.get_info('resolverpkg.missing'))
+
+    def test_persistence(self):
+        """ Tests that loaded index lists only the modified directories and parses only the modified modules. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            path = get_default_path(root)
+            index = get_module_index(True, root)
+            index.get_info('resolverpkg.names')
+            index.save()
+            self.assertTrue(os.path.exists(path))
+
+            with mock.patch.object(ModuleIndex, 'scan') as scan:
+                loaded = ModuleIndex(root, path)
+            scan.assert_not_called()
+            self.assertEqual(loaded.modules, index.modules)
+            self.assertFalse(loaded.modified)
+
+            package = os.path.join(root, 'resolverpkg')
+            os.makedirs(os.path.join(package, 'added'))
+            with open(os.path.join(package, 'added', 'module.py'), 'w') as fh:
+                fh.write("VALUE = 1\n")
+            os.rename(os.path.join(package, 'submod'), os.path.join(package, 'moved'))
+            with open(os.path.join(package, 'names.py'), 'a') as fh:
+                fh.write("ADDED = 1\n")
+            os.utime(package, ns=(0, 0))
+            with mock.patch('import_transformer.index.ast.parse', wraps=ast.parse) as parse:
+                loaded = ModuleIndex(root, path)
+                self.assertIn('ADDED', loaded.get_info('resolverpkg.names').names)
+                loaded.get_info('resolverpkg.constants')
+            self.assertEqual(parse.call_count, 2)
+            self.assertIn('resolverpkg.added.module', loaded.modules)
+            self.assertIn('resolverpkg.moved.some_class', loaded.modules)
+            self.assertNotIn('resolverpkg.submod', loaded.modules)
+            self.assertNotIn('resolverpkg/submod', loaded.directories)
+            self.assertTrue(loaded.modified)
+
+    def test_invalid_file(self):
+        """ Tests that the index is built again if its file is invalid or belongs to the other root. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            path = get_default_path(root)
+            with open(path, 'w') as fh:
+                fh.write('{')
+            self.assertIn('resolverpkg', ModuleIndex(root, path).modules)
+            ModuleIndex(os.path.join(root, 'resolverpkg'), path).save()
+            self.assertIn('resolverpkg', ModuleIndex(root, path).modules)
+
+
+class TestIndexedResolution(TestCase):
+
+    def test_resolver(self):
+        """ Tests that the modules of the index are resolved without spec lookups of their submodules. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            resolver = ModuleResolver(ModuleIndex(root))
+            with mock.patch('import_transformer.resolver.PathFinder.find_spec',
+                            wraps=PathFinder.find_spec) as find_spec:
+                self.assertEqual(resolver.get_location('resolverpkg.submod.some_class'),
+                                 os.path.join(root, 'resolverpkg', 'submod', 'some_class.py'))
+                self.assertEqual(resolver.get_source('resolverpkg.shadowed'), "VALUE = 'package'\n")
+                self.assertEqual(resolver.get_source('resolvernamespace'), "")
+                self.assertTrue(resolver.is_module('resolverpkg.submod'))
+                self.assertFalse(resolver.is_module('resolverpkg.names.VALUE'))
+                self.assertFalse(resolver.is_module('resolverpkg.constants.MISSING'))
+                self.assertIsNone(resolver.is_module('resolverpkg.dynamic.sub'))
+                self.assertIsNone(resolver.get_location('resolverpkg.missing'))
+            self.assertEqual([call.args[0] for call in find_spec.call_args_list], ['resolverpkg', 'resolvernamespace'])
+            # Modules outside of the index are resolved by the spec lookups.
+            self.assertEqual(resolver.get_location('sys'), '')
+            self.assertTrue(resolver.is_module('json.decoder'))
+
+    def test_shadowed_package(self):
+        """ Tests that the index isn't used for the packages found earlier on the search path. """
+        with TemporaryPackage(INDEX_FILES) as root, TemporaryPackage({'resolverpkg/__init__.py': ""}) as other:
+            resolver = ModuleResolver(ModuleIndex(root))
+            self.assertEqual(resolver.lookup('resolverpkg.constants'), (False, None))
+            self.assertEqual(resolver.get_location('resolverpkg'), os.path.join(other, 'resolverpkg', '__init__.py'))
+            self.assertIsNone(resolver.get_location('resolverpkg.constants'))
+
+    def test_transformer(self):
+        """ Tests that the transformation with the index is the same as with the spec lookups. """
+        with TemporaryPackage(INDEX_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            with open(entry, 'w') as fh:
+                fh.write("from resolverpkg.submod.some_class import SomeClass\nfrom resolverpkg import names\n"
+                         "print(SomeClass.__name__, names.VALUE)\n")
+            expected = ImportsTransformer(root, static_resolution=True).transform_file_imports(entry)
+            transformer = ImportsTransformer(root, module_index=True)
+            self.assertIs(transformer.resolver.index, transformer.module_index)
+            self.assertEqual(transformer.transform_file_imports(entry), expected)
+            self.assertTrue(os.path.exists(get_default_path(root)))
+            self.assertFalse(transformer.module_index.modified)
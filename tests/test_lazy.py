@@ -0,0 +1,53 @@
+import os
+from unittest import TestCase
+
+from import_transformer import ImportsTransformer
+
+from .test_bundler import run
+from .utils import TemporaryPackage
+
+
+LAZY_FILES = {
+    'lazypkg/__init__.py': "",
+    'lazypkg/heavy.py': "print('heavy executed')\nVALUE = 1\n",
+    'lazypkg/plugin.py': "print('plugin registered')\n",
+    'entry.py': "import lazypkg.heavy\nfrom lazypkg import plugin\nprint('started')\nprint(lazypkg.heavy.VALUE)\n",
+    'unused.py': "import lazypkg.heavy\nprint('started')\n",
+}
+
+
+class TestLazyModules(TestCase):
+
+    def transform(self, root, fname, **options):
+        """ Transforms the file of the package and returns output of the transformed file. """
+        fpath = os.path.join(root, fname)
+        transformer = ImportsTransformer(root, static_resolution=True, **options)
+        transformer.transform_file_imports(fpath)
+        return run(transformer.get_output_path(fpath))
+
+    def test_lazy(self):
+        """ Tests that bodies of the lazy modules are executed on the first access to their attributes. """
+        with TemporaryPackage(LAZY_FILES) as root:
+            for bundle in (False, True):
+                output = self.transform(root, 'unused.py', bundle=bundle, lazy=True)
+                self.assertNotIn('heavy executed', output)
+                output = self.transform(root, 'entry.py', bundle=bundle, lazy=True).splitlines()
+                self.assertNotIn('plugin registered', output)
+                self.assertEqual(output[-3:], ['started', 'heavy executed', '1'])
+
+    def test_eager_modules(self):
+        """ Tests that eager modules are executed at the import. """
+        with TemporaryPackage(LAZY_FILES) as root:
+            for bundle in (False, True):
+                output = self.transform(root, 'entry.py', bundle=bundle, lazy=True,
+                                        eager_modules=['lazypkg.plugin']).splitlines()
+                self.assertEqual(output[-4:], ['plugin registered', 'started', 'heavy executed', '1'])
+
+    def test_is_lazy(self):
+        """ Tests matching of the eager modules and packages. """
+        transformer = ImportsTransformer(lazy=True, eager_modules=['pkg.sub'])
+        self.assertTrue(transformer.is_lazy('pkg'))
+        self.assertTrue(transformer.is_lazy('pkg.subway'))
+        self.assertFalse(transformer.is_lazy('pkg.sub'))
+        self.assertFalse(transformer.is_lazy('pkg.sub.module'))
+        self.assertFalse(ImportsTransformer().is_lazy('pkg'))
@@ -0,0 +1,152 @@
+import os
+import ast
+import json
+import lzma
+import zlib
+import types
+import base64
+import inspect
+import marshal
+import importlib.util
+from unittest import TestCase
+
+import astor
+
+from import_transformer import ImportsTransformer
+from import_transformer.payloads import BytecodePayload, LzmaPayload, SourcePayload, ZlibPayload, get_payload_encoder
+
+from .test_bundler import BUNDLE_FILES, run
+from .utils import TemporaryPackage
+
+
+def evaluate(expression):
+    """ Evaluates payload expression. """
+    return eval(astor.to_source(expression), {'marshal': marshal, 'importlib': importlib, 'zlib': zlib, 'lzma': lzma,
+                                                'base64': base64})
+
+
+def get_chain_files(depth):
+    """ Returns files of the package whose modules import each other in a chain of the depth. """
+    files = {'chain/__init__.py': "", 'entry.py': "from chain.m0 import V0\nprint(V0)\n"}
+    for index in range(depth):
+        last = index + 1 == depth
+        files['chain/m{}.py'.format(index)] = '{}# {}\nV{} = {}\n'.format(
+            '' if last else 'from chain.m{0} import V{0}\n'.format(index + 1), 'x' * 250, index,
+            1 if last else 'V{} + 1'.format(index + 1))
+    return files
+
+
+class TestPayloads(TestCase):
+
+    def test_get_payload_encoder(self):
+        """ Tests getting of the payload encoders. """
+        self.assertIsInstance(get_payload_encoder('source'), SourcePayload)
+        self.assertIsInstance(get_payload_encoder('bytecode'), BytecodePayload)
+        encoder = BytecodePayload()
+        self.assertIs(get_payload_encoder(encoder), encoder)
+        encoder = get_payload_encoder('zlib', level=1, threshold=0)
+        self.assertEqual((encoder.level, encoder.threshold), (1, 0))
+        with self.assertRaises(ValueError):
+            get_payload_encoder('unknown')
+
+    def test_source_payload(self):
+        """ Tests embedding of the sources. """
+        encoder = SourcePayload()
+        self.assertEqual(evaluate(encoder.encode("BETA = 2\n", 'somepackage.constants')), "BETA = 2\n")
+        self.assertEqual(encoder.get_imports(), [])
+        self.assertEqual(encoder.options, {'payload': 'source'})
+
+    def test_bytecode_payload(self):
+        """ Tests embedding of the code objects and fallback to the sources. """
+        encoder = BytecodePayload()
+        code = evaluate(encoder.encode("BETA = 2\n", 'somepackage.constants'))
+        self.assertIsInstance(code, types.CodeType)
+        self.assertEqual(code.co_filename, '<somepackage.constants>')
+        namespace = {}
+        exec(code, namespace)
+        self.assertEqual(namespace['BETA'], 2)
+        self.assertEqual(astor.to_source(ast.Module(body=encoder.get_imports())),
+                         "import marshal\nimport importlib.util\nimport base64\n")
+        # Code is embedded as base64 literal rather than as escaped bytes.
+        sources = inspect.getsource(json.decoder)
+        data = marshal.dumps(compile(sources, '<json.decoder>', 'exec', dont_inherit=True))
+        expression = encoder.encode(sources, 'json.decoder')
+        self.assertLess(len(astor.to_source(expression)), len(astor.to_source(ast.Str(s=sources))) + len(data) * 1.5)
+
+        # Sources are executed by the interpreters of other versions.
+        encoder = BytecodePayload()
+        encoder.magic_number = b'\x00\x00\r\n'
+        self.assertEqual(evaluate(encoder.encode("BETA = 2\n", 'somepackage.constants')), "BETA = 2\n")
+        self.assertEqual(encoder.options, {'payload': 'bytecode', 'magic_number': '00000d0a'})
+
+    def test_transform_bytecode(self):
+        """ Tests that transformed files with the bytecode payloads behave as the ones with the sources. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle)
+                transformer.transform_file_imports(entry)
+                expected = run(transformer.get_output_path(entry))
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, payload='bytecode')
+                sources = transformer.transform_file_imports(entry)
+                self.assertIn('marshal.loads(', sources)
+                self.assertEqual(run(transformer.get_output_path(entry)), expected)
+
+    def test_compressed_payload(self):
+        """ Tests embedding of the compressed sources and keeping of the small sources plain. """
+        sources = "BETA = 2\n" * 200
+        for encoder_type, module in ((ZlibPayload, zlib), (LzmaPayload, lzma)):
+            encoder = encoder_type()
+            expression = encoder.encode(sources, 'somepackage.constants')
+            self.assertIsInstance(expression, ast.Call)
+            self.assertLess(len(astor.to_source(expression)), len(sources))
+            self.assertEqual(evaluate(expression), sources)
+            self.assertEqual(astor.to_source(ast.Module(body=encoder.get_imports())),
+                             "import {}\nimport base64\n".format(encoder.name))
+            self.assertEqual(encoder.options, {'payload': encoder.name, 'level': encoder.default_level,
+                                               'threshold': 512})
+            # Rendered payload of the real module is shorter than its string literal.
+            module_sources = inspect.getsource(json)[:1100]
+            expression = encoder.encode(module_sources, 'json')
+            self.assertIsInstance(expression, ast.Call)
+            self.assertLess(len(astor.to_source(expression)), len(astor.to_source(ast.Str(s=module_sources))))
+            self.assertEqual(evaluate(expression), module_sources)
+            # Small and incompressible sources are embedded as is.
+            self.assertEqual(encoder.encode("BETA = 2\n", 'somepackage.constants').s, "BETA = 2\n")
+            self.assertIsInstance(encoder_type(threshold=0).encode("B = 2\n", 'somepackage.constants'), ast.Str)
+        self.assertNotEqual(ZlibPayload(level=1).encode(sources, 'a').args, ZlibPayload().encode(sources, 'a').args)
+
+    def test_transform_compressed(self):
+        """ Tests that transformed files with the compressed payloads behave as the ones with the sources. """
+        # Sources of the common module are long enough to shrink.
+        files = dict(BUNDLE_FILES)
+        files['bundlepkg/common.py'] += "PADDING = {!r}\n".format('padding ' * 100)
+        with TemporaryPackage(files) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle)
+                transformer.transform_file_imports(entry)
+                expected = run(transformer.get_output_path(entry))
+                for payload in ('zlib', 'lzma'):
+                    transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle,
+                                                     payload=get_payload_encoder(payload, threshold=0))
+                    sources = transformer.transform_file_imports(entry)
+                    self.assertIn('import {}\n'.format(payload), sources)
+                    if payload == 'zlib':
+                        self.assertIn('zlib.decompress(', sources)
+                    self.assertEqual(run(transformer.get_output_path(entry)), expected)
+
+    def test_nested_size(self):
+        """ Tests that size of the nested output grows linearly with the depth of the inlined modules. """
+        with TemporaryPackage(get_chain_files(10)) as root:
+            entry = os.path.join(root, 'entry.py')
+            transformer = ImportsTransformer(root, static_resolution=True)
+            transformer.transform_file_imports(entry)
+            size = os.path.getsize(transformer.get_output_path(entry))
+            for payload in ('bytecode', 'zlib', 'lzma'):
+                for registry in (False, True):
+                    transformer = ImportsTransformer(root, static_resolution=True, registry=registry, payload=payload)
+                    transformer.transform_file_imports(entry)
+                    output_path = transformer.get_output_path(entry)
+                    self.assertLess(os.path.getsize(output_path), 3 * size)
+                    self.assertEqual(run(output_path), "10\n")
@@ -0,0 +1,142 @@
+import os
+import ast
+import sys
+import subprocess
+from unittest import TestCase, mock
+
+import astor
+
+from import_transformer import ImportsTransformer
+from import_transformer.import_transformer import ImportRecord
+
+from .test_bundler import BUNDLE_FILES, run
+from .utils import TemporaryPackage
+
+
+class TestRegistry(TestCase):
+
+    def test_get_registry_import(self):
+        """ Tests replacing of the import with execution of the module body and bindings to the registry. """
+        transformer = ImportsTransformer(registry=True)
+        transformer.types_imported = True
+        node_modules = {'BETA': ImportRecord('somepackage.constants', None, 'somepackage.constants', False),
+                        'constants': ImportRecord('somepackage.constants', 'c', 'somepackage.constants', False)}
+        with mock.patch.object(ImportsTransformer, 'get_node_modules', return_value=node_modules), \
+                mock.patch.object(ImportsTransformer, 'get_sources', return_value="BETA = 2\n"):
+            node = ast.parse("from somepackage.constants import BETA, constants as c").body[0]
+            actual = astor.to_source(transformer.get_registry_import(node))
+            expected = ("if __inline_body__('somepackage.constants'):\n"
+                        "    exec('BETA = 2\\n', __inlined_modules__['somepackage.constants'].__dict__)\n"
+                        "BETA = __inlined_modules__['somepackage.constants'].BETA\n"
+                        "c = __inlined_modules__['somepackage.constants'].constants\n")
+            self.assertEqual(actual, expected)
+            # Body of the module is emitted once per file.
+            self.assertNotIn('exec(', astor.to_source(transformer.get_registry_import(node)))
+
+    def test_registry(self):
+        """ Tests that files transformed with the registry behave as the original ones. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            expected = run(entry)
+            for options in ({}, {'lazy': True}, {'payload': 'bytecode'}):
+                transformer = ImportsTransformer(root, static_resolution=True, registry=True, **options)
+                sources = transformer.transform_file_imports(entry)
+                self.assertNotIn('locals()', sources)
+                self.assertNotIn('print(\'from', sources)
+                self.assertEqual(sources.count('__inlined_modules__ = {}'), 1)
+                self.assertEqual(run(transformer.get_output_path(entry)), expected)
+
+    def test_trace(self):
+        """ Tests printing of the transformed imports. """
+        with TemporaryPackage(BUNDLE_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for registry in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, registry=registry, trace=True)
+                transformer.transform_file_imports(entry)
+                output = run(transformer.get_output_path(entry))
+                self.assertTrue(output.startswith('from bundlepkg.left import LEFT\n'))
+                transformer = ImportsTransformer(root, static_resolution=True, registry=registry)
+                self.assertNotIn('print(\'from', transformer.transform_file_imports(entry))
+
+
+SYS_MODULES_FILES = {
+    'regpkg/__init__.py': "",
+    'regpkg/models.py': "print('models executed')\n\n\nclass Model(object):\n    pass\n",
+    'entry.py': "import pickle\nimport importlib\nfrom regpkg.models import Model\n"
+                "import regpkg.models\n"
+                "print(importlib.import_module('regpkg.models') is regpkg.models)\n"
+                "print(type(pickle.loads(pickle.dumps(Model()))) is Model)\n",
+    'preloaded.py': "import regpkg.models as real\nfrom regpkg.models import Model\nprint(real.Model is Model)\n",
+}
+
+# Submodules of the inlined packages which aren't inlined themselves.
+SIBLING_FILES = {
+    'spkg/__init__.py': "",
+    'spkg/a.py': "X = 1\n",
+    'spkg/b.py': "Y = 2\n",
+    'spkg/sub/__init__.py': "",
+    'spkg/sub/c.py': "from spkg.a import X\nZ = X + 2\n",
+    'spkg/sub/d.py': "W = 4\n",
+    'entry.py': "import importlib\nfrom spkg.a import X\nfrom spkg.sub.c import Z\n"
+                "print(X, importlib.import_module('spkg.b').Y, Z, importlib.import_module('spkg.sub.d').W)\n"
+                "from spkg import b\nprint(b.Y)\n",
+}
+
+# Parent packages with __init__ bodies, the package imports its own submodule.
+PARENT_FILES = {
+    'ppkg/__init__.py': "from ppkg.util import f\nV = f() + 6\n",
+    'ppkg/util.py': "def f():\n    return 1\n",
+    'ppkg/sub/__init__.py': "W = 8\n",
+    'ppkg/sub/mod.py': "X = 9\n",
+    'entry.py': "import importlib\nfrom ppkg.sub.mod import X\n"
+                "print(X, importlib.import_module('ppkg').V, importlib.import_module('ppkg.sub').W)\n",
+}
+
+
+class TestSysModules(TestCase):
+
+    def test_sys_modules(self):
+        """ Tests that the inlined modules are imported by their names without loading them again. """
+        with TemporaryPackage(SYS_MODULES_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for options in ({}, {'bundle': True}, {'lazy': True}, {'bundle': True, 'lazy': True}):
+                transformer = ImportsTransformer(root, static_resolution=True, sys_modules=True, **options)
+                transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), "models executed\nTrue\nTrue\n")
+            self.assertTrue(ImportsTransformer(root, sys_modules=True).registry)
+            self.assertFalse(ImportsTransformer(root, sys_modules=True, bundle=True).registry)
+
+    def test_imported_before(self):
+        """ Tests that modules imported before the inlined ones are used as is. """
+        with TemporaryPackage(SYS_MODULES_FILES) as root:
+            entry = os.path.join(root, 'preloaded.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, sys_modules=True, bundle=bundle)
+                transformer.transform_file_imports(entry)
+                with open(transformer.get_output_path(entry)) as fh:
+                    sources = 'import sys\nimport regpkg.models\n' + fh.read()
+                with open(transformer.get_output_path(entry), 'w') as fh:
+                    fh.write(sources)
+                env = dict(os.environ, PYTHONPATH=root)
+                output = subprocess.run([sys.executable, transformer.get_output_path(entry)], env=env,
+                                        stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+                self.assertEqual(output, "models executed\nTrue\n")
+
+    def test_sibling_submodules(self):
+        """ Tests that the submodules of the inlined packages, which aren't inlined, are imported by their names. """
+        with TemporaryPackage(SIBLING_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for options in ({}, {'bundle': True}, {'lazy': True}, {'bundle': True, 'lazy': True},
+                            {'static_resolution': True}, {'static_resolution': True, 'bundle': True}):
+                transformer = ImportsTransformer(root, sys_modules=True, **options)
+                transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), "1 2 3 4\n2\n", options)
+
+    def test_parent_packages(self):
+        """ Tests that the parent packages of the inlined modules are registered with their __init__ executed. """
+        with TemporaryPackage(PARENT_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for options in ({}, {'bundle': True}, {'stream': True}, {'lazy': True}, {'bundle': True, 'lazy': True}):
+                transformer = ImportsTransformer(root, static_resolution=True, sys_modules=True, **options)
+                transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), "9 7 8\n", options)
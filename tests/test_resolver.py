@@ -0,0 +1,94 @@
+import os
+import ast
+import sys
+from unittest import TestCase, mock
+
+from import_transformer import ImportsTransformer
+from import_transformer.import_transformer import ImportRecord
+from import_transformer.resolver import ModuleResolver
+
+from .utils import TemporaryPackage
+
+
+PACKAGE_FILES = {
+    'resolverpkg/__init__.py': "raise RuntimeError('package executed')\n",
+    'resolverpkg/constants.py': "raise RuntimeError('module executed')\nSOME_CONSTANT = 'some_id'\n",
+    'resolverpkg/submod/__init__.py': "",
+    'resolverpkg/submod/some_class.py': "class SomeClass: pass\n",
+    'resolverpkg/dynamic.py': "import sys\nsys.modules['resolverpkg.dynamic.sub'] = sys\n",
+    'resolvernamespace/module.py': "VALUE = 1\n",
+}
+
+
+class TestModuleResolver(TestCase):
+
+    def test_find_spec(self):
+        """ Tests resolution of modules without execution of their sources. """
+        with TemporaryPackage(PACKAGE_FILES) as root:
+            resolver = ModuleResolver()
+            self.assertEqual(resolver.get_location('resolverpkg.constants'),
+                             os.path.join(root, 'resolverpkg', 'constants.py'))
+            self.assertEqual(resolver.get_location('resolverpkg.submod'),
+                             os.path.join(root, 'resolverpkg', 'submod', '__init__.py'))
+            self.assertEqual(resolver.get_location('resolvernamespace'), os.path.join(root, 'resolvernamespace'))
+            self.assertEqual(resolver.get_location('sys'), '')
+            self.assertIsNone(resolver.get_location('resolverpkg.missing'))
+            self.assertNotIn('resolverpkg', sys.modules)
+
+    def test_is_module(self):
+        """ Tests distinguishing of submodules and attributes. """
+        with TemporaryPackage(PACKAGE_FILES):
+            resolver = ModuleResolver()
+            self.assertTrue(resolver.is_module('resolverpkg.submod.some_class'))
+            self.assertFalse(resolver.is_module('resolverpkg.constants.SOME_CONSTANT'))
+            self.assertFalse(resolver.is_module('resolverpkg.submod.SomeName'))
+            # Undecidable cases.
+            self.assertIsNone(resolver.is_module('resolverpkg.dynamic.sub'))
+            self.assertIsNone(resolver.is_module('missingpkg.name'))
+            self.assertNotIn('resolverpkg', sys.modules)
+
+    def test_get_source(self):
+        """ Tests reading of the module sources. """
+        with TemporaryPackage(PACKAGE_FILES):
+            resolver = ModuleResolver()
+            self.assertEqual(resolver.get_source('resolverpkg.submod.some_class'), "class SomeClass: pass\n")
+            self.assertEqual(resolver.get_source('resolverpkg.submod'), "")
+            self.assertEqual(resolver.get_source('resolvernamespace'), "")
+            self.assertIsNone(resolver.get_source('sys'))
+
+    def test_search_path_scopes(self):
+        """ Tests that resolution results don't leak between different search paths. """
+        resolver = ModuleResolver()
+        self.assertIsNone(resolver.find_spec('resolverpkg'))
+        with TemporaryPackage(PACKAGE_FILES):
+            self.assertIsNotNone(resolver.find_spec('resolverpkg'))
+
+
+class TestStaticResolution(TestCase):
+
+    def test_transformer_static_resolution(self):
+        """ Tests that transformer with static resolution doesn't import the transforming modules. """
+        with TemporaryPackage(PACKAGE_FILES) as root:
+            transformer = ImportsTransformer(root, static_resolution=True)
+            with mock.patch('import_transformer.import_transformer.importlib.import_module') as import_module:
+                for import_str in ("from resolverpkg.constants import SOME_CONSTANT",
+                                   "import resolverpkg.submod.some_class", "from resolverpkg import submod"):
+                    self.assertTrue(transformer._to_transform(ast.parse(import_str).body[0]))
+                for import_str in ("import ast", "from unittest import TestCase, mock", "import sys"):
+                    self.assertFalse(transformer._to_transform(ast.parse(import_str).body[0]))
+                import_node = ast.parse("from resolverpkg import submod, name").body[0]
+                self.assertEqual(transformer.get_node_modules(import_node),
+                                 {'submod': ImportRecord('resolverpkg.submod', None, 'resolverpkg', True),
+                                  'name': ImportRecord('resolverpkg', None, 'resolverpkg', False)})
+                self.assertEqual(transformer.get_sources('resolverpkg.submod.some_class'),
+                                 "class SomeClass:\n    pass\n")
+                import_module.assert_not_called()
+
+    def test_transformer_static_resolution_fallback(self):
+        """ Tests that transformer imports modules which can't be resolved statically. """
+        transformer = ImportsTransformer('somepackage', static_resolution=True)
+        module = mock.MagicMock(__file__=os.path.abspath('somepackage/module.py'))
+        with mock.patch('import_transformer.import_transformer.importlib.import_module',
+                        return_value=module) as import_module:
+            self.assertTrue(transformer._to_transform(ast.parse("import somepackage.module").body[0]))
+            import_module.assert_called_once_with('somepackage.module')
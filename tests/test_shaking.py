@@ -0,0 +1,206 @@
+import os
+import ast
+from unittest import TestCase
+
+import astor
+
+from import_transformer import ImportsTransformer
+from import_transformer.shaking import ModuleShaker, get_bound_names, has_side_effects
+
+from .test_bundler import run
+from .utils import TemporaryPackage
+
+
+MODULE_SOURCES = '''"""Constants module."""
+import os
+SOME_CONSTANT = 'some_id'
+OTHER_CONSTANT = SOME_CONSTANT + '_other'
+UNUSED = 'unused'
+__all__ = ['SOME_CONSTANT']
+
+
+def helper(value=None):
+    return value
+
+
+def get_constant():
+    return OTHER_CONSTANT
+
+
+class Base(Exception):
+    pass
+
+
+class Derived(Base):
+    @property
+    def value(self):
+        return helper()
+
+
+class Unused(Base):
+    pass
+
+
+REGISTRY = []
+REGISTRY.append(Derived)
+'''
+
+SHAKING_FILES = {
+    'shakepkg/__init__.py': "",
+    'shakepkg/constants.py': MODULE_SOURCES,
+    'shakepkg/util.py': "from shakepkg.constants import get_constant\n\n\ndef util():\n    return get_constant()\n",
+    'entry.py': "from shakepkg.constants import SOME_CONSTANT\nfrom shakepkg.util import util\n"
+                "print(SOME_CONSTANT, util())\n",
+}
+
+EXPOSED_FILES = {
+    'app/__init__.py': "",
+    'app/constants.py': "K = 1\n",
+    'app/util.py': "def f():\n    return 1\n\n\ndef unused():\n    return 2\n",
+    'entry.py': "from app.util import f\nimport app.constants\nprint(f(), app.util.unused())\n",
+}
+
+REGISTRY_FILES = {
+    'app/__init__.py': "",
+    'app/sub/__init__.py': "",
+    'app/sub/mod.py': "from app.util import f\n\n\ndef g():\n    return f()\n",
+    'app/util.py': "K = 2\n\n\ndef f():\n    return 1\n\n\ndef unused():\n    return 3\n",
+    'entry.py': "from app.sub.mod import g\nfrom app.util import f as ff, K\nprint(g(), ff(), K)\n",
+}
+
+SYS_MODULES_FILES = {
+    'app/__init__.py': "",
+    'app/util.py': "def f():\n    return 1\n\n\ndef unused():\n    return 2\n",
+    'entry.py': "import importlib\nfrom app.util import f\nprint(f(), importlib.import_module('app.util').unused())\n",
+}
+
+
+def shake(sources, names):
+    result = ModuleShaker(ast.parse(sources)).shake(names, sources)
+    return astor.to_source(result.tree), result.removed_statements, result.removed_bytes
+
+
+class TestModuleShaker(TestCase):
+
+    def test_get_bound_names(self):
+        """ Tests names bound by the top level statements. """
+        statements = ["a, (b, *c) = 1, (2, 3)", "import os.path", "from os import sep as separator",
+                      "def f():\n    global g\n    g = 1", "obj.attr = 1", "x += 1"]
+        expected = [{'a', 'b', 'c'}, {'os'}, {'separator'}, {'f', 'g'}, {'obj'}, {'x'}]
+        for statement, names in zip(statements, expected):
+            self.assertEqual(get_bound_names(ast.parse(statement).body[0]), names)
+
+    def test_has_side_effects(self):
+        """ Tests detection of the expressions with side effects. """
+        self.assertFalse(has_side_effects(ast.parse("(1, 'a', [b, {c: d}], x.y)").body[0].value))
+        self.assertFalse(has_side_effects(ast.parse("lambda x: print(x)").body[0].value))
+        self.assertTrue(has_side_effects(ast.parse("[1, compute()]").body[0].value))
+
+    def test_shake(self):
+        """ Tests that only the definitions needed by the imported names and side effects are kept. """
+        actual, removed_statements, removed_bytes = shake(MODULE_SOURCES, ['SOME_CONSTANT'])
+        expected = '''"""Constants module."""
+import os
+SOME_CONSTANT = 'some_id'
+__all__ = ['SOME_CONSTANT']
+
+
+def helper(value=None):
+    return value
+
+
+class Base(Exception):
+    pass
+
+
+class Derived(Base):
+
+    @property
+    def value(self):
+        return helper()
+
+
+REGISTRY = []
+REGISTRY.append(Derived)
+'''
+        self.assertEqual(actual, expected)
+        self.assertEqual(removed_statements, 4)
+        removed = ["OTHER_CONSTANT = SOME_CONSTANT + '_other'", "UNUSED = 'unused'",
+                   "def get_constant():\n    return OTHER_CONSTANT", "class Unused(Base):\n    pass"]
+        self.assertEqual(removed_bytes, sum(map(len, removed)))
+
+    def test_shake_conservative(self):
+        """ Tests that modules which can't be analyzed statically are kept as is. """
+        cases = [
+            (MODULE_SOURCES, ['*']),
+            (MODULE_SOURCES, ['MISSING']),
+            ("from os.path import *\nA = 1\nB = 2\n", ['A']),
+            ("A = 1\nB = 2\nglobals()['C'] = 3\n", ['A']),
+            ("A = 1\nB = 2\n\n\ndef __getattr__(name):\n    return name\n", ['A']),
+        ]
+        for sources, names in cases:
+            actual, removed_statements, removed_bytes = shake(sources, names)
+            self.assertEqual(actual, astor.to_source(ast.parse(sources)))
+            self.assertEqual((removed_statements, removed_bytes), (0, 0))
+
+    def test_shake_side_effects(self):
+        """ Tests that statements with side effects are kept. """
+        sources = ("import registry\nA = 1\nB = compute()\n\n\n@registry.register\ndef f():\n    pass\n\n\n"
+                   "class Model(registry.Model):\n    pass\n\n\nclass Meta(metaclass=registry.Meta):\n    pass\n")
+        actual, removed_statements, _ = shake(sources, ['A'])
+        self.assertEqual(actual, astor.to_source(ast.parse(sources)))
+        self.assertEqual(removed_statements, 0)
+
+
+class TestTreeShaking(TestCase):
+
+    def test_transform(self):
+        """ Tests that transformed files with tree shaking behave as the ones without it. """
+        with TemporaryPackage(SHAKING_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle)
+                full_sources = transformer.transform_file_imports(entry)
+                expected = run(transformer.get_output_path(entry))
+
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, tree_shaking=True)
+                sources = transformer.transform_file_imports(entry)
+                self.assertEqual(run(transformer.get_output_path(entry)), expected)
+                self.assertLess(len(sources), len(full_sources))
+                self.assertNotIn('UNUSED', sources)
+                self.assertTrue(transformer.shaking_report)
+                for report in transformer.shaking_report.values():
+                    self.assertGreater(report['statements'], 0)
+                    self.assertGreater(report['bytes'], 0)
+
+    def test_exposed_package(self):
+        """ Tests that the modules reachable as attributes of the imported packages aren't shaken. """
+        with TemporaryPackage(EXPOSED_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, tree_shaking=True)
+                sources = transformer.transform_file_imports(entry)
+                self.assertIn('unused', sources)
+                self.assertEqual(run(transformer.get_output_path(entry)), '1 2\n')
+
+    def test_registry(self):
+        """ Tests that the module executed once from the registry is shaken to the names imported by the whole file. """
+        options = ({'registry': True}, {'registry': True, 'lazy': True}, {'registry': True, 'module_index': True})
+        with TemporaryPackage(REGISTRY_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for kwargs in options:
+                transformer = ImportsTransformer(root, static_resolution=True, tree_shaking=True, **kwargs)
+                sources = transformer.transform_file_imports(entry)
+                self.assertNotIn('unused', sources)
+                self.assertEqual(run(transformer.get_output_path(entry)), '1 1 2\n')
+
+    def test_sys_modules(self):
+        """ Tests that the modules registered in sys.modules aren't shaken. """
+        with TemporaryPackage(SYS_MODULES_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, sys_modules=True,
+                                                 tree_shaking=True)
+                sources = transformer.transform_file_imports(entry)
+                self.assertIn('unused', sources)
+                self.assertEqual(run(transformer.get_output_path(entry)), '1 2\n')
@@ -0,0 +1,72 @@
+import io
+import os
+from contextlib import redirect_stdout
+from unittest import TestCase, mock
+
+from import_transformer import ImportsTransformer
+from import_transformer.cli import main
+from import_transformer.stats import NULL_STATS, TransformStats, get_stats
+
+from .test_cache import DIAMOND_FILES
+from .utils import TemporaryPackage
+
+
+class TestTransformStats(TestCase):
+
+    def test_record(self):
+        """ Tests accumulating of the phases and calling of the hooks. """
+        hook = mock.Mock()
+        stats = TransformStats(hooks=[hook])
+        stats.record('parse', 'pkg.a', 0.5)
+        stats.record('parse', 'pkg.a', 0.25)
+        stats.record('read', 'pkg.b', 1.0)
+        stats.record('transform', 'pkg.a', 2.0)
+        with mock.patch('import_transformer.stats.time.perf_counter', side_effect=[1.0, 1.5]):
+            with stats.measure('codegen', 'pkg.b'):
+                pass
+        self.assertEqual(hook.call_args_list[0], mock.call('parse', 'pkg.a', 0.5))
+        self.assertEqual(hook.call_count, 5)
+        self.assertEqual(stats.modules['pkg.a']['parse'], [0.75, 2])
+        self.assertEqual(stats.totals['parse'], {'time': 0.75, 'count': 2})
+        # The inclusive transform phase isn't counted by default.
+        self.assertEqual(stats.get_slowest(), [('pkg.b', 1.5), ('pkg.a', 0.75)])
+        self.assertEqual(stats.get_slowest(1, phases=['transform']), [('pkg.a', 2.0)])
+
+        other = TransformStats()
+        other.update(stats.as_dict())
+        other.update(stats.as_dict())
+        self.assertEqual(other.modules['pkg.b']['codegen'], [1.0, 2])
+
+    def test_get_stats(self):
+        """ Tests the stats option and the no-op stats. """
+        self.assertIsInstance(get_stats(True), TransformStats)
+        stats = TransformStats()
+        self.assertIs(get_stats(stats), stats)
+        self.assertIs(get_stats(None), NULL_STATS)
+        with NULL_STATS.measure('parse', 'pkg.a'):
+            NULL_STATS.record('parse', 'pkg.a', 1.0)
+        self.assertFalse(NULL_STATS.enabled)
+
+    def test_transformer_stats(self):
+        """ Tests recording of the phases of the entry file and nested modules. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            entry = os.path.join(root, 'entry.py')
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle, stats=True)
+                transformer.transform_file_imports(entry)
+                modules = transformer.stats.modules
+                self.assertEqual(set(modules[entry]), {'parse', 'transform', 'codegen', 'write'})
+                self.assertEqual(modules['diamondpkg.common']['read'][1], 1)
+                self.assertEqual(modules['diamondpkg.common']['parse'][1], 1)
+                self.assertIn('resolution', modules['diamondpkg.left'])
+
+    def test_cli(self):
+        """ Tests printing of the slowest modules. """
+        with TemporaryPackage(DIAMOND_FILES) as root:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                main([os.path.join(root, 'entry.py'), '-p', root, '-j', '1', '--static-resolution', '--stats', '2'])
+            lines = output.getvalue().splitlines()
+            self.assertEqual(lines[1], 'Slowest modules:')
+            self.assertEqual(len([line for line in lines if line.startswith('  ')]), 2)
+            self.assertTrue(any(line.startswith('parse: ') for line in lines))
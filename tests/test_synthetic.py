@@ -0,0 +1,34 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks.synthetic import generate_package
+from import_transformer import ImportsTransformer
+
+from .test_bundler import run
+from .utils import TemporaryPackage
+
+
+class TestSyntheticPackage(TestCase):
+
+    def test_generate_package(self):
+        """ Tests that the synthetic package behaves the same way before and after the transformation. """
+        with TemporaryPackage({}) as root:
+            package = generate_package(root, modules=8, depth=3, fan_out=2, star_imports=0.3, aliased_imports=0.3)
+            self.assertEqual(package.modules[:3], ['synthpkg.module_0', 'synthpkg.sub_1.module_1',
+                                                   'synthpkg.sub_1.sub_2.module_2'])
+            self.assertEqual(run(package.entry), package.expected_output)
+            for bundle in (False, True):
+                transformer = ImportsTransformer(root, static_resolution=True, bundle=bundle)
+                transformer.transform_file_imports(package.entry)
+                self.assertTrue(run(transformer.get_output_path(package.entry)).endswith(package.expected_output))
+
+    def test_deterministic(self):
+        """ Tests that the package is defined by the seed. """
+        sources = []
+        for _ in range(2):
+            with tempfile.TemporaryDirectory() as root:
+                package = generate_package(root, modules=10, seed=3)
+                with open(os.path.join(root, *package.modules[-1].split('.')) + '.py') as fh:
+                    sources.append(fh.read())
+        self.assertEqual(sources[0], sources[1])
@@ -0,0 +1,74 @@
+import os
+from unittest import TestCase, mock
+
+from import_transformer.watch import Watcher
+
+from .utils import TemporaryPackage
+
+
+WATCH_FILES = {
+    'watchpkg/__init__.py': "",
+    'watchpkg/constants.py': "ALPHA = 1\n",
+    'watchpkg/util.py': "from watchpkg.constants import ALPHA\n\n\ndef get():\n    return ALPHA\n",
+    'watchpkg/other.py': "BETA = 2\n",
+    'first.py': "from watchpkg.util import get\nprint(get())\n",
+    'second.py': "from watchpkg.other import BETA\nprint(BETA)\n",
+}
+
+
+class TestWatcher(TestCase):
+
+    @staticmethod
+    def write(root, fname, sources, mtime=None):
+        """ Writes the file, moving its modification time forward, so the change is seen on any file system. """
+        fpath = os.path.join(root, fname)
+        mtime = mtime or os.stat(fpath).st_mtime + 10
+        with open(fpath, 'w') as fh:
+            fh.write(sources)
+        os.utime(fpath, (mtime, mtime))
+
+    def test_update(self):
+        """ Tests that only the entries depending on the changed module are transformed again. """
+        with TemporaryPackage(WATCH_FILES) as root:
+            watcher = Watcher([os.path.join(root, 'first.py'), os.path.join(root, 'second.py')], root,
+                              static_resolution=True)
+            reports = watcher.run()
+            self.assertEqual([report.modified for report in reports], [True, True])
+            self.assertEqual(sorted(watcher.dependencies[os.path.join(root, 'first.py')]),
+                             ['watchpkg.constants', 'watchpkg.util'])
+            self.assertEqual(watcher.update(), [])
+
+            self.write(root, 'watchpkg/constants.py', "ALPHA = 42\n")
+            reports = watcher.update()
+            self.assertEqual([report.path for report in reports], [os.path.join(root, 'first.py')])
+            with open(reports[0].output_path) as fh:
+                self.assertIn('ALPHA = 42', fh.read())
+            # Modules which don't depend on the changed one are kept in the cache.
+            self.assertIn('watchpkg.other', watcher.cache.sources)
+
+            # Touching the file without changes isn't a change.
+            self.write(root, 'watchpkg/other.py', "BETA = 2\n")
+            self.assertEqual(watcher.update(), [])
+
+            self.write(root, 'second.py', "from watchpkg.other import BETA\nprint(BETA + 1)\n")
+            self.assertEqual([report.path for report in watcher.update()], [os.path.join(root, 'second.py')])
+
+    def test_failed_entry(self):
+        """ Tests that the failed entry is transformed again once the broken module is fixed. """
+        with TemporaryPackage(dict(WATCH_FILES, **{'watchpkg/constants.py': "ALPHA =\n"})) as root:
+            watcher = Watcher([os.path.join(root, 'first.py')], root, static_resolution=True)
+            self.assertIsNotNone(watcher.run()[0].error)
+            self.write(root, 'watchpkg/constants.py', "ALPHA = 1\n")
+            reports = watcher.update()
+            self.assertEqual([(report.modified, report.error) for report in reports], [(True, None)])
+
+    def test_watch(self):
+        """ Tests polling of the files. """
+        with TemporaryPackage(WATCH_FILES) as root:
+            watcher = Watcher([os.path.join(root, 'first.py')], root, interval=0, static_resolution=True)
+            callback = mock.Mock()
+            with mock.patch.object(watcher, 'update', side_effect=[[], ['report']]) as update:
+                watcher.watch(callback, iterations=2)
+            self.assertEqual(update.call_count, 2)
+            self.assertEqual(callback.call_count, 2)
+            self.assertEqual(callback.call_args, mock.call(['report']))
@@ -0,0 +1,33 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+
+
+class TemporaryPackage(object):
+    """ Writes the package files into temporary directory and makes them importable. """
+
+    def __init__(self, files):
+        """ files: {relative path: sources} map of the files to create. """
+        self.files = files
+        self.root = None
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp()
+        for relative_path, sources in self.files.items():
+            path = os.path.join(self.root, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fh:
+                fh.write(sources)
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        sys.path.insert(0, self.root)
+        importlib.invalidate_caches()
+        return self.root
+
+    def __exit__(self, type, value, traceback):
+        sys.path.remove(self.root)
+        for name, module in list(sys.modules.items()):
+            if (getattr(module, '__file__', None) or '').startswith(self.root):
+                del sys.modules[name]
+        shutil.rmtree(self.root)